@@ -0,0 +1,105 @@
+"""Batch report benchmark: POST /rss/batch against one GET per league, in-process through the ASGI app.
+
+Seeds leagues like feed_load (or reuses them with --skip-seed) and, for every batch size, renders the same
+leagues with a cold report cache both ways:
+
+    python -m benchmarks.batch_reports --leagues 500 --sizes 1 5 50 500
+    python -m benchmarks.batch_reports --skip-seed --league-base 800000 --sizes 10 100
+
+Reports wall time and DB statements for both paths.
+"""
+import argparse
+import asyncio
+import json
+import sys
+import time
+from pathlib import Path
+from typing import Dict
+
+import httpx
+
+from src.postgre import sessionmanager
+from .feed_load import seed
+from .ingest import RESULTS_DIR, git_commit
+
+
+async def _batch(client: httpx.AsyncClient, args: argparse.Namespace, size: int) -> Dict:
+    keys = [{"type": t, "league_id": args.league_base + i} for i in range(size) for t in args.types]
+    start = time.perf_counter()
+    resp = await client.post("/rss/batch", json=keys)
+    wall = time.perf_counter() - start
+    reports = resp.json()["reports"]
+    return {
+        "status": resp.status_code,
+        "reports": sum("report" in r for r in reports),
+        "errors": sum("error" in r for r in reports),
+        "wall_ms": round(wall * 1000, 3),
+        "db_statements": int(resp.headers.get("X-DB-Statements", 0)),
+        "db_ms": float(resp.headers.get("X-DB-Time-Ms", 0)),
+    }
+
+
+async def _single(client: httpx.AsyncClient, args: argparse.Namespace, size: int) -> Dict:
+    statements, db_ms, ok = 0, 0., 0
+    start = time.perf_counter()
+    for i in range(size):
+        for league_type in args.types:
+            resp = await client.get(f"/rss/{league_type}/{args.league_base + i}")
+            ok += resp.status_code == 200
+            statements += int(resp.headers.get("X-DB-Statements", 0))
+            db_ms += float(resp.headers.get("X-DB-Time-Ms", 0))
+    return {
+        "reports": ok,
+        "wall_ms": round((time.perf_counter() - start) * 1000, 3),
+        "db_statements": statements,
+        "db_ms": round(db_ms, 3),
+    }
+
+
+async def main(args: argparse.Namespace) -> None:
+    if not args.skip_seed:
+        await seed(args)
+    from src.module import app
+    from src.service.report_cache import report_cache
+
+    sessionmanager.enable_profiling()
+    results = {}
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench",
+                                 timeout=600) as client:
+        for size in args.sizes:
+            await report_cache.clear()
+            batch = await _batch(client, args, size)
+            await report_cache.clear()
+            single = await _single(client, args, size) if size <= args.max_single else None
+            results[str(size)] = {"batch": batch, "single": single}
+            print(f"{size} leagues: batch {batch['wall_ms']} ms / {batch['db_statements']} statements"
+                  + (f", single {single['wall_ms']} ms / {single['db_statements']} statements" if single else ""),
+                  file=sys.stderr)
+    await sessionmanager.close()
+
+    commit = git_commit()
+    report = {
+        "commit": commit,
+        "params": {k: v for k, v in vars(args).items() if k != "out"},
+        "results": results,
+    }
+    out = Path(args.out) if args.out else RESULTS_DIR / f"batch-reports-{commit}-{int(time.time())}.json"
+    out.parent.mkdir(parents=True, exist_ok=True)
+    out.write_text(json.dumps(report, indent=2))
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--leagues", type=int, default=500)
+    parser.add_argument("--gameweeks", type=int, default=1)
+    parser.add_argument("--teams", type=int, default=12)
+    parser.add_argument("--squad", type=int, default=15)
+    parser.add_argument("--league-base", type=int, default=600_000)
+    parser.add_argument("--skip-seed", action="store_true")
+    parser.add_argument("--types", nargs="+", default=["h2h", "classic"], choices=["h2h", "classic"])
+    parser.add_argument("--sizes", nargs="+", type=int, default=[1, 5, 50, 500])
+    parser.add_argument("--max-single", type=int, default=100, help="skip the per-league path above this size")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", default=None)
+    asyncio.run(main(parser.parse_args()))
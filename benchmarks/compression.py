@@ -0,0 +1,53 @@
+"""Feed body size and per-poll encoding cost for a synthetic league.
+
+    python -m benchmarks.compression --teams 200 --polls 200
+"""
+import argparse
+import asyncio
+import json
+import time
+
+from src.service.report_cache import CachedReport, supported_encodings
+from src.service.service import RSSService
+from .synthetic import LeagueGenerator, build_h2h_gameweek, build_classic_gameweek
+
+render_h2h = RSSService._render_h2h_report
+render_classic = RSSService._render_classic_report
+
+
+def measure(body: bytes, polls: int) -> dict:
+    result = {"identity_bytes": len(body)}
+    for encoding in supported_encodings():
+        start = time.perf_counter()
+        for _ in range(polls):
+            size = len(CachedReport(body=body).encoded(encoding))
+        uncached_ms = (time.perf_counter() - start) * 1000 / polls
+        report = CachedReport(body=body)
+        report.encoded(encoding)
+        start = time.perf_counter()
+        for _ in range(polls):
+            report.encoded(encoding)
+        cached_us = (time.perf_counter() - start) * 1e6 / polls
+        result[encoding] = {
+            "bytes": size,
+            "ratio": round(len(body) / size, 2),
+            "compress_per_poll_ms": round(uncached_ms, 3),
+            "cached_per_poll_us": round(cached_us, 3),
+        }
+    return result
+
+
+async def main(args: argparse.Namespace) -> None:
+    generator = LeagueGenerator(teams=args.teams, squad_size=args.squad)
+    h2h = (await render_h2h(build_h2h_gameweek(generator.h2h(1, 1)))).encode()
+    classic = (await render_classic(build_classic_gameweek(generator.classic(2, 1)))).encode()
+    print(json.dumps({"teams": args.teams, "h2h": measure(h2h, args.polls),
+                      "classic": measure(classic, args.polls)}, indent=2))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--teams", type=int, default=200)
+    parser.add_argument("--squad", type=int, default=15)
+    parser.add_argument("--polls", type=int, default=200)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,192 @@
+"""Read-path load test for the /rss/* feed endpoints.
+
+Seeds N leagues x M gameweeks per type into the configured PostgreSQL, then polls the feeds with a
+Zipfian league distribution, either in-process through the ASGI app or over a local uvicorn:
+
+    python -m benchmarks.feed_load --leagues 50 --gameweeks 5 --requests 5000 --concurrency 32
+    python -m benchmarks.feed_load --skip-seed --target uvicorn --port 8765
+    python -m benchmarks.feed_load --skip-seed --target uvicorn --workers 4 --cache-backend file
+
+Reports throughput, latency percentiles, DB statements per request and RSS growth. Over uvicorn the
+statement count comes from the X-DB-Statements header, so the server is started with POSTGRES_PROFILE=1.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import httpx
+
+from src.postgre import sessionmanager, get_db_session, create_db_and_tables
+from src.service.service import RSSService
+from .ingest import RESULTS_DIR, git_commit
+from .synthetic import LeagueGenerator
+
+PAGE_SIZE = 4096
+
+
+def _rss_bytes(pid: str = "self") -> int:
+    try:
+        return int(Path(f"/proc/{pid}/statm").read_text().split()[1]) * PAGE_SIZE
+    except (OSError, IndexError, ValueError):
+        return 0
+
+
+def zipf_sampler(n: int, s: float, rng: random.Random):
+    weights = [1 / (rank ** s) for rank in range(1, n + 1)]
+    population = list(range(n))
+    return lambda: rng.choices(population, weights)[0]
+
+
+async def seed(args: argparse.Namespace) -> None:
+    await create_db_and_tables()
+    generator = LeagueGenerator(teams=args.teams, squad_size=args.squad, seed=args.seed)
+    for index in range(args.leagues):
+        for gameweek in range(1, args.gameweeks + 1):
+            async for db_session in get_db_session():
+                service = RSSService(db_session)
+                await service.create_h2h_item(generator.h2h(args.league_base + index, gameweek))
+                await service.create_classic_item(generator.classic(args.league_base + index, gameweek))
+                await db_session.commit()
+    print(f"Seeded {args.leagues} leagues x {args.gameweeks} gameweeks per type", file=sys.stderr)
+
+
+async def drive(client: httpx.AsyncClient, args: argparse.Namespace) -> Tuple[List[float], Dict[int, int], int]:
+    rng = random.Random(args.seed)
+    pick = zipf_sampler(args.leagues, args.zipf, rng)
+    plan = [(rng.choice(args.types), args.league_base + pick()) for _ in range(args.requests)]
+    headers = {"Accept-Encoding": args.accept_encoding} if args.accept_encoding else {}
+    latencies: List[float] = []
+    statuses: Dict[int, int] = {}
+    statements = 0
+    cursor = iter(plan)
+
+    async def worker():
+        nonlocal statements
+        for league_type, league_id in cursor:
+            start = time.perf_counter()
+            resp = await client.get(f"/rss/{league_type}/{league_id}", headers=headers)
+            latencies.append((time.perf_counter() - start) * 1000)
+            statuses[resp.status_code] = statuses.get(resp.status_code, 0) + 1
+            statements += int(resp.headers.get("X-DB-Statements", 0))
+
+    await asyncio.gather(*(worker() for _ in range(args.concurrency)))
+    return latencies, statuses, statements
+
+
+def _summary(latencies: List[float], wall: float, statuses: Dict[int, int]) -> Dict:
+    latencies = sorted(latencies)
+    pct = lambda p: round(latencies[min(len(latencies) - 1, int(len(latencies) * p))], 3)
+    return {
+        "requests": len(latencies),
+        "requests_per_sec": round(len(latencies) / wall, 2),
+        "p50_ms": round(statistics.median(latencies), 3),
+        "p90_ms": pct(0.90),
+        "p99_ms": pct(0.99),
+        "max_ms": round(latencies[-1], 3),
+        "statuses": statuses,
+    }
+
+
+async def run_in_process(args: argparse.Namespace) -> Dict:
+    from src.module import app
+    from src.service.report_cache import report_cache
+    if args.no_cache:
+        report_cache._ttl = 0
+
+    sessionmanager.enable_profiling()
+    rss_before = _rss_bytes()
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        start = time.perf_counter()
+        latencies, statuses, statements = await drive(client, args)
+        wall = time.perf_counter() - start
+    result = _summary(latencies, wall, statuses)
+    result["db_statements_per_request"] = round(statements / max(len(latencies), 1), 3)
+    result["rss_growth_bytes"] = _rss_bytes() - rss_before
+    return result
+
+
+async def run_uvicorn(args: argparse.Namespace) -> Dict:
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "src.module:app", "--host", "127.0.0.1", "--port", str(args.port),
+         "--log-level", "warning", "--workers", str(args.workers)],
+        cwd=Path(__file__).resolve().parent.parent,
+        env={**os.environ, "POSTGRES_PROFILE": "1",
+             **({"CACHE_BACKEND": args.cache_backend} if args.cache_backend else {})},
+    )
+    base_url = f"http://127.0.0.1:{args.port}"
+    try:
+        async with httpx.AsyncClient(base_url=base_url, timeout=30,
+                                     limits=httpx.Limits(max_connections=args.concurrency)) as client:
+            for _ in range(100):
+                try:
+                    await client.get("/metrics")
+                    break
+                except httpx.TransportError:
+                    await asyncio.sleep(0.1)
+            rss_before = _rss_bytes(str(proc.pid))
+            start = time.perf_counter()
+            latencies, statuses, statements = await drive(client, args)
+            wall = time.perf_counter() - start
+            rss_after = _rss_bytes(str(proc.pid))
+    finally:
+        proc.terminate()
+        proc.wait(timeout=10)
+    result = _summary(latencies, wall, statuses)
+    result["db_statements_per_request"] = round(statements / max(len(latencies), 1), 3)
+    result["rss_growth_bytes"] = rss_after - rss_before
+    return result
+
+
+async def main(args: argparse.Namespace) -> None:
+    if not args.skip_seed:
+        await seed(args)
+    results: Dict[str, Dict] = {}
+    if args.target in ("asgi", "both"):
+        results["asgi"] = await run_in_process(args)
+    await sessionmanager.close()
+    if args.target in ("uvicorn", "both"):
+        results["uvicorn"] = await run_uvicorn(args)
+
+    commit = git_commit()
+    report = {
+        "commit": commit,
+        "params": {k: v for k, v in vars(args).items() if k != "out"},
+        "results": results,
+    }
+    out = Path(args.out) if args.out else RESULTS_DIR / f"feed-load-{commit}-{int(time.time())}.json"
+    out.parent.mkdir(parents=True, exist_ok=True)
+    out.write_text(json.dumps(report, indent=2))
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--leagues", type=int, default=20)
+    parser.add_argument("--gameweeks", type=int, default=3)
+    parser.add_argument("--teams", type=int, default=20)
+    parser.add_argument("--squad", type=int, default=15)
+    parser.add_argument("--league-base", type=int, default=800_000)
+    parser.add_argument("--skip-seed", action="store_true")
+    parser.add_argument("--types", nargs="+", default=["h2h", "classic"], choices=["h2h", "classic"])
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--zipf", type=float, default=1.1, help="Zipf exponent, 0 = uniform")
+    parser.add_argument("--accept-encoding", default="gzip, br")
+    parser.add_argument("--no-cache", action="store_true", help="disable the report cache (in-process only)")
+    parser.add_argument("--target", choices=["asgi", "uvicorn", "both"], default="asgi")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn worker processes")
+    parser.add_argument("--cache-backend", choices=["memory", "file", "redis"], default=None,
+                        help="CACHE_BACKEND for the uvicorn server, the environment's when omitted")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", default=None)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,91 @@
+"""GameweekFrame build and statistics cost for large synthetic leagues, without a database.
+
+    python -m benchmarks.gameweek_frame --teams 100 1000 --squad 15 --repeat 20
+
+For every league size reports, per gameweek: building the frame from the ORM graph, each league statistic
+on the frame, the whole-league similarity matrix, and the full classic and H2H report render (frame build
+included, similarity matrix cache disabled).
+"""
+import argparse
+import asyncio
+import json
+import time
+from pathlib import Path
+from typing import Callable, Dict
+
+from src.service.frame import GameweekFrame
+from src.service.service import RSSService
+from src.service.similarity import SimilarityMatrix
+from .ingest import RESULTS_DIR, git_commit
+from .synthetic import LeagueGenerator, build_h2h_gameweek, build_classic_gameweek
+
+
+def _ms(fn: Callable, repeat: int) -> float:
+    fn()
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return round((time.perf_counter() - start) * 1000 / repeat, 3)
+
+
+async def _render_ms(render, gw, repeat: int) -> float:
+    await render(gw)
+    start = time.perf_counter()
+    for _ in range(repeat):
+        await render(gw)
+    return round((time.perf_counter() - start) * 1000 / repeat, 3)
+
+
+async def measure(teams: int, args: argparse.Namespace) -> Dict:
+    generator = LeagueGenerator(teams=teams, squad_size=args.squad, seed=args.seed)
+    classic = build_classic_gameweek(generator.classic(1, 1))
+    h2h = build_h2h_gameweek(generator.h2h(2, 1))
+    frame = GameweekFrame.from_classic(classic)
+    h2h_frame = GameweekFrame.from_h2h(h2h)
+    counts = frame.ownership()
+    captains = frame.captains()
+    matrix = SimilarityMatrix(frame)
+    return {
+        "links": len(frame.link_player),
+        "players": frame.players,
+        "build_classic_ms": _ms(lambda: GameweekFrame.from_classic(classic), args.repeat),
+        "build_h2h_ms": _ms(lambda: GameweekFrame.from_h2h(h2h), args.repeat),
+        "ownership_ms": _ms(frame.ownership, args.repeat),
+        "captains_ms": _ms(frame.captains, args.repeat),
+        "top_5_ms": _ms(lambda: (frame.top_performance(5), frame.top_ownership(5, counts),
+                                 frame.top_captains(5, captains)), args.repeat),
+        "ranked_squads_ms": _ms(lambda: [frame.ranked_links(t) for t in range(frame.teams)], args.repeat),
+        "match_similarity_ms": _ms(lambda: [h2h_frame.similarity(h2h_frame.match_first[m], h2h_frame.match_second[m])
+                                            for m in range(h2h_frame.matches)], args.repeat),
+        "match_differentials_ms": _ms(lambda: (h2h_frame.top_matches(3, h2h_frame.match_margin),
+                                               h2h_frame.top_matches(3, h2h_frame.match_total)), args.repeat),
+        "similarity_matrix_ms": _ms(lambda: SimilarityMatrix(frame), max(args.repeat // 10, 1)),
+        "similarity_top_10_ms": _ms(lambda: (matrix.most_similar(10), matrix.most_different(10)),
+                                    max(args.repeat // 10, 1)),
+        "render_classic_ms": await _render_ms(RSSService._render_classic_report, classic, args.repeat),
+        "render_h2h_ms": await _render_ms(RSSService._render_h2h_report, h2h, args.repeat),
+    }
+
+
+async def main(args: argparse.Namespace) -> None:
+    results = {str(teams): await measure(teams, args) for teams in args.teams}
+    commit = git_commit()
+    report = {
+        "commit": commit,
+        "params": {k: v for k, v in vars(args).items() if k != "out"},
+        "results": results,
+    }
+    out = Path(args.out) if args.out else RESULTS_DIR / f"gameweek-frame-{commit}-{int(time.time())}.json"
+    out.parent.mkdir(parents=True, exist_ok=True)
+    out.write_text(json.dumps(report, indent=2))
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--teams", nargs="+", type=int, default=[100, 1000])
+    parser.add_argument("--squad", type=int, default=15)
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", default=None)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,217 @@
+"""End-to-end ingest benchmark against the PostgreSQL configured in the environment (POSTGRES_*).
+
+Generates synthetic H2H and classic leagues and pushes them through RSSService.create_*_item
+("service" path) and module.handle_event ("event" path, the webhook only goes to the outbox table,
+no relay runs here).
+Results are written as JSON tagged with the current git commit so runs can be compared:
+
+    python -m benchmarks.ingest --teams 20 --messages 200
+    python -m benchmarks.ingest --compare .local/bench/ingest-<a>.json .local/bench/ingest-<b>.json
+
+The benchmark writes real rows under league ids starting at --league-base; point it at a scratch database.
+"""
+import argparse
+import asyncio
+import json
+import statistics
+import subprocess
+import time
+from collections import defaultdict
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, List
+
+from sqlalchemy import event
+
+from src.postgre import sessionmanager, get_db_session, create_db_and_tables
+from src.service.service import RSSService
+from .synthetic import LeagueGenerator
+
+RESULTS_DIR = Path('.local') / 'bench'
+
+
+class StatementCounter:
+    def __init__(self):
+        self.stage = "other"
+        self.stats: Dict[str, Dict[str, float]] = defaultdict(lambda: defaultdict(float))
+
+    def _before(self, conn, cursor, statement, parameters, context, executemany):
+        context._bench_start = time.perf_counter()
+
+    def _after(self, conn, cursor, statement, parameters, context, executemany):
+        stage = self.stats[self.stage]
+        stage["statements"] += 1
+        stage["sql_ms"] += (time.perf_counter() - context._bench_start) * 1000
+        verb = statement.lstrip().split(None, 1)[0].upper()
+        if verb in ("INSERT", "UPDATE", "DELETE") and cursor.rowcount and cursor.rowcount > 0:
+            stage["rows_written"] += cursor.rowcount
+
+    def _commit(self, conn):
+        self.stats[self.stage]["commits"] += 1
+
+    def attach(self, engine) -> None:
+        event.listen(engine, "before_cursor_execute", self._before)
+        event.listen(engine, "after_cursor_execute", self._after)
+        event.listen(engine, "commit", self._commit)
+
+    def detach(self, engine) -> None:
+        event.remove(engine, "before_cursor_execute", self._before)
+        event.remove(engine, "after_cursor_execute", self._after)
+        event.remove(engine, "commit", self._commit)
+
+    def reset(self) -> None:
+        self.stats.clear()
+
+
+def _summary(latencies: List[float], wall: float, counter: StatementCounter) -> Dict:
+    latencies = sorted(latencies)
+    messages = len(latencies)
+    stages = {
+        name: {k: round(v, 3) if isinstance(v, float) else v for k, v in values.items()}
+        for name, values in counter.stats.items()
+    }
+    for values in stages.values():
+        values["statements_per_message"] = round(values.get("statements", 0) / messages, 2)
+        values["rows_per_message"] = round(values.get("rows_written", 0) / messages, 2)
+    return {
+        "messages": messages,
+        "messages_per_sec": round(messages / wall, 2),
+        "p50_ms": round(statistics.median(latencies), 3),
+        "p99_ms": round(latencies[min(messages - 1, int(messages * 0.99))], 3),
+        "stages": stages,
+    }
+
+
+def _payloads(generator: LeagueGenerator, league_type: str, league_id: int, messages: int, mode: str) -> List[Dict]:
+    make = generator.h2h if league_type == "h2h" else generator.classic
+    if mode == "fresh":
+        return [make(league_id, gw + 1) for gw in range(messages)]
+    if mode == "update":
+        return [make(league_id, 1) for _ in range(messages)]
+    first = make(league_id, 1)
+    return [first] * messages
+
+
+async def run_service_path(counter: StatementCounter, league_type: str, payloads: List[Dict]) -> Dict:
+    latencies = []
+    start_all = time.perf_counter()
+    for payload in payloads:
+        start = time.perf_counter()
+        async for db_session in get_db_session():
+            service = RSSService(db_session)
+            counter.stage = "ingest"
+            if league_type == "h2h":
+                await service.create_h2h_item(payload)
+            else:
+                await service.create_classic_item(payload)
+            counter.stage = "commit"
+            await db_session.commit()
+        latencies.append((time.perf_counter() - start) * 1000)
+    return _summary(latencies, time.perf_counter() - start_all, counter)
+
+
+async def run_event_path(counter: StatementCounter, league_type: str, payloads: List[Dict]) -> Dict:
+    from src import module
+
+    original_enqueue_webhook = RSSService.enqueue_webhook
+
+    async def enqueue_webhook_staged(service: RSSService, *args, **kwargs):
+        # attributes the payload render and the outbox insert to their own stage
+        counter.stage = "webhook"
+        try:
+            return await original_enqueue_webhook(service, *args, **kwargs)
+        finally:
+            counter.stage = "commit"
+
+    RSSService.enqueue_webhook = enqueue_webhook_staged
+    latencies = []
+    start_all = time.perf_counter()
+    try:
+        for payload in payloads:
+            start = time.perf_counter()
+            counter.stage = "ingest"
+            await module.handle_event({"payload": payload, "headers": {"type": league_type}})
+            latencies.append((time.perf_counter() - start) * 1000)
+    finally:
+        RSSService.enqueue_webhook = original_enqueue_webhook
+    return _summary(latencies, time.perf_counter() - start_all, counter)
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True,
+                              cwd=Path(__file__).resolve().parent.parent).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+async def main(args: argparse.Namespace) -> None:
+    await create_db_and_tables()
+    engine = sessionmanager.engine.sync_engine
+    counter = StatementCounter()
+    counter.attach(engine)
+    generator = LeagueGenerator(teams=args.teams, squad_size=args.squad, overlap=args.overlap,
+                                captains=not args.no_captains, seed=args.seed)
+    results = {}
+    league_id = args.league_base
+    try:
+        for league_type in args.types:
+            for path, runner in (("service", run_service_path), ("event", run_event_path)):
+                league_id += 1
+                payloads = _payloads(generator, league_type, league_id, args.messages, args.mode)
+                counter.reset()
+                results[f"{league_type}_{path}"] = await runner(counter, league_type, payloads)
+    finally:
+        counter.detach(engine)
+        await sessionmanager.close()
+
+    commit = git_commit()
+    report = {
+        "commit": commit,
+        "created": datetime.now(timezone.utc).isoformat(),
+        "params": {k: v for k, v in vars(args).items() if k not in ("out", "compare")},
+        "results": results,
+    }
+    out = Path(args.out) if args.out else RESULTS_DIR / f"ingest-{commit}-{int(time.time())}.json"
+    out.parent.mkdir(parents=True, exist_ok=True)
+    out.write_text(json.dumps(report, indent=2))
+    print(json.dumps(report, indent=2))
+    print(f"Saved to {out}")
+
+
+def compare(before_path: str, after_path: str) -> None:
+    before = json.loads(Path(before_path).read_text())
+    after = json.loads(Path(after_path).read_text())
+    print(f"{before['commit']} -> {after['commit']}")
+    for name in sorted(before["results"].keys() & after["results"].keys()):
+        b, a = before["results"][name], after["results"][name]
+        print(f"{name}:")
+        for key in ("messages_per_sec", "p50_ms", "p99_ms"):
+            change = (a[key] - b[key]) / b[key] * 100 if b[key] else 0.
+            print(f"  {key:18} {b[key]:>10} -> {a[key]:>10} ({change:+.1f}%)")
+        for stage in sorted(b["stages"].keys() | a["stages"].keys()):
+            bs, as_ = b["stages"].get(stage, {}), a["stages"].get(stage, {})
+            print(f"  {stage:8} statements/msg {bs.get('statements_per_message', 0):>7} -> "
+                  f"{as_.get('statements_per_message', 0):>7}  rows/msg {bs.get('rows_per_message', 0):>8} -> "
+                  f"{as_.get('rows_per_message', 0):>8}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--types", nargs="+", default=["h2h", "classic"], choices=["h2h", "classic"])
+    parser.add_argument("--teams", type=int, default=20)
+    parser.add_argument("--squad", type=int, default=15)
+    parser.add_argument("--overlap", type=float, default=0.5)
+    parser.add_argument("--no-captains", action="store_true")
+    parser.add_argument("--messages", type=int, default=100)
+    parser.add_argument("--mode", choices=["fresh", "update", "duplicate"], default="fresh",
+                        help="new gameweek per message, re-ingest of one gameweek, or identical snapshots")
+    parser.add_argument("--league-base", type=int, default=900_000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", default=None)
+    parser.add_argument("--compare", nargs=2, metavar=("BEFORE", "AFTER"))
+    parsed = parser.parse_args()
+    if parsed.compare:
+        compare(*parsed.compare)
+    else:
+        asyncio.run(main(parsed))
@@ -0,0 +1,141 @@
+"""Fan-out cost of the live SSE feed with many subscribers on one worker.
+
+    python -m benchmarks.live_fanout --subscribers 1000 5000 --leagues 10 --rounds 20 --interval 0.5
+
+Serves the app on a local uvicorn inside this process (lifespan off, no broker or relay), opens the SSE
+streams with httpx, then publishes one update per league and round straight into the hub. Each update
+carries its publish time, so every client measures its own delivery latency. A share of the clients reads
+slowly: once their socket buffers fill, the hub conflates updates for them instead of holding up the rest.
+
+Reports connect time, time spent in publish per update, delivery latency percentiles of the fast clients,
+updates received and conflated, and RSS growth per subscriber (clients and server share the process).
+"""
+import argparse
+import asyncio
+import json
+import statistics
+import time
+from pathlib import Path
+from typing import Dict, List
+
+import httpx
+import uvicorn
+
+from src.metrics import metrics
+from src.module import app
+from src.service.live import live_hub, LiveUpdate
+from .feed_load import _rss_bytes
+from .ingest import RESULTS_DIR, git_commit
+
+
+async def _client(client: httpx.AsyncClient, league_id: int, slow: float, latencies: List[float],
+                  connected: asyncio.Event, counts: Dict[str, int]) -> None:
+    async with client.stream("GET", f"/rss/classic/{league_id}/live") as resp:
+        connected.set()
+        async for line in resp.aiter_lines():
+            if not line.startswith("data: "):
+                continue
+            sent = json.loads(line[6:])["sent"]
+            if slow:
+                counts["received_slow"] += 1
+                await asyncio.sleep(slow)
+            else:
+                latencies.append(time.perf_counter() - sent)
+                counts["received"] += 1
+
+
+def _percentile(values: List[float], q: float) -> float:
+    return round(sorted(values)[min(int(len(values) * q), len(values) - 1)] * 1000, 3) if values else 0.
+
+
+async def measure(subscribers: int, args: argparse.Namespace) -> Dict:
+    latencies: List[float] = []
+    counts = {"received": 0, "received_slow": 0}
+    slow_clients = len(range(0, subscribers, args.slow_every))
+    teams = [{"team_id": i, "name": f"Team {i}", "points": i} for i in range(args.teams)]
+    conflated_before = metrics.get("live_conflated_total", type="classic")
+    rss_before = _rss_bytes()
+    limits = httpx.Limits(max_connections=subscribers, max_keepalive_connections=0)
+    async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{args.port}", limits=limits, timeout=None) as client:
+        start = time.perf_counter()
+        events = [asyncio.Event() for _ in range(subscribers)]
+        tasks = [asyncio.create_task(_client(client, i % args.leagues, args.slow_delay if i % args.slow_every == 0
+                                             else 0., latencies, events[i], counts))
+                 for i in range(subscribers)]
+        await asyncio.gather(*(event.wait() for event in events))
+        while len(live_hub) < subscribers:
+            await asyncio.sleep(0.01)
+        connect_s = time.perf_counter() - start
+        rss_connected = _rss_bytes()
+
+        publish_times = []
+        for round_number in range(args.rounds):
+            for league_id in range(args.leagues):
+                data = json.dumps({"type": "classic", "league_id": league_id, "round": round_number,
+                                   "teams": teams, "sent": time.perf_counter()})
+                begin = time.perf_counter()
+                await live_hub.publish(LiveUpdate("classic", league_id, data))
+                publish_times.append(time.perf_counter() - begin)
+            await asyncio.sleep(args.interval)
+        await asyncio.sleep(max(args.slow_delay, 1.))
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    return {
+        "connect_s": round(connect_s, 3),
+        "publish_us_mean": round(statistics.fmean(publish_times) * 1e6, 1),
+        "publish_us_max": round(max(publish_times) * 1e6, 1),
+        "latency_ms_p50": _percentile(latencies, 0.5),
+        "latency_ms_p99": _percentile(latencies, 0.99),
+        "latency_ms_max": _percentile(latencies, 1.),
+        "update_bytes": len(LiveUpdate("classic", 0, json.dumps({"teams": teams})).frame),
+        "expected_fast": (subscribers - slow_clients) * args.rounds,
+        "received_fast": counts["received"],
+        "expected_slow": slow_clients * args.rounds,
+        "received_slow": counts["received_slow"],
+        "conflated": int(metrics.get("live_conflated_total", type="classic") - conflated_before),
+        "rss_bytes_per_subscriber": (rss_connected - rss_before) // subscribers,
+    }
+
+
+async def main(args: argparse.Namespace) -> None:
+    server = uvicorn.Server(uvicorn.Config(app, port=args.port, lifespan="off", log_level="warning",
+                                           backlog=max(args.subscribers) + 128))
+    serving = asyncio.create_task(server.serve())
+    while not server.started:
+        await asyncio.sleep(0.05)
+    try:
+        results = {}
+        for subscribers in args.subscribers:
+            results[str(subscribers)] = await measure(subscribers, args)
+            while len(live_hub):
+                await asyncio.sleep(0.05)
+    finally:
+        server.should_exit = True
+        await serving
+
+    commit = git_commit()
+    report = {
+        "commit": commit,
+        "params": {k: v for k, v in vars(args).items() if k != "out"},
+        "results": results,
+    }
+    out = Path(args.out) if args.out else RESULTS_DIR / f"live-fanout-{commit}-{int(time.time())}.json"
+    out.parent.mkdir(parents=True, exist_ok=True)
+    out.write_text(json.dumps(report, indent=2))
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--subscribers", nargs="+", type=int, default=[1000, 5000])
+    parser.add_argument("--leagues", type=int, default=10)
+    parser.add_argument("--rounds", type=int, default=20)
+    parser.add_argument("--interval", type=float, default=0.5, help="seconds between publish rounds")
+    parser.add_argument("--teams", type=int, default=50, help="teams per update, sets the update size")
+    parser.add_argument("--slow-every", type=int, default=10, help="every n-th client reads slowly")
+    parser.add_argument("--slow-delay", type=float, default=2.0, help="pause of a slow client after each update")
+    parser.add_argument("--port", type=int, default=8772)
+    parser.add_argument("--out", default=None)
+    asyncio.run(main(parser.parse_args()))
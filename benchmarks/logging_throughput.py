@@ -0,0 +1,47 @@
+"""Consumer-side logging cost: decode + log synthetic league messages at INFO, DEBUG and WARNING.
+
+    python -m benchmarks.logging_throughput --teams 200 --messages 2000
+
+Two rates per level. loop_msgs_per_sec is what the consuming task sustains: decoding and enqueueing the
+records, which is all the event loop pays for. consumer_msgs_per_sec stops the clock only once the listener
+thread has rendered, truncated and written every record, the throughput the consumer keeps up with for long.
+"""
+import argparse
+import json
+import logging
+import time
+from typing import Dict
+
+from src.logging_setup import setup_logging, stop_logging
+from src.rabbit_pool.events import decode_message
+from .synthetic import LeagueGenerator
+
+
+def run(body: bytes, headers: dict, messages: int, level: int) -> Dict[str, float]:
+    setup_logging(logging.DEBUG, {"rabbit_module": level})
+    start = time.perf_counter()
+    for _ in range(messages):
+        decode_message("ballista-rss", body, headers)
+    enqueued = time.perf_counter() - start
+    # the listener writes out the queued records before it stops
+    stop_logging()
+    drained = time.perf_counter() - start
+    return {"loop_msgs_per_sec": round(messages / enqueued, 1), "consumer_msgs_per_sec": round(messages / drained, 1)}
+
+
+def main(args: argparse.Namespace) -> None:
+    body = json.dumps(LeagueGenerator(teams=args.teams, squad_size=args.squad).h2h(1, 1)).encode()
+    headers = {"type": "h2h"}
+    results = {"body_bytes": len(body)}
+    for name, level in (("info", logging.INFO), ("debug", logging.DEBUG), ("warning", logging.WARNING)):
+        run(body, headers, min(args.messages, 50), level)
+        results.update({f"{name}_{key}": value for key, value in run(body, headers, args.messages, level).items()})
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--teams", type=int, default=200)
+    parser.add_argument("--squad", type=int, default=15)
+    parser.add_argument("--messages", type=int, default=2000)
+    main(parser.parse_args())
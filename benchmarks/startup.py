@@ -0,0 +1,156 @@
+"""Cold-start cost of the server per role: import time of src.module and time to the first answered request.
+
+Every sample is a fresh interpreter, so nothing is shared between runs but the bytecode cache, which one
+warm-up run fills first. Time to first request spawns uvicorn and polls /metrics, so it includes the lifespan
+startup against the configured PostgreSQL, and for the api and consumer roles, which only run with the redis
+cache and live backends, against the configured redis:
+
+    python -m benchmarks.startup --repeat 5
+    python -m benchmarks.startup --roles api --skip-serve --budget-ms 900
+    python -m benchmarks.startup --compare .local/bench/startup-a.json .local/bench/startup-b.json
+
+--budget-ms fails the run when the median import time of a role exceeds it, for CI.
+"""
+import argparse
+import json
+import os
+import re
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+from typing import Dict
+
+import httpx
+
+from .ingest import RESULTS_DIR, git_commit
+
+ROOT = Path(__file__).resolve().parent.parent
+# optional subsystems whose import is deferred until a role needs them
+WATCHED = ("aio_pika", "requests", "redis", "asyncpg", "brotli")
+IMPORTTIME = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)")
+
+
+def _env(role: str) -> Dict[str, str]:
+    environ = {**os.environ, "SERVER_ROLE": role, "PYTHONPATH": str(ROOT)}
+    if role != "all":
+        environ.update(CACHE_BACKEND="redis", LIVE_BACKEND="redis")
+    return environ
+
+
+def import_sample(role: str) -> Dict:
+    probe = f"import src.module; import sys, json; print(json.dumps([m for m in {WATCHED!r} if m in sys.modules]))"
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", probe], cwd=ROOT, env=_env(role),
+                          capture_output=True, text=True, check=True)
+    packages: Dict[str, int] = {}
+    total = 0
+    for line in proc.stderr.splitlines():
+        match = IMPORTTIME.match(line)
+        if match is None:
+            continue
+        cumulative, depth, name = int(match.group(2)), len(match.group(3)), match.group(4)
+        package = name.split(".")[0]
+        if package == "src":
+            # the outermost src imports already cover everything below them
+            if depth <= 1:
+                total += cumulative
+        else:
+            # a package's first, outermost import is the one that pays for it
+            packages[package] = max(packages.get(package, 0), cumulative)
+    return {"import_ms": total / 1000, "packages": packages, "loaded": json.loads(proc.stdout.splitlines()[-1])}
+
+
+def first_request_sample(role: str, port: int, timeout: float) -> float:
+    start = time.perf_counter()
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "src.module:app", "--host", "127.0.0.1", "--port", str(port),
+         "--log-level", "warning"],
+        cwd=ROOT, env=_env(role), stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        with httpx.Client(base_url=f"http://127.0.0.1:{port}", timeout=1) as client:
+            while time.perf_counter() - start < timeout:
+                try:
+                    if client.get("/metrics").status_code == 200:
+                        return (time.perf_counter() - start) * 1000
+                except httpx.TransportError:
+                    pass
+                if proc.poll() is not None:
+                    raise RuntimeError(f"uvicorn exited with {proc.returncode} before answering")
+                time.sleep(0.01)
+        raise RuntimeError(f"No answer within {timeout}s")
+    finally:
+        proc.terminate()
+        proc.wait(timeout=30)
+
+
+def measure(role: str, args: argparse.Namespace) -> Dict:
+    import_sample(role)  # fills the bytecode cache
+    samples = [import_sample(role) for _ in range(args.repeat)]
+    heaviest: Dict[str, float] = {}
+    for sample in samples:
+        for name, cumulative in sample["packages"].items():
+            heaviest[name] = heaviest.get(name, 0) + cumulative / 1000 / len(samples)
+    result = {
+        "import_ms_median": round(statistics.median(s["import_ms"] for s in samples), 1),
+        "import_ms_min": round(min(s["import_ms"] for s in samples), 1),
+        "loaded": samples[-1]["loaded"],
+        "heaviest_ms": {name: round(ms, 1) for name, ms in
+                        sorted(heaviest.items(), key=lambda item: -item[1])[:args.top]},
+    }
+    if not args.skip_serve:
+        first = [first_request_sample(role, args.port, args.timeout) for _ in range(args.repeat)]
+        result["first_request_ms_median"] = round(statistics.median(first), 1)
+        result["first_request_ms_min"] = round(min(first), 1)
+    return result
+
+
+def main(args: argparse.Namespace) -> int:
+    results = {role: measure(role, args) for role in args.roles}
+    commit = git_commit()
+    report = {"commit": commit, "python": sys.version.split()[0],
+              "params": {k: v for k, v in vars(args).items() if k not in ("out", "compare")}, "results": results}
+    out = Path(args.out) if args.out else RESULTS_DIR / f"startup-{commit}-{int(time.time())}.json"
+    out.parent.mkdir(parents=True, exist_ok=True)
+    out.write_text(json.dumps(report, indent=2))
+    print(json.dumps(report, indent=2))
+    print(f"Saved to {out}")
+    over = [role for role, result in results.items()
+            if args.budget_ms is not None and result["import_ms_median"] > args.budget_ms]
+    if over:
+        print(f"Import time over the {args.budget_ms}ms budget: {', '.join(over)}", file=sys.stderr)
+        return 1
+    return 0
+
+
+def compare(before_path: str, after_path: str) -> None:
+    before = json.loads(Path(before_path).read_text())
+    after = json.loads(Path(after_path).read_text())
+    print(f"{before['commit']} -> {after['commit']}")
+    for role in sorted(before["results"].keys() & after["results"].keys()):
+        b, a = before["results"][role], after["results"][role]
+        print(f"{role}:")
+        for key in ("import_ms_median", "first_request_ms_median"):
+            if key in b and key in a:
+                change = (a[key] - b[key]) / b[key] * 100 if b[key] else 0.
+                print(f"  {key:24} {b[key]:>8} -> {a[key]:>8} ({change:+.1f}%)")
+        print(f"  loaded {b['loaded']} -> {a['loaded']}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--roles", nargs="+", default=["api", "consumer", "all"], choices=["api", "consumer", "all"])
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--top", type=int, default=12, help="heaviest top-level imports listed per role")
+    parser.add_argument("--skip-serve", action="store_true", help="import time only, no database needed")
+    parser.add_argument("--port", type=int, default=8766)
+    parser.add_argument("--timeout", type=float, default=30, help="seconds to wait for the first answer")
+    parser.add_argument("--budget-ms", type=float, default=None)
+    parser.add_argument("--out", default=None)
+    parser.add_argument("--compare", nargs=2, metavar=("BEFORE", "AFTER"))
+    parsed = parser.parse_args()
+    if parsed.compare:
+        compare(*parsed.compare)
+    else:
+        sys.exit(main(parsed))
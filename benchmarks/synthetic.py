@@ -0,0 +1,110 @@
+import random
+from typing import Dict, List, Optional
+
+CLUBS = ["ARS", "AVL", "BOU", "BRE", "BHA", "BUR", "CHE", "CRY", "EVE", "FUL",
+         "LEE", "LIV", "MCI", "MUN", "NEW", "NFO", "SUN", "TOT", "WHU", "WOL"]
+
+
+class LeagueGenerator:
+    def __init__(self, teams: int = 20, squad_size: int = 11, pool_size: Optional[int] = None,
+                 overlap: float = 0.5, captains: bool = True, seed: int = 0):
+        # overlap is the share of each squad drawn from a small popular core instead of the full pool
+        self.teams = teams
+        self.squad_size = squad_size
+        self.pool_size = pool_size or max(squad_size * 4, 200)
+        self.overlap = overlap
+        self.captains = captains
+        self._seed = seed
+        self._rng = random.Random(seed)
+        self._players = [
+            {"player_id": i + 1, "name": f"Player{i + 1}", "team": CLUBS[i % len(CLUBS)]}
+            for i in range(self.pool_size)
+        ]
+        self._core = self._players[:max(self.squad_size * 2, 1)]
+
+    def _squad(self, rng: random.Random) -> List[Dict]:
+        core_amount = min(int(self.squad_size * self.overlap), len(self._core))
+        picked = {p["player_id"]: p for p in rng.sample(self._core, core_amount)}
+        while len(picked) < self.squad_size:
+            p = rng.choice(self._players)
+            picked.setdefault(p["player_id"], p)
+        return list(picked.values())
+
+    def _contender(self, team_id: int, gameweek: int, points: Dict[int, int]) -> Dict:
+        # team_gameweek rows are shared by (team_id, gameweek) across leagues, so the same team must get the same
+        # squad in every league, otherwise links of all leagues pile up on one team
+        rng = random.Random(f"{self._seed}:{team_id}:{gameweek}")
+        squad = self._squad(rng)
+        captain = rng.randrange(len(squad)) if self.captains else -1
+        composition = [
+            {**p, "points": points[p["player_id"]], "factor": 2 if i == captain else 1}
+            for i, p in enumerate(squad)
+        ]
+        return {
+            "name": f"Team {team_id}",
+            "leader": f"Leader {team_id}",
+            "team_id": team_id,
+            "score": sum(p["points"] * p["factor"] for p in composition),
+            "composition": composition,
+        }
+
+    def _points(self) -> Dict[int, int]:
+        return {p["player_id"]: self._rng.choice([0, 1, 2, 2, 2, 3, 5, 6, 8, 12]) for p in self._players}
+
+    def classic(self, league_id: int, gameweek: int) -> Dict:
+        points = self._points()
+        return {
+            "league_id": league_id,
+            "gameweek": gameweek,
+            "contenders": [self._contender(team_id + 1, gameweek, points) for team_id in range(self.teams)],
+        }
+
+    def h2h(self, league_id: int, gameweek: int) -> Dict:
+        item = self.classic(league_id, gameweek)
+        ids = [c["team_id"] for c in item["contenders"]]
+        self._rng.shuffle(ids)
+        item["matches"] = [
+            {"first_contender_id": ids[i], "second_contender_id": ids[i + 1]}
+            for i in range(0, len(ids) - 1, 2)
+        ]
+        return item
+
+
+def _build_teams(item: Dict):
+    from src.postgre import TeamGameweek, TeamGameweekPlayer, PlayerGameweek, Player, Club
+    clubs: Dict[str, Club] = {}
+    players: Dict[int, PlayerGameweek] = {}
+    teams = {}
+    for contender in item["contenders"]:
+        team = TeamGameweek(team_id=contender["team_id"], name=contender["name"], leader=contender["leader"],
+                            gameweek=item["gameweek"], points=contender["score"])
+        for p in contender["composition"]:
+            if p["player_id"] not in players:
+                club = clubs.setdefault(p["team"], Club(id=len(clubs) + 1, code=p["team"]))
+                players[p["player_id"]] = PlayerGameweek(
+                    player_id=p["player_id"], gameweek=item["gameweek"], points=p["points"], club=club,
+                    player=Player(player_id=p["player_id"], name=p["name"]))
+            team.composition_links.append(
+                TeamGameweekPlayer(player_gameweek=players[p["player_id"]], factor=p["factor"]))
+        teams[contender["team_id"]] = team
+    return teams
+
+
+def build_classic_gameweek(item: Dict):
+    """Transient ORM graph for a payload, for rendering benchmarks without a database."""
+    from src.postgre import ClassicGameweek
+    teams = _build_teams(item)
+    return ClassicGameweek(league_id=item["league_id"], gameweek=item["gameweek"], contenders=list(teams.values()))
+
+
+def build_h2h_gameweek(item: Dict):
+    """Transient ORM graph for a payload, for rendering benchmarks without a database."""
+    from src.postgre import H2HGameweek, H2HMatch, H2HContenders
+    teams = _build_teams(item)
+    gw = H2HGameweek(league_id=item["league_id"], gameweek=item["gameweek"])
+    gw.contenders = [H2HContenders(team=team, points=team.points) for team in teams.values()]
+    gw.matches = [
+        H2HMatch(first_contender=teams[m["first_contender_id"]], second_contender=teams[m["second_contender_id"]])
+        for m in item["matches"]
+    ]
+    return gw
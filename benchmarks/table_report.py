@@ -0,0 +1,107 @@
+"""Table size, read latency and statements-per-read report for the per-gameweek tables.
+
+Run it before and after a schema change against the same database and diff the JSON:
+
+    python -m benchmarks.table_report --h2h-league 1 --classic-league 1 --out .local/report_before.json
+"""
+import argparse
+import asyncio
+import json
+import statistics
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from sqlalchemy import text
+
+from src.postgre import sessionmanager, H2HGameweekRepo, ClassicGameweekRepo
+
+HOT_TABLES = [
+    "player_gameweek_table",
+    "player_table",
+    "club_table",
+    "team_gameweek_table",
+    "team_gameweek_players",
+    "h2h_match_table",
+    "h2h_contenders_table",
+    "classic_gameweek_teams",
+]
+
+
+async def table_sizes() -> Dict[str, Dict[str, int]]:
+    sizes: Dict[str, Dict[str, int]] = {}
+    async with sessionmanager.session() as session:
+        for table in HOT_TABLES:
+            exists = (await session.execute(text("SELECT to_regclass(:t)"), {"t": table})).scalar()
+            if exists is None:
+                continue
+            # a partitioned table holds no rows itself, its size is the sum of its season partitions
+            row = (await session.execute(text(
+                "SELECT sum(pg_total_relation_size(relid))::bigint AS total, "
+                "sum(pg_relation_size(relid))::bigint AS heap, sum(pg_indexes_size(relid))::bigint AS indexes "
+                "FROM pg_partition_tree(:t)"
+            ), {"t": table})).one()
+            rows = (await session.execute(text(f"SELECT count(*) FROM {table}"))).scalar()
+            sizes[table] = {"rows": rows, "total_bytes": row.total, "heap_bytes": row.heap,
+                            "index_bytes": row.indexes}
+    return sizes
+
+
+async def _time_reads(fetch, iterations: int) -> Dict[str, float]:
+    timings: List[float] = []
+    statements = 0
+    for _ in range(iterations):
+        async with sessionmanager.session() as session:
+            with sessionmanager.profile("read") as stats:
+                start = time.perf_counter()
+                await fetch(session)
+                timings.append((time.perf_counter() - start) * 1000)
+            statements = stats.statements
+    timings.sort()
+    return {
+        "iterations": iterations,
+        "statements": statements,
+        "p50_ms": round(statistics.median(timings), 3),
+        "p99_ms": round(timings[min(len(timings) - 1, int(len(timings) * 0.99))], 3),
+        "mean_ms": round(statistics.fmean(timings), 3),
+    }
+
+
+async def read_latency(h2h_league: Optional[int], classic_league: Optional[int], iterations: int,
+                       last_n: int) -> Dict:
+    latency = {}
+    if h2h_league is not None:
+        latency["h2h_last_gameweek"] = await _time_reads(
+            lambda s: H2HGameweekRepo(s).get_last_n_gameweeks(h2h_league, 1), iterations)
+        latency[f"h2h_last_{last_n}_gameweeks"] = await _time_reads(
+            lambda s: H2HGameweekRepo(s).get_last_n_gameweeks(h2h_league, last_n), iterations)
+    if classic_league is not None:
+        latency["classic_last_gameweek"] = await _time_reads(
+            lambda s: ClassicGameweekRepo(s).get_last_n(classic_league, 1), iterations)
+        latency[f"classic_last_{last_n}_gameweeks"] = await _time_reads(
+            lambda s: ClassicGameweekRepo(s).get_last_n(classic_league, last_n), iterations)
+    return latency
+
+
+async def main(args: argparse.Namespace) -> None:
+    sessionmanager.enable_profiling()
+    report = {
+        "tables": await table_sizes(),
+        "read_latency": await read_latency(args.h2h_league, args.classic_league, args.iterations, args.last_n),
+    }
+    await sessionmanager.close()
+    data = json.dumps(report, indent=2)
+    if args.out:
+        Path(args.out).parent.mkdir(parents=True, exist_ok=True)
+        Path(args.out).write_text(data)
+    print(data)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--h2h-league", type=int, default=None)
+    parser.add_argument("--classic-league", type=int, default=None)
+    parser.add_argument("--iterations", type=int, default=50)
+    parser.add_argument("--last-n", type=int, default=5)
+    parser.add_argument("--out", default=None)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,36 @@
+import argparse
+import asyncio
+import sys
+
+from src.logging_setup import setup_logging
+from src.postgre import export_sessionmanager
+from src.service.export import open_export, EXPORT_FORMATS
+
+
+async def export(args: argparse.Namespace) -> None:
+    stream = await open_export(args.league_type, args.format, args.league_id, args.from_gameweek,
+                               args.to_gameweek, args.yield_per, args.season)
+    out = open(args.out, "wb") if args.out else sys.stdout.buffer
+    try:
+        async for chunk in stream:
+            out.write(chunk)
+    finally:
+        if args.out:
+            out.close()
+        await export_sessionmanager.close()
+    print(f"Exported {stream.rows} rows", file=sys.stderr)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Stream stored gameweeks as NDJSON or CSV, one row per team player")
+    parser.add_argument("league_type", choices=["h2h", "classic"])
+    parser.add_argument("--league-id", type=int, action="append", help="repeatable, all leagues when omitted")
+    parser.add_argument("--from-gameweek", type=int, default=None)
+    parser.add_argument("--to-gameweek", type=int, default=None)
+    parser.add_argument("--season", type=int, default=None, help="every season still live when omitted")
+    parser.add_argument("--format", choices=list(EXPORT_FORMATS), default="ndjson")
+    parser.add_argument("--yield-per", type=int, default=2000, help="rows fetched per cursor round-trip")
+    parser.add_argument("--out", default=None, help="file to write, stdout by default")
+    parsed = parser.parse_args()
+    setup_logging()
+    asyncio.run(export(parsed))
@@ -0,0 +1,41 @@
+import argparse
+import asyncio
+import sys
+
+from src.logging_setup import setup_logging
+from src.postgre import ClassicGameweekRepo, H2HGameweekRepo, sessionmanager, resolve_season
+from src.service.report_cache import report_cache
+from src.service.service import RSSService
+
+
+async def finalize(args: argparse.Namespace) -> None:
+    season = resolve_season(args.season)
+    try:
+        async with sessionmanager.session() as session:
+            league_ids = args.league_id
+            if not league_ids:
+                repo = H2HGameweekRepo(session) if args.league_type == "h2h" else ClassicGameweekRepo(session)
+                league_ids = await repo.get_league_ids(args.gameweek, season)
+            finalized = await RSSService(session).finalize_gameweeks(args.league_type, league_ids, args.gameweek,
+                                                                     season)
+            await session.commit()
+        # shared caches still hold the live renders of these gameweeks
+        await report_cache.invalidate_many((args.league_type, snapshot["league_id"]) for snapshot in finalized)
+    finally:
+        await report_cache.close()
+        await sessionmanager.close()
+    size = sum(snapshot["report_bytes"] + snapshot["data_bytes"] for snapshot in finalized)
+    print(f"Finalized {len(finalized)} {args.league_type} leagues, season {season} gameweek {args.gameweek}, "
+          f"{size} compressed bytes", file=sys.stderr)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Render finished gameweeks once and serve them as stored snapshots")
+    parser.add_argument("league_type", choices=["h2h", "classic"])
+    parser.add_argument("--gameweek", type=int, required=True)
+    parser.add_argument("--league-id", type=int, action="append",
+                        help="repeatable, every league with the gameweek when omitted")
+    parser.add_argument("--season", type=int, default=None, help="the current season when omitted")
+    parsed = parser.parse_args()
+    setup_logging()
+    asyncio.run(finalize(parsed))
@@ -7,5 +7,15 @@ setup_logging()
 logger = logging.getLogger(__name__)
 logger.info("Starting uvicorn server on %s:%s", env.server.host, env.server.port)
 
+class DrainingServer(uvicorn.Server):
+    # uvicorn waits for open requests before the lifespan shutdown, intake has to stop before that
+    async def shutdown(self, sockets=None):
+        from src.module import begin_drain
+        await begin_drain()
+        await super().shutdown(sockets)
+
+
 if __name__ == '__main__':
-    uvicorn.run("src.module:app", host=env.server.host, port=env.server.port, reload=False, log_config=None)
+    config = uvicorn.Config("src.module:app", host=env.server.host, port=env.server.port, reload=False,
+                            log_config=None, timeout_graceful_shutdown=env.server.drain_timeout)
+    DrainingServer(config).run()
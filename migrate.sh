@@ -1,3 +1,3 @@
-docker exec -it ballista-rss-ballista-rss-1 alembic revision --autogenerate -m "autogenerated commit"
 docker exec -it ballista-rss-ballista-rss-1 alembic upgrade head
+docker exec -it ballista-rss-ballista-rss-1 alembic revision --autogenerate -m "autogenerated commit"
 echo "Autogenerated migration on $(date)"
\ No newline at end of file
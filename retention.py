@@ -0,0 +1,44 @@
+import argparse
+import asyncio
+import sys
+
+from src import env
+from src.logging_setup import setup_logging
+from src.postgre import SeasonRepo, sessionmanager
+
+
+async def retain(args: argparse.Namespace) -> None:
+    try:
+        async with sessionmanager.connect() as conn:
+            repo = SeasonRepo(conn)
+            if not args.dry_run:
+                await repo.ensure(env.season.current)
+            seasons = await repo.seasons()
+        # the current season is always kept, even before its first gameweek arrives
+        kept = sorted(set(seasons) | {env.season.current})[-args.keep:]
+        expired = [season for season in seasons if season < min(kept)]
+        print(f"Live seasons {seasons}, keeping {kept}, archiving {expired or 'none'}", file=sys.stderr)
+        if args.dry_run:
+            return
+        for season in expired:
+            # one transaction per season, a failure leaves every season either live or archived
+            async with sessionmanager.connect() as conn:
+                await SeasonRepo(conn).archive(season, args.schema, args.tablespace)
+            print(f"Archived season {season} into {args.schema}", file=sys.stderr)
+    finally:
+        await sessionmanager.close()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Create the current season's partitions and move seasons older "
+                                                 "than the newest --keep out of the live tables")
+    parser.add_argument("--keep", type=int, default=env.season.keep, help="newest seasons left live")
+    parser.add_argument("--schema", default=env.season.archive_schema)
+    parser.add_argument("--tablespace", default=env.season.archive_tablespace,
+                        help="tablespace for archived tables, the default one when empty")
+    parser.add_argument("--dry-run", action="store_true", help="only report what would be archived")
+    parsed = parser.parse_args()
+    if parsed.keep < 1:
+        parser.error("--keep must be at least 1")
+    setup_logging()
+    asyncio.run(retain(parsed))
@@ -1,5 +1,3 @@
-from aiormq.tools import awaitable
-
 from .service.service import RSSService
 from .postgre import get_db_session, create_db_and_tables
 import asyncio
@@ -0,0 +1,57 @@
+import asyncio
+import logging
+import time
+from typing import Optional
+
+from .metrics import metrics
+
+logger = logging.getLogger("drain")
+
+
+class Drain:
+    """Shutdown deadline shared by everything that still has work in flight.
+
+    Intake stops as soon as the server is told to stop; whatever is already running then gets until the
+    deadline to finish, commit and ack before the connections close. Work still running at the deadline is
+    cancelled and counted in drain_abandoned_total, the broker and the outbox hand it out again.
+    """
+
+    def __init__(self, timeout: float = 25):
+        self.timeout = timeout
+        self.started: Optional[float] = None
+
+    @property
+    def draining(self) -> bool:
+        return self.started is not None
+
+    def begin(self) -> bool:
+        """Starts the deadline, False when a drain is already under way."""
+        if self.started is not None:
+            return False
+        self.started = time.monotonic()
+        logger.info("Draining, in-flight work has %ss to finish", self.timeout)
+        return True
+
+    def remaining(self) -> float:
+        if self.started is None:
+            return self.timeout
+        return max(self.timeout - (time.monotonic() - self.started), 0.)
+
+    async def finish(self, task: Optional[asyncio.Task], kind: str) -> bool:
+        """Waits for the task until the deadline, then cancels it. False when it had to be cancelled."""
+        if task is None:
+            return True
+        if not task.done():
+            await asyncio.wait({task}, timeout=self.remaining())
+        finished = task.done()
+        if not finished:
+            task.cancel()
+            metrics.inc("drain_abandoned_total", kind=kind)
+            logger.warning("Drain deadline passed, cancelled %s", kind)
+        await asyncio.gather(task, return_exceptions=True)
+        return finished
+
+    def done(self) -> None:
+        elapsed = time.monotonic() - self.started if self.started is not None else 0.
+        metrics.set("drain_seconds", elapsed)
+        logger.info("Drained in %.2fs", elapsed)
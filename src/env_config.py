@@ -1,20 +1,25 @@
 from pydantic_settings import BaseSettings, SettingsConfigDict
-from pydantic import Field
+from pydantic import Field, model_validator
+from typing import Dict, Literal, Optional
+from datetime import date
 
 
 class LocalSettings(BaseSettings):
     model_config = SettingsConfigDict(extra="ignore")
 
 
-# class RedisConfig(LocalSettings):
-#     host: str = Field(default="localhost", alias="REDIS_HOST")
-#     port: int = Field(default="6379", alias="REDIS_PORT")
-#     user: str = Field(default="default", alias="REDIS_USER")
-#     password: str = Field(alias="REDIS_PASSWORD")
-#
-#     @property
-#     def url(self) -> str:
-#         return f"redis://{self.user}:{self.password}@{self.host}:{self.port}"
+class RedisConfig(LocalSettings):
+    host: str = Field(default="localhost", alias="REDIS_HOST")
+    port: int = Field(default="6379", alias="REDIS_PORT")
+    user: str = Field(default="default", alias="REDIS_USER")
+    password: str = Field(default="", alias="REDIS_PASSWORD")
+    db: int = Field(default=0, alias="REDIS_DB")
+
+    @property
+    def url(self) -> str:
+        if not self.password:
+            return f"redis://{self.host}:{self.port}/{self.db}"
+        return f"redis://{self.user}:{self.password}@{self.host}:{self.port}/{self.db}"
 
 
 # class AIConfig(LocalSettings):
@@ -32,6 +37,15 @@ class RabbitConfig(LocalSettings):
     user: str = Field(default="guest", alias="RABBITMQ_USER")
     password: str = Field(default="guest", alias="RABBITMQ_PASSWORD")
     vhost: str = Field(default="/", alias="RABBITMQ_VHOST")
+    queue: str = Field(default="ballista-rss", alias="RABBITMQ_QUEUE")
+    # consumer restart delay doubles per failed attempt, capped at max_backoff
+    base_backoff: float = Field(default=1, alias="RABBITMQ_BASE_BACKOFF")
+    max_backoff: float = Field(default=60, alias="RABBITMQ_MAX_BACKOFF")
+    monitor_interval: float = Field(default=10, alias="RABBITMQ_MONITOR_INTERVAL")
+    # /readyz fails beyond these, so traffic moves away before the backlog grows
+    max_queue_depth: int = Field(default=1000, alias="RABBITMQ_MAX_QUEUE_DEPTH")
+    max_lag: float = Field(default=300, alias="RABBITMQ_MAX_LAG")
+    prefetch: int = Field(default=10, alias="RABBITMQ_PREFETCH")
 
     @property
     def url(self) -> str:
@@ -44,6 +58,11 @@ class PostgresConfig(LocalSettings):
     user: str = Field(default="postgres", alias="POSTGRES_USER")
     password: str = Field(default="pgAdminPassword", alias="POSTGRES_PASSWORD")
     db: str = Field(default="ballista-rss", alias="POSTGRES_DB")
+    profile: bool = Field(default=False, alias="POSTGRES_PROFILE")
+    # unset uses the profiler's SLOW_QUERY_MS
+    slow_query_ms: Optional[float] = Field(default=None, alias="POSTGRES_SLOW_QUERY_MS")
+    export_pool_size: int = Field(default=2, alias="POSTGRES_EXPORT_POOL_SIZE")
+    export_pool_timeout: float = Field(default=5, alias="POSTGRES_EXPORT_POOL_TIMEOUT")
 
     @property
     def url(self) -> str:
@@ -52,12 +71,126 @@ class PostgresConfig(LocalSettings):
 class ServerConfig(LocalSettings):
     host: str = Field(default="0.0.0.0", alias="SERVER_HOST")
     port: int = Field(default=8000, alias="SERVER_PORT")
+    # api serves feeds without importing or starting the RabbitMQ consumer and outbox relay; consumer runs them
+    # and skips the cache and live listeners that only feed readers need; all does both
+    role: Literal["all", "api", "consumer"] = Field(default="all", alias="SERVER_ROLE")
+    # shutdown deadline for in-flight messages, outbox batches and open requests, keep it under the orchestrator's
+    drain_timeout: float = Field(default=25, alias="SERVER_DRAIN_TIMEOUT")
+
+    @property
+    def consumes(self) -> bool:
+        return self.role in ("all", "consumer")
+
+    @property
+    def serves(self) -> bool:
+        return self.role in ("all", "api")
+
+
+class LoggingConfig(LocalSettings):
+    level: str = Field(default="INFO", alias="LOG_LEVEL")
+    # JSON objects keyed by logger name, e.g. {"rabbit_module": "WARNING"} / {"rabbit_module": 2000}
+    logger_levels: Dict[str, str] = Field(default_factory=dict, alias="LOG_LOGGER_LEVELS")
+    truncate: Dict[str, int] = Field(default_factory=lambda: {"": 4096}, alias="LOG_TRUNCATE")
+
+
+class OutboxConfig(LocalSettings):
+    batch_size: int = Field(default=50, alias="OUTBOX_BATCH_SIZE")
+    poll_interval: float = Field(default=5, alias="OUTBOX_POLL_INTERVAL")
+    max_attempts: int = Field(default=10, alias="OUTBOX_MAX_ATTEMPTS")
+    # retry delay doubles per failed attempt, capped at max_backoff
+    base_backoff: float = Field(default=5, alias="OUTBOX_BASE_BACKOFF")
+    max_backoff: float = Field(default=900, alias="OUTBOX_MAX_BACKOFF")
+    # seconds a claimed message stays with its relay; longer than a target's queued messages take to go out,
+    # or the last of them are claimed and sent a second time
+    lease: float = Field(default=300, alias="OUTBOX_LEASE")
+    # delivered and dead messages are deleted this long after their last attempt, a week by default
+    retention: float = Field(default=604800, alias="OUTBOX_RETENTION")
+    purge_interval: float = Field(default=600, alias="OUTBOX_PURGE_INTERVAL")
+
+
+class WebhookConfig(LocalSettings):
+    # used for leagues without subscriptions, empty disables the fallback
+    default_url: str = Field(default="https://n8n.ontext.info/webhook/106de94f-9628-49c4-bbde-4d48dfbcc173",
+                             alias="WEBHOOK_DEFAULT_URL")
+    timeout: float = Field(default=10, alias="WEBHOOK_TIMEOUT")
+    rate_limit_per_minute: int = Field(default=120, alias="WEBHOOK_RATE_LIMIT_PER_MINUTE")
+    breaker_failures: int = Field(default=5, alias="WEBHOOK_BREAKER_FAILURES")
+    breaker_reset: float = Field(default=60, alias="WEBHOOK_BREAKER_RESET")
+    # threads posting webhooks, each target uses at most one at a time
+    max_workers: int = Field(default=8, alias="WEBHOOK_MAX_WORKERS")
+
+
+class CacheConfig(LocalSettings):
+    # memory keeps reports per worker, file and redis share them between workers and replicas
+    backend: str = Field(default="memory", alias="CACHE_BACKEND")
+    ttl: float = Field(default=60, alias="CACHE_TTL")
+    max_entries: int = Field(default=512, alias="CACHE_MAX_ENTRIES")
+    directory: str = Field(default=".local/cache", alias="CACHE_DIR")
+    # per-worker copy in front of redis, bounds how long a lost invalidation message can serve a stale report
+    local_ttl: float = Field(default=5, alias="CACHE_LOCAL_TTL")
+    lock_timeout: float = Field(default=10, alias="CACHE_LOCK_TIMEOUT")
+    prefix: str = Field(default="ballista-rss", alias="CACHE_PREFIX")
+
+
+def _season_of(day: date) -> int:
+    # seasons are named by their first year, 2025 is 2025/26; the game reopens in July ahead of the August kick-off,
+    # so July already belongs to the new season
+    return day.year if day.month >= 7 else day.year - 1
+
+
+class SeasonConfig(LocalSettings):
+    # pins the season snapshots without one are stored under, and the partition feeds and standings read by default;
+    # unset, it follows the calendar on every lookup, so a long-running worker rolls over on July 1st by itself
+    configured: Optional[int] = Field(default=None, alias="SEASON")
+    # seasons older than the newest `keep` are moved to the archive schema by retention.py
+    keep: int = Field(default=2, alias="SEASON_KEEP")
+    archive_schema: str = Field(default="archive", alias="SEASON_ARCHIVE_SCHEMA")
+    # empty keeps archived tables on the default tablespace
+    archive_tablespace: str = Field(default="", alias="SEASON_ARCHIVE_TABLESPACE")
+
+    @property
+    def current(self) -> int:
+        return self.configured if self.configured is not None else _season_of(date.today())
+
+
+class LedgerConfig(LocalSettings):
+    # keys of consumed messages are kept this long, well past the longest time the broker holds a message back
+    ttl: float = Field(default=86400, alias="LEDGER_TTL")
+    # keys this worker committed are also remembered in memory and skipped without a query
+    max_entries: int = Field(default=100000, alias="LEDGER_MAX_ENTRIES")
+    purge_interval: float = Field(default=600, alias="LEDGER_PURGE_INTERVAL")
+
+
+class LiveConfig(LocalSettings):
+    # local pushes to the subscribers of the worker that stored the snapshot, redis relays to every worker
+    backend: str = Field(default="local", alias="LIVE_BACKEND")
+    max_subscribers: int = Field(default=10000, alias="LIVE_MAX_SUBSCRIBERS")
+    heartbeat: float = Field(default=15, alias="LIVE_HEARTBEAT")
+    channel: str = Field(default="ballista-rss:live", alias="LIVE_CHANNEL")
 
 
 class Env(LocalSettings):
     rabbit: RabbitConfig = Field(default_factory=RabbitConfig)
     postgres: PostgresConfig = Field(default_factory=PostgresConfig)
     server: ServerConfig = Field(default_factory=ServerConfig)
+    logging: LoggingConfig = Field(default_factory=LoggingConfig)
+    outbox: OutboxConfig = Field(default_factory=OutboxConfig)
+    webhook: WebhookConfig = Field(default_factory=WebhookConfig)
+    redis: RedisConfig = Field(default_factory=RedisConfig)
+    cache: CacheConfig = Field(default_factory=CacheConfig)
+    live: LiveConfig = Field(default_factory=LiveConfig)
+    ledger: LedgerConfig = Field(default_factory=LedgerConfig)
+    # SEASON itself is the pinned season of SeasonConfig, the group must not be read from it
+    season: SeasonConfig = Field(default_factory=SeasonConfig, alias="SEASON_SETTINGS")
+
+    @model_validator(mode="after")
+    def _split_roles_share_state(self) -> "Env":
+        # api workers only learn about stored snapshots through redis, per-process backends would serve stale
+        # reports and never push a live update
+        if self.server.role != "all" and (self.cache.backend != "redis" or self.live.backend != "redis"):
+            raise ValueError(f"SERVER_ROLE={self.server.role} needs CACHE_BACKEND=redis and LIVE_BACKEND=redis, "
+                             f"got {self.cache.backend} and {self.live.backend}")
+        return self
 
     @classmethod
     def load(cls) -> "Env":
@@ -1,15 +1,78 @@
+import atexit
 import logging
-from logging.handlers import RotatingFileHandler
+from logging.handlers import RotatingFileHandler, QueueHandler, QueueListener
 from pathlib import Path
+from queue import SimpleQueue
+from typing import Dict, Optional, Union
 import sys
 import traceback
 
+from . import env
+
 LOG_FILE_PATH = Path('.local') / 'app.log'
 
 _DEF_FORMAT = '[%(asctime)s] %(levelname)s %(name)s:%(lineno)d %(message)s'
 _DEF_DATEFMT = '%Y-%m-%d %H:%M:%S'
 
+_EXC_FORMATTER = logging.Formatter()
+
 _configured = False
+_listener: Optional[QueueListener] = None
+
+
+class TruncatingFilter(logging.Filter):
+    """Caps the rendered message length per logger; the longest matching logger name prefix wins."""
+
+    def __init__(self, limits: Dict[str, int]):
+        super().__init__()
+        self._limits = limits
+
+    def _limit_for(self, name: str) -> Optional[int]:
+        while True:
+            if name in self._limits:
+                return self._limits[name]
+            if not name:
+                return None
+            name = name.rpartition('.')[0]
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        limit = self._limit_for(record.name)
+        if limit is None or limit <= 0:
+            return True
+        message = record.getMessage()
+        if len(message) > limit:
+            record.msg = f"{message[:limit]}... [{len(message) - limit} chars truncated]"
+            record.args = None
+        return True
+
+
+class DeferredQueueHandler(QueueHandler):
+    """Enqueues the record as logged, its message is rendered by the listener thread's handlers.
+
+    QueueHandler.prepare formats the record on the logging thread, for the event loop that is the cost of
+    rendering every message, a DEBUG payload included. Only the traceback is rendered here, while its frames
+    still hold the values it shows. The arguments are referenced, not copied: log immutable values, or values
+    the caller no longer changes, a payload as its raw bytes rather than the decoded dict.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        if record.exc_info and not record.exc_text:
+            record.exc_text = _EXC_FORMATTER.formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+class TruncatingQueueListener(QueueListener):
+    """Truncates each record once on the listener thread, before it is handed to the handlers."""
+
+    def __init__(self, queue, *handlers, truncate: TruncatingFilter, respect_handler_level: bool = False):
+        super().__init__(queue, *handlers, respect_handler_level=respect_handler_level)
+        self._truncate = truncate
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        self._truncate.filter(record)
+        return record
+
 
 def _log_unhandled_exception(exc_type, exc_value, exc_tb):
     logger = logging.getLogger('UNCAUGHT')
@@ -17,10 +80,29 @@ def _log_unhandled_exception(exc_type, exc_value, exc_tb):
     logger.error('Uncaught exception with traceback:\n%s', formatted_tb)
 
 
-def setup_logging(level: int = logging.INFO):
-    global _configured
+def _resolve_level(level: Union[int, str]) -> int:
+    if isinstance(level, int):
+        return level
+    return logging.getLevelNamesMapping()[level.upper()]
+
+
+def stop_logging():
+    """Writes out the queued records and stops the listener, setup_logging may be called again afterwards."""
+    global _configured, _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+    _configured = False
+
+
+def setup_logging(level: Union[int, str, None] = None, logger_levels: Dict[str, Union[int, str]] = None,
+                  truncate: Dict[str, int] = None):
+    global _configured, _listener
     if _configured:
         return
+    level = _resolve_level(level if level is not None else env.logging.level)
+    logger_levels = logger_levels if logger_levels is not None else env.logging.logger_levels
+    truncate = truncate if truncate is not None else env.logging.truncate
     LOG_FILE_PATH.parent.mkdir(parents=True, exist_ok=True)
 
     root = logging.getLogger()
@@ -36,12 +118,23 @@ def setup_logging(level: int = logging.INFO):
     ch = logging.StreamHandler()
     ch.setLevel(level)
     ch.setFormatter(formatter)
-    root.addHandler(ch)
 
     fh = RotatingFileHandler(LOG_FILE_PATH, maxBytes=5 * 1024 * 1024, backupCount=3, encoding='utf-8')
     fh.setLevel(level)
     fh.setFormatter(formatter)
-    root.addHandler(fh)
+
+    # The event loop thread only enqueues records; rendering the message, truncating it, formatting
+    # the final line and all I/O happen on the listener thread
+    queue = SimpleQueue()
+    root.addHandler(DeferredQueueHandler(queue))
+    _listener = TruncatingQueueListener(queue, ch, fh, truncate=TruncatingFilter(truncate),
+                                        respect_handler_level=True)
+    _listener.start()
+    atexit.unregister(stop_logging)
+    atexit.register(stop_logging)
+
+    for name, logger_level in logger_levels.items():
+        logging.getLogger(name).setLevel(_resolve_level(logger_level))
 
     # Install global exception hook for traceback logging
     sys.excepthook = _log_unhandled_exception
@@ -49,4 +142,5 @@ def setup_logging(level: int = logging.INFO):
     logging.getLogger(__name__).info('Logging initialized. File=%s', LOG_FILE_PATH.resolve())
     _configured = True
 
-__all__ = ['setup_logging', 'LOG_FILE_PATH']
+__all__ = ['setup_logging', 'stop_logging', 'TruncatingFilter', 'DeferredQueueHandler', 'TruncatingQueueListener',
+           'LOG_FILE_PATH']
@@ -0,0 +1,47 @@
+from collections import defaultdict
+from threading import Lock
+from typing import Dict, Tuple
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+
+class Metrics:
+    def __init__(self):
+        self._lock = Lock()
+        self._counters: Dict[str, Dict[LabelKey, float]] = defaultdict(lambda: defaultdict(float))
+        self._gauges: Dict[str, Dict[LabelKey, float]] = defaultdict(dict)
+
+    @staticmethod
+    def _key(labels: Dict[str, object]) -> LabelKey:
+        return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+    def inc(self, name: str, value: float = 1, **labels) -> None:
+        with self._lock:
+            self._counters[name][self._key(labels)] += value
+
+    def set(self, name: str, value: float, **labels) -> None:
+        with self._lock:
+            self._gauges[name][self._key(labels)] = value
+
+    def get(self, name: str, **labels) -> float:
+        key = self._key(labels)
+        with self._lock:
+            if name in self._gauges:
+                return self._gauges[name].get(key, 0)
+            return self._counters[name].get(key, 0) if name in self._counters else 0
+
+    def render(self) -> str:
+        lines = []
+        with self._lock:
+            for kind, series in (("counter", self._counters), ("gauge", self._gauges)):
+                for name in sorted(series):
+                    lines.append(f"# TYPE {name} {kind}")
+                    for key, value in series[name].items():
+                        labels = ",".join(f'{k}="{v}"' for k, v in key)
+                        lines.append(f"{name}{{{labels}}} {value:g}" if labels else f"{name} {value:g}")
+        return "\n".join(lines) + "\n"
+
+
+metrics = Metrics()
+
+__all__ = ['Metrics', 'metrics']
@@ -1,64 +1,354 @@
-from src.rabbit_pool import subscribe_to_events, rabbitmq_manager
-from fastapi import FastAPI, Response, Depends
+from fastapi import FastAPI, Response, Depends, Header, Request, Query
+from fastapi.responses import StreamingResponse
+from starlette.background import BackgroundTask
 from contextlib import asynccontextmanager
 from .postgre import *
 from .service import *
 import asyncio
-from .service.service import RSSService
+from .service.service import RSSService, MAX_BATCH_KEYS
+from .service.models import ReportKeyModel, WebhookSubscriptionModel, WebhookSubscriptionOutModel
+from .service.webhooks import webhook_dispatcher
+from .service.export import open_export, EXPORT_FORMATS
+from .service.outbox import outbox_relay
+from .service.report_cache import report_cache, negotiate_encoding, CachedReport
+from .service.live import live_hub, LiveUpdate
+from .service.ledger import message_ledger, message_key, is_checked
+from .metrics import metrics
+from .drain import Drain
+from . import env
+from typing import List, Optional
+from uuid import UUID
+import json
 
 
-async def rabbitmq_line():
-    await rabbitmq_manager.connect()
-
-    async def handle_event(message: dict):
-        payload = message.get("payload", {})
-        header = message.get("headers", {})
-        league_type = header["type"]
+async def handle_event(message: dict):
+    payload = message.get("payload", {})
+    header = message.get("headers", {})
+    league_type = header["type"]
+    key = message_key(message)
+    checked = is_checked(message, key)
+    if checked and message_ledger.seen(key):
+        metrics.inc("ingest_duplicates_total", type=league_type, source="memory")
+        return
+    with sessionmanager.profile(f"message:{league_type}"):
         async for db_session in get_db_session():
+            # the key commits with the message's writes, a message that fails stays claimable for its redelivery
+            if not checked:
+                await message_ledger.record(db_session, key, league_type)
+            elif not await message_ledger.claim(db_session, key, league_type):
+                metrics.inc("ingest_duplicates_total", type=league_type, source="database")
+                message_ledger.remember(key)
+                return
             service = RSSService(db_session)
-            if league_type == "h2h":
-                await service.create_h2h_item(payload)
+            item_uuid = None
+            if league_type == "points":
+                # corrections only: the gameweek was announced when it was first stored, no webhook goes out
+                affected = await service.apply_points_delta(payload)
+                await db_session.commit()
+                await report_cache.invalidate_many(affected)
+                for affected_type, affected_id in affected:
+                    if live_hub.wanted(affected_type, affected_id):
+                        await live_hub.publish(LiveUpdate.points(affected_type, affected_id))
+            elif league_type == "h2h":
+                item_uuid = await service.create_h2h_item(payload)
             elif league_type == "classic":
-                await service.create_classic_item(payload)
-            await service.send_webhook(int(payload['league_id']), league_type)
-            await db_session.commit()
-    try:
-        await subscribe_to_events("ballista-rss", handle_event)
-    finally:
-        await rabbitmq_manager.close()
+                item_uuid = await service.create_classic_item(payload)
+            if item_uuid is not None:
+                # the webhook is stored with the gameweek and only leaves through the relay after the commit
+                await service.enqueue_webhook(int(payload['league_id']), league_type)
+                await db_session.commit()
+                await report_cache.invalidate(league_type, int(payload['league_id']))
+                outbox_relay.notify()
+                if live_hub.wanted(league_type, int(payload['league_id'])):
+                    await live_hub.publish(LiveUpdate.snapshot(league_type, payload))
+            elif league_type != "points":
+                # unknown type or a snapshot identical to the stored one - only the key is written, nothing to notify
+                await db_session.commit()
+            message_ledger.remember(key)
+
+
+consumer = None
+if env.server.consumes:
+    # aio-pika is only imported where messages are consumed
+    from .rabbit_pool import rabbitmq_manager, ConsumerSupervisor
+    consumer = ConsumerSupervisor(rabbitmq_manager, env.rabbit.queue, handle_event, env.rabbit.base_backoff,
+                                  env.rabbit.max_backoff, env.rabbit.monitor_interval, env.rabbit.max_queue_depth,
+                                  env.rabbit.max_lag, env.rabbit.prefetch)
+drain = Drain(env.server.drain_timeout)
+
+async def begin_drain():
+    """Stops taking new work. Called by the server as soon as it is told to stop, before open requests finish."""
+    if not drain.begin():
+        return
+    if consumer is not None:
+        consumer.stop_consuming()
+    outbox_relay.stop()
+    # streams never end on their own and would hold the server until the deadline
+    live_hub.close_streams()
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     await create_db_and_tables()
-    task = asyncio.create_task(rabbitmq_line())  # фоновая подписка на RabbitMQ
+    if env.server.serves:
+        await report_cache.start()
+        await live_hub.start()
+    relay_task = None
+    if consumer is not None:
+        consumer.start()  # фоновая подписка на RabbitMQ
+        relay_task = asyncio.create_task(outbox_relay.run())
 
     try:
         yield
     finally:
-        task.cancel()
+        await begin_drain()
+        # the handler in hand commits and acks, the outbox batch in hand is delivered, then connections close
+        if consumer is not None:
+            await consumer.drain(drain)
+        await drain.finish(relay_task, "outbox_batch")
+        drain.done()
         await sessionmanager.close()
+        await export_sessionmanager.close()
+        await report_cache.close()
+        await live_hub.close()
 
 app = FastAPI(lifespan=lifespan)
 
+@app.middleware("http")
+async def db_profiling(request: Request, call_next):
+    if sessionmanager.profiler is None:
+        return await call_next(request)
+    with sessionmanager.profile(request.url.path) as stats:
+        response = await call_next(request)
+        route = request.scope.get("route")
+        stats.label = f"{request.method} {route.path if route else request.url.path}"
+    response.headers.update(stats.as_headers())
+    return response
+
+@app.get("/healthz")
+async def get_health():
+    # liveness: a broker outage is waited out, only a dead supervisor needs a restart
+    if consumer is None:
+        return Response(content=json.dumps({"alive": True, "role": env.server.role}), media_type="application/json")
+    status = {"alive": consumer.alive(), "consumer": consumer.status()}
+    return Response(content=json.dumps(status), media_type="application/json",
+                    status_code=200 if status["alive"] else 503)
+
+@app.get("/readyz")
+async def get_readiness():
+    if consumer is None:
+        return Response(content=json.dumps({"ready": True, "role": env.server.role}), media_type="application/json")
+    problems = consumer.problems()
+    status = {"ready": not problems, "problems": problems, "consumer": consumer.status()}
+    return Response(content=json.dumps(status), media_type="application/json", status_code=503 if problems else 200)
+
+@app.get("/metrics", response_class=Response)
+async def get_metrics():
+    return Response(content=metrics.render(), media_type="text/plain")
+
+@app.get("/debug/queries")
+async def get_query_stats():
+    if sessionmanager.profiler is None:
+        return Response(content="Query profiling is disabled (POSTGRES_PROFILE)", status_code=404)
+    return sessionmanager.profiler.summary()
+
+def _report_response(report: CachedReport, accept_encoding: Optional[str]) -> Response:
+    encoding = negotiate_encoding(accept_encoding, len(report.body))
+    headers = {"Vary": "Accept-Encoding"}
+    if encoding != "identity":
+        headers["Content-Encoding"] = encoding
+    if report.final:
+        # a finalized gameweek never changes, clients and proxies may keep it for good
+        headers["Cache-Control"] = "public, max-age=31536000, immutable"
+    return Response(content=report.encoded(encoding), media_type=report.media_type, headers=headers)
+
 @app.get("/rss/h2h/{league_id}", response_class=Response)
-async def get_rss_feed(league_id: int, db_session=Depends(get_db_session)):
-    pass
+async def get_rss_feed(league_id: int, gameweek: Optional[int] = None, db_session=Depends(get_db_session),
+                       accept_encoding: Optional[str] = Header(default=None)):
     service = RSSService(db_session)
     try:
-        rss_xml = await service.generate_h2h_report(league_id)
+        report = await service.get_report("h2h", league_id, gameweek)
     except DatabaseException as e:
         return Response(content=str(e), status_code=404)
     except Exception as e:
         return Response(content=str(e), status_code=500)
-    return Response(content=rss_xml, media_type="text/plain")
+    return _report_response(report, accept_encoding)
 #
 @app.get("/rss/classic/{league_id}", response_class=Response)
-async def get_rss_feed(league_id: int, db_session=Depends(get_db_session)):
+async def get_rss_feed(league_id: int, gameweek: Optional[int] = None, db_session=Depends(get_db_session),
+                       accept_encoding: Optional[str] = Header(default=None)):
+    service = RSSService(db_session)
+    try:
+        report = await service.get_report("classic", league_id, gameweek)
+    except DatabaseException as e:
+        return Response(content=str(e), status_code=404)
+    except Exception as e:
+        return Response(content=str(e), status_code=500)
+    return _report_response(report, accept_encoding)
+
+@app.post("/rss/{league_type}/{league_id}/finalize")
+async def finalize_gameweek(league_type: str, league_id: int, gameweek: int, season: Optional[int] = None,
+                            db_session=Depends(get_db_session)):
     service = RSSService(db_session)
     try:
-        rss_xml = await service.generate_classic_report(league_id)
+        finalized = await service.finalize_gameweeks(league_type, [league_id], gameweek, season)
+        await db_session.commit()
     except DatabaseException as e:
         return Response(content=str(e), status_code=404)
+    except RSSServiceException as e:
+        return Response(content=str(e), status_code=400)
     except Exception as e:
         return Response(content=str(e), status_code=500)
-    return Response(content=rss_xml, media_type="text/plain")
\ No newline at end of file
+    # cached reports of the gameweek were rendered live, the next request picks up the final one
+    await report_cache.invalidate(league_type, league_id)
+    return finalized[0]
+
+@app.post("/rss/batch", response_class=Response)
+async def get_rss_batch(keys: List[ReportKeyModel], db_session=Depends(get_db_session),
+                        accept_encoding: Optional[str] = Header(default=None)):
+    if len(keys) > MAX_BATCH_KEYS:
+        return Response(content=f"At most {MAX_BATCH_KEYS} reports per batch", status_code=400)
+    service = RSSService(db_session)
+    try:
+        reports = await service.get_reports([(k.type, k.league_id, k.gameweek) for k in keys])
+    except Exception as e:
+        return Response(content=str(e), status_code=500)
+    items = []
+    for (league_type, league_id, gameweek), report in reports.items():
+        item = {"type": league_type, "league_id": league_id, "gameweek": gameweek}
+        if isinstance(report, CachedReport):
+            item["report"] = report.body.decode()
+        else:
+            item["error"] = str(report)
+        items.append(item)
+    body = json.dumps({"reports": items}, ensure_ascii=False).encode()
+    return _report_response(CachedReport(body=body, media_type="application/json"), accept_encoding)
+
+@app.get("/export/{league_type}")
+async def export_gameweeks(league_type: str, league_id: Optional[List[int]] = Query(default=None),
+                           from_gameweek: Optional[int] = None, to_gameweek: Optional[int] = None,
+                           season: Optional[int] = None,
+                           export_format: str = Query(default="ndjson", alias="format")):
+    try:
+        stream = await open_export(league_type, export_format, league_id, from_gameweek, to_gameweek,
+                                   season=season)
+    except ExportBusyException as e:
+        return Response(content=str(e), status_code=503, headers={"Retry-After": "30"})
+    except RSSServiceException as e:
+        return Response(content=str(e), status_code=400)
+    except Exception as e:
+        return Response(content=str(e), status_code=500)
+    headers = {"Content-Disposition": f'attachment; filename="{league_type}-gameweeks.{export_format}"'}
+    # the background task releases the export connection even if the client disconnects mid-stream
+    return StreamingResponse(stream, media_type=EXPORT_FORMATS[export_format], headers=headers,
+                             background=BackgroundTask(stream.aclose))
+
+@app.post("/webhooks/subscriptions", response_model=WebhookSubscriptionOutModel)
+async def add_webhook_subscription(subscription: WebhookSubscriptionModel, db_session=Depends(get_db_session)):
+    service = RSSService(db_session)
+    try:
+        stored = await service.add_webhook_subscription(subscription.league_type, subscription.league_id,
+                                                        str(subscription.url), subscription.rate_limit_per_minute)
+        await db_session.commit()
+    except RSSServiceException as e:
+        return Response(content=str(e), status_code=400)
+    return WebhookSubscriptionOutModel.model_validate(stored)
+
+@app.get("/webhooks/subscriptions", response_model=List[WebhookSubscriptionOutModel])
+async def get_webhook_subscriptions(league_type: Optional[str] = None, league_id: Optional[int] = None,
+                                    db_session=Depends(get_db_session)):
+    service = RSSService(db_session)
+    subscriptions = await service.get_webhook_subscriptions(league_type, league_id)
+    return [WebhookSubscriptionOutModel.model_validate(s) for s in subscriptions]
+
+@app.delete("/webhooks/subscriptions/{subscription_id}")
+async def remove_webhook_subscription(subscription_id: UUID, db_session=Depends(get_db_session)):
+    service = RSSService(db_session)
+    try:
+        await service.remove_webhook_subscription(subscription_id)
+        await db_session.commit()
+    except DatabaseException as e:
+        return Response(content=str(e), status_code=404)
+    return Response(status_code=204)
+
+@app.get("/webhooks/stats")
+async def get_webhook_stats():
+    return webhook_dispatcher.stats()
+
+@app.get("/rss/h2h/{league_id}/standings", response_class=Response)
+async def get_h2h_standings(league_id: int, db_session=Depends(get_db_session)):
+    service = RSSService(db_session)
+    try:
+        text = await service.generate_h2h_standings(league_id)
+    except DatabaseException as e:
+        return Response(content=str(e), status_code=404)
+    except Exception as e:
+        return Response(content=str(e), status_code=500)
+    return Response(content=text, media_type="text/plain")
+
+@app.get("/rss/classic/{league_id}/standings", response_class=Response)
+async def get_classic_standings(league_id: int, db_session=Depends(get_db_session)):
+    service = RSSService(db_session)
+    try:
+        text = await service.generate_classic_standings(league_id)
+    except DatabaseException as e:
+        return Response(content=str(e), status_code=404)
+    except Exception as e:
+        return Response(content=str(e), status_code=500)
+    return Response(content=text, media_type="text/plain")
+
+async def _similarity_response(league_type: str, league_id: int, gameweek: Optional[int], top: int, matrix: bool,
+                               db_session) -> Response:
+    service = RSSService(db_session)
+    try:
+        data = await service.generate_similarity_json(league_type, league_id, gameweek, top, matrix)
+    except DatabaseException as e:
+        return Response(content=str(e), status_code=404)
+    except Exception as e:
+        return Response(content=str(e), status_code=500)
+    return Response(content=json.dumps(data, ensure_ascii=False), media_type="application/json")
+
+@app.get("/rss/h2h/{league_id}/similarity", response_class=Response)
+async def get_h2h_similarity(league_id: int, gameweek: Optional[int] = None, top: int = Query(default=10, ge=1, le=100),
+                             matrix: bool = False, db_session=Depends(get_db_session)):
+    return await _similarity_response("h2h", league_id, gameweek, top, matrix, db_session)
+
+@app.get("/rss/classic/{league_id}/similarity", response_class=Response)
+async def get_classic_similarity(league_id: int, gameweek: Optional[int] = None,
+                                 top: int = Query(default=10, ge=1, le=100), matrix: bool = False,
+                                 db_session=Depends(get_db_session)):
+    return await _similarity_response("classic", league_id, gameweek, top, matrix, db_session)
+
+async def _live_events(league_type: str, league_id: int):
+    # subscribed on the first read, so a response that never starts streaming holds no subscription
+    with live_hub.subscribe(league_type, league_id) as subscription:
+        yield f"retry: {int(live_hub.heartbeat * 1000)}\n\n".encode()
+        while not subscription.closed:
+            update = await subscription.next(live_hub.heartbeat)
+            if update is not None:
+                yield update.frame
+            elif not subscription.closed:
+                # the comment keeps proxies from timing the stream out and finds clients that went away
+                yield b": ping\n\n"
+
+class _LiveResponse(StreamingResponse):
+    async def __call__(self, scope, receive, send):
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            # a disconnect cancels the pending send and leaves the generator parked at a yield
+            await self.body_iterator.aclose()
+
+def _live_response(league_type: str, league_id: int) -> Response:
+    if live_hub.full():
+        metrics.inc("live_rejected_total", type=league_type)
+        return Response(content="Live feed is full, retry later", status_code=503, headers={"Retry-After": "30"})
+    headers = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    return _LiveResponse(_live_events(league_type, league_id), media_type="text/event-stream", headers=headers)
+
+@app.get("/rss/h2h/{league_id}/live")
+async def get_h2h_live(league_id: int):
+    return _live_response("h2h", league_id)
+
+@app.get("/rss/classic/{league_id}/live")
+async def get_classic_live(league_id: int):
+    return _live_response("classic", league_id)
@@ -1,3 +1,3 @@
-from .engine import Base, sessionmanager, get_db_session, create_db_and_tables
+from .engine import Base, sessionmanager, export_sessionmanager, get_db_session, create_db_and_tables
 from .models import *
 from .repository import *
@@ -1,4 +1,5 @@
 import asyncio
+import re
 from logging.config import fileConfig
 
 from sqlalchemy import pool
@@ -23,8 +24,22 @@ if config.config_file_name is not None:
 # from myapp import mymodel
 # target_metadata = mymodel.Base.metadata
 from src.postgre import Base
+from src.postgre.repository.season_repo import PARTITIONED_TABLES
 target_metadata = Base.metadata
 
+SEASON_PARTITION = re.compile(rf"^({'|'.join(PARTITIONED_TABLES)})_\d+$")
+
+
+def include_object(object, name, type_, reflected, compare_to):
+    # season partitions and the keys Postgres clones onto them are created by SeasonRepo.ensure, not the models
+    if type_ == "table":
+        return not SEASON_PARTITION.match(name)
+    if type_ == "foreign_key_constraint" and reflected:
+        return not SEASON_PARTITION.match(object.referred_table.name)
+    if type_ == "index" and reflected:
+        return not SEASON_PARTITION.match(object.table.name)
+    return True
+
 # other values from the config, defined by the needs of env.py,
 # can be acquired:
 # my_important_option = config.get_main_option("my_important_option")
@@ -48,6 +63,7 @@ def run_migrations_offline() -> None:
         url=url,
         target_metadata=target_metadata,
         literal_binds=True,
+        include_object=include_object,
         dialect_opts={"paramstyle": "named"},
     )
 
@@ -56,7 +72,7 @@ def run_migrations_offline() -> None:
 
 
 def do_run_migrations(connection: Connection) -> None:
-    context.configure(connection=connection, target_metadata=target_metadata)
+    context.configure(connection=connection, target_metadata=target_metadata, include_object=include_object)
 
     with context.begin_transaction():
         context.run_migrations()
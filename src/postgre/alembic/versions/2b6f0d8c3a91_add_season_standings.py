@@ -0,0 +1,135 @@
+"""add season standings and backfill them from the stored gameweeks
+
+Revision ID: 2b6f0d8c3a91
+Revises:
+Create Date: 2026-10-19 12:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+from src import env
+
+
+# revision identifiers, used by Alembic.
+revision: str = '2b6f0d8c3a91'
+down_revision: Union[str, Sequence[str], None] = None
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# a match is scored by the teams' gameweek points, the contender points are the league points it earned
+H2H_SIDES = (
+    "SELECT g.league_id, g.gameweek, t.team_id, t.name, t.leader, t.points AS scored, o.points AS conceded "
+    "FROM h2h_match_table m "
+    "JOIN h2h_gameweek_table g ON g.id = m.h2h_gameweek_id "
+    "JOIN team_gameweek_table t ON t.id = m.{own}_contender_id "
+    "JOIN team_gameweek_table o ON o.id = m.{other}_contender_id"
+)
+
+
+def _columns(table: str) -> set:
+    return {column['name'] for column in sa.inspect(op.get_bind()).get_columns(table)}
+
+
+def _create_standings(tables) -> None:
+    # create_db_and_tables() may already have created them on startup, with the season column of later revisions
+    if 'h2h_standing_table' not in tables:
+        op.create_table(
+            'h2h_standing_table',
+            sa.Column('id', sa.Uuid(), nullable=False),
+            sa.Column('league_id', sa.Integer(), nullable=False),
+            sa.Column('team_id', sa.Integer(), nullable=False),
+            sa.Column('name', sa.String(), nullable=False),
+            sa.Column('leader', sa.String(), nullable=True),
+            sa.Column('played', sa.Integer(), nullable=False),
+            sa.Column('wins', sa.Integer(), nullable=False),
+            sa.Column('draws', sa.Integer(), nullable=False),
+            sa.Column('losses', sa.Integer(), nullable=False),
+            sa.Column('points_for', sa.Integer(), nullable=False),
+            sa.Column('points_against', sa.Integer(), nullable=False),
+            sa.Column('league_points', sa.Integer(), nullable=False),
+            sa.PrimaryKeyConstraint('id'),
+            sa.UniqueConstraint('league_id', 'team_id'),
+        )
+        op.create_index('ix_h2h_standing_table_league_id', 'h2h_standing_table', ['league_id'])
+    if 'classic_standing_table' not in tables:
+        op.create_table(
+            'classic_standing_table',
+            sa.Column('id', sa.Uuid(), nullable=False),
+            sa.Column('league_id', sa.Integer(), nullable=False),
+            sa.Column('team_id', sa.Integer(), nullable=False),
+            sa.Column('name', sa.String(), nullable=False),
+            sa.Column('leader', sa.String(), nullable=True),
+            sa.Column('played', sa.Integer(), nullable=False),
+            sa.Column('total_points', sa.Integer(), nullable=False),
+            sa.PrimaryKeyConstraint('id'),
+            sa.UniqueConstraint('league_id', 'team_id'),
+        )
+        op.create_index('ix_classic_standing_table_league_id', 'classic_standing_table', ['league_id'])
+
+
+def _season(table: str):
+    # standings created on startup already carry the season, file them under the configured current one
+    if 'season' in _columns(table):
+        return ', season', f', {int(env.season.current)}'
+    return '', ''
+
+
+def _empty(table: str) -> bool:
+    return op.get_bind().execute(sa.text(f'SELECT NOT EXISTS (SELECT 1 FROM "{table}")')).scalar()
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    tables = sa.inspect(op.get_bind()).get_table_names()
+    if 'standings_applied' not in _columns('h2h_gameweek_table'):
+        op.add_column('h2h_gameweek_table',
+                      sa.Column('standings_applied', sa.Boolean(), server_default=sa.false(), nullable=False))
+    if 'points' not in _columns('classic_gameweek_teams'):
+        op.add_column('classic_gameweek_teams', sa.Column('points', sa.Integer(), nullable=True))
+        # every stored link counts, with the points its team scored
+        op.execute(
+            "UPDATE classic_gameweek_teams l SET points = t.points "
+            "FROM team_gameweek_table t WHERE t.id = l.team_id"
+        )
+    _create_standings(tables)
+
+    if _empty('h2h_standing_table'):
+        column, value = _season('h2h_standing_table')
+        sides = (f"{H2H_SIDES.format(own='first', other='second')} "
+                 f"UNION ALL {H2H_SIDES.format(own='second', other='first')}")
+        op.execute(
+            f"INSERT INTO h2h_standing_table (id, league_id{column}, team_id, name, leader, played, wins, draws, "
+            "losses, points_for, points_against, league_points) "
+            f"SELECT gen_random_uuid(), league_id{value}, team_id, "
+            "(array_agg(name ORDER BY gameweek DESC))[1], (array_agg(leader ORDER BY gameweek DESC))[1], "
+            "count(*), count(*) FILTER (WHERE scored > conceded), count(*) FILTER (WHERE scored = conceded), "
+            "count(*) FILTER (WHERE scored < conceded), sum(scored), sum(conceded), "
+            "3 * count(*) FILTER (WHERE scored > conceded) + count(*) FILTER (WHERE scored = conceded) "
+            f"FROM ({sides}) sides GROUP BY league_id, team_id"
+        )
+        op.execute("UPDATE h2h_gameweek_table SET standings_applied = true")
+    if _empty('classic_standing_table'):
+        column, value = _season('classic_standing_table')
+        op.execute(
+            f"INSERT INTO classic_standing_table (id, league_id{column}, team_id, name, leader, played, "
+            "total_points) "
+            f"SELECT gen_random_uuid(), g.league_id{value}, t.team_id, "
+            "(array_agg(t.name ORDER BY g.gameweek DESC))[1], (array_agg(t.leader ORDER BY g.gameweek DESC))[1], "
+            "count(*), sum(l.points) "
+            "FROM classic_gameweek_teams l "
+            "JOIN classic_gameweek_table g ON g.id = l.classic_gameweek_id "
+            "JOIN team_gameweek_table t ON t.id = l.team_id "
+            "WHERE l.points IS NOT NULL "
+            "GROUP BY g.league_id, t.team_id"
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('classic_standing_table')
+    op.drop_table('h2h_standing_table')
+    op.drop_column('classic_gameweek_teams', 'points')
+    op.drop_column('h2h_gameweek_table', 'standings_applied')
@@ -0,0 +1,123 @@
+"""normalize player identity out of player_gameweek_table
+
+Revision ID: 41c0e592c914
+Revises: 2b6f0d8c3a91
+Create Date: 2026-10-19 12:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '41c0e592c914'
+down_revision: Union[str, Sequence[str], None] = '2b6f0d8c3a91'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    tables = sa.inspect(op.get_bind()).get_table_names()
+    # create_db_and_tables() may already have created the empty dimension tables on startup
+    if 'club_table' not in tables:
+        op.create_table(
+            'club_table',
+            sa.Column('id', sa.Integer(), autoincrement=True, nullable=False),
+            sa.Column('code', sa.String(), nullable=False),
+            sa.PrimaryKeyConstraint('id'),
+            sa.UniqueConstraint('code'),
+        )
+    if 'player_table' not in tables:
+        op.create_table(
+            'player_table',
+            sa.Column('player_id', sa.Integer(), autoincrement=False, nullable=False),
+            sa.Column('name', sa.String(), nullable=False),
+            sa.PrimaryKeyConstraint('player_id'),
+        )
+
+    columns = {column['name'] for column in sa.inspect(op.get_bind()).get_columns('player_gameweek_table')}
+    if 'team' not in columns:
+        # created on startup with the normalized layout already, there is nothing to move
+        return
+
+    op.execute(
+        "INSERT INTO club_table (code) "
+        "SELECT DISTINCT team FROM player_gameweek_table "
+        "ON CONFLICT (code) DO NOTHING"
+    )
+    # latest known name wins
+    op.execute(
+        "INSERT INTO player_table (player_id, name) "
+        "SELECT DISTINCT ON (player_id) player_id, name FROM player_gameweek_table "
+        "ORDER BY player_id, gameweek DESC "
+        "ON CONFLICT (player_id) DO UPDATE SET name = excluded.name"
+    )
+
+    op.add_column('player_gameweek_table', sa.Column('club_id', sa.Integer(), nullable=True))
+    op.execute(
+        "UPDATE player_gameweek_table p SET club_id = c.id "
+        "FROM club_table c WHERE c.code = p.team"
+    )
+
+    # a transferred player had one row per club within a gameweek; keep one and repoint the links to it
+    op.execute(
+        "CREATE TEMP TABLE player_gameweek_dedup ON COMMIT DROP AS "
+        "SELECT id, first_value(id) OVER (PARTITION BY player_id, gameweek ORDER BY points DESC, id) AS keep_id "
+        "FROM player_gameweek_table"
+    )
+    op.execute(
+        "INSERT INTO team_gameweek_players (team_gameweek_id, player_gameweek_id, factor) "
+        "SELECT l.team_gameweek_id, d.keep_id, l.factor "
+        "FROM team_gameweek_players l JOIN player_gameweek_dedup d ON d.id = l.player_gameweek_id "
+        "WHERE d.id <> d.keep_id "
+        "ON CONFLICT DO NOTHING"
+    )
+    op.execute(
+        "DELETE FROM team_gameweek_players l USING player_gameweek_dedup d "
+        "WHERE d.id = l.player_gameweek_id AND d.id <> d.keep_id"
+    )
+    op.execute(
+        "DELETE FROM player_gameweek_table p USING player_gameweek_dedup d "
+        "WHERE d.id = p.id AND d.id <> d.keep_id"
+    )
+
+    op.drop_constraint('player_gameweek_table_player_id_team_gameweek_key', 'player_gameweek_table', type_='unique')
+    op.drop_column('player_gameweek_table', 'name')
+    op.drop_column('player_gameweek_table', 'team')
+    op.alter_column('player_gameweek_table', 'club_id', nullable=False)
+    op.create_foreign_key(
+        'player_gameweek_table_club_id_fkey', 'player_gameweek_table', 'club_table', ['club_id'], ['id']
+    )
+    op.create_foreign_key(
+        'player_gameweek_table_player_id_fkey', 'player_gameweek_table', 'player_table',
+        ['player_id'], ['player_id']
+    )
+    op.create_unique_constraint(
+        'player_gameweek_table_player_id_gameweek_key', 'player_gameweek_table', ['player_id', 'gameweek']
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.add_column('player_gameweek_table', sa.Column('name', sa.String(), nullable=True))
+    op.add_column('player_gameweek_table', sa.Column('team', sa.String(), nullable=True))
+    op.execute(
+        "UPDATE player_gameweek_table p SET name = pl.name, team = c.code "
+        "FROM player_table pl, club_table c "
+        "WHERE pl.player_id = p.player_id AND c.id = p.club_id"
+    )
+    op.drop_constraint('player_gameweek_table_player_id_gameweek_key', 'player_gameweek_table', type_='unique')
+    op.drop_constraint('player_gameweek_table_player_id_fkey', 'player_gameweek_table', type_='foreignkey')
+    op.drop_constraint('player_gameweek_table_club_id_fkey', 'player_gameweek_table', type_='foreignkey')
+    op.drop_column('player_gameweek_table', 'club_id')
+    op.alter_column('player_gameweek_table', 'name', nullable=False)
+    op.alter_column('player_gameweek_table', 'team', nullable=False)
+    op.create_unique_constraint(
+        'player_gameweek_table_player_id_team_gameweek_key', 'player_gameweek_table',
+        ['player_id', 'team', 'gameweek']
+    )
+    op.drop_table('player_table')
+    op.drop_table('club_table')
@@ -0,0 +1,32 @@
+"""index team_gameweek_players by player_gameweek_id
+
+Revision ID: 7b2d9e4f1a63
+Revises: 9d3e5a7b1c24
+Create Date: 2026-10-19 12:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '7b2d9e4f1a63'
+down_revision: Union[str, Sequence[str], None] = '9d3e5a7b1c24'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+INDEX = 'ix_team_gameweek_players_player_gameweek_id'
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    indexes = sa.inspect(op.get_bind()).get_indexes('team_gameweek_players')
+    if INDEX not in {index['name'] for index in indexes}:
+        op.create_index(INDEX, 'team_gameweek_players', ['player_gameweek_id'])
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(INDEX, table_name='team_gameweek_players')
@@ -0,0 +1,35 @@
+"""add content_hash to the classic and H2H gameweek tables
+
+Revision ID: 9d3e5a7b1c24
+Revises: 41c0e592c914
+Create Date: 2026-10-19 12:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '9d3e5a7b1c24'
+down_revision: Union[str, Sequence[str], None] = '41c0e592c914'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+TABLES = ('classic_gameweek_table', 'h2h_gameweek_table')
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    inspector = sa.inspect(op.get_bind())
+    for table in TABLES:
+        # stored gameweeks keep a NULL hash, their next snapshot is written once and hashed
+        if 'content_hash' not in {column['name'] for column in inspector.get_columns(table)}:
+            op.add_column(table, sa.Column('content_hash', sa.String(), nullable=True))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    for table in TABLES:
+        op.drop_column(table, 'content_hash')
@@ -0,0 +1,69 @@
+"""add outbox_table.locked_until, the relay's delivery lease
+
+Revision ID: a8c3e6f0b914
+Revises: f2a7c9d31e58
+Create Date: 2026-10-19 12:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a8c3e6f0b914'
+down_revision: Union[str, Sequence[str], None] = 'f2a7c9d31e58'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    inspector = sa.inspect(op.get_bind())
+    # create_db_and_tables may have created both tables already on startup, only the lease is new to them
+    if not inspector.has_table('webhook_subscription_table'):
+        op.create_table(
+            'webhook_subscription_table',
+            sa.Column('id', sa.Uuid(), nullable=False),
+            sa.Column('league_type', sa.String(), nullable=False),
+            sa.Column('league_id', sa.Integer(), nullable=True),
+            sa.Column('url', sa.String(), nullable=False),
+            sa.Column('rate_limit_per_minute', sa.Integer(), nullable=True),
+            sa.Column('active', sa.Boolean(), server_default=sa.true(), nullable=False),
+            sa.Column('created', sa.TIMESTAMP(timezone=True), nullable=False),
+            sa.PrimaryKeyConstraint('id'),
+            sa.UniqueConstraint('league_type', 'league_id', 'url'),
+        )
+        op.create_index('ix_webhook_subscription_table_league_id', 'webhook_subscription_table', ['league_id'])
+    if not inspector.has_table('outbox_table'):
+        op.create_table(
+            'outbox_table',
+            sa.Column('id', sa.Uuid(), nullable=False),
+            sa.Column('kind', sa.String(), nullable=False),
+            sa.Column('destination', sa.String(), nullable=False),
+            sa.Column('subscription_id', sa.Uuid(), nullable=True),
+            sa.Column('idempotency_key', sa.String(), nullable=False),
+            sa.Column('payload', postgresql.JSONB(astext_type=sa.Text()), nullable=False),
+            sa.Column('headers', postgresql.JSONB(astext_type=sa.Text()), nullable=True),
+            sa.Column('status', sa.String(), server_default='pending', nullable=False),
+            sa.Column('attempts', sa.Integer(), server_default='0', nullable=False),
+            sa.Column('last_error', sa.String(), nullable=True),
+            sa.Column('created', sa.TIMESTAMP(timezone=True), nullable=False),
+            sa.Column('available_at', sa.TIMESTAMP(timezone=True), nullable=False),
+            sa.Column('delivered_at', sa.TIMESTAMP(timezone=True), nullable=True),
+            sa.Column('locked_until', sa.TIMESTAMP(timezone=True), nullable=True),
+            sa.PrimaryKeyConstraint('id'),
+            sa.UniqueConstraint('idempotency_key'),
+            sa.ForeignKeyConstraint(['subscription_id'], ['webhook_subscription_table.id']),
+        )
+        op.create_index('ix_outbox_table_pending', 'outbox_table', ['available_at'],
+                        postgresql_where=sa.text("status = 'pending'"))
+    elif 'locked_until' not in {column['name'] for column in inspector.get_columns('outbox_table')}:
+        op.add_column('outbox_table', sa.Column('locked_until', sa.TIMESTAMP(timezone=True), nullable=True))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('outbox_table', 'locked_until')
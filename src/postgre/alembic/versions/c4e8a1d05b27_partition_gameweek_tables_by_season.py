@@ -0,0 +1,211 @@
+"""partition the per-gameweek tables by season
+
+Revision ID: c4e8a1d05b27
+Revises: 7b2d9e4f1a63
+Create Date: 2026-10-19 12:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+from src import env
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c4e8a1d05b27'
+down_revision: Union[str, Sequence[str], None] = '7b2d9e4f1a63'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# referenced tables first
+TABLES = ('player_gameweek_table', 'team_gameweek_table', 'classic_gameweek_table', 'h2h_gameweek_table',
+          'team_gameweek_players', 'classic_gameweek_teams', 'h2h_contenders_table', 'h2h_match_table')
+STANDINGS_TABLES = ('h2h_standing_table', 'classic_standing_table')
+
+
+def _create_tables(partitioned: bool) -> None:
+    keys = ['season'] if partitioned else []
+    options = {'postgresql_partition_by': 'LIST (season)'} if partitioned else {}
+
+    def season():
+        # a column belongs to one table, every table gets its own
+        return [sa.Column('season', sa.Integer(), nullable=False)] if partitioned else []
+
+    def references(table, column):
+        return [f'{table}.{column}', *(f'{table}.{key}' for key in keys)]
+
+    op.create_table(
+        'player_gameweek_table',
+        sa.Column('id', sa.Uuid(), nullable=False),
+        *season(),
+        sa.Column('player_id', sa.Integer(), nullable=False),
+        sa.Column('gameweek', sa.Integer(), nullable=False),
+        sa.Column('club_id', sa.Integer(), nullable=False),
+        sa.Column('points', sa.Integer(), nullable=False),
+        sa.PrimaryKeyConstraint('id', *keys),
+        sa.UniqueConstraint('player_id', *keys, 'gameweek'),
+        sa.ForeignKeyConstraint(['player_id'], ['player_table.player_id']),
+        sa.ForeignKeyConstraint(['club_id'], ['club_table.id']),
+        **options,
+    )
+    op.create_table(
+        'team_gameweek_table',
+        sa.Column('id', sa.Uuid(), nullable=False),
+        *season(),
+        sa.Column('team_id', sa.Integer(), nullable=False),
+        sa.Column('name', sa.String(), nullable=False),
+        sa.Column('leader', sa.String(), nullable=True),
+        sa.Column('gameweek', sa.Integer(), nullable=False),
+        sa.Column('points', sa.Integer(), nullable=False),
+        sa.PrimaryKeyConstraint('id', *keys),
+        sa.UniqueConstraint('team_id', *keys, 'gameweek'),
+        **options,
+    )
+    op.create_table(
+        'classic_gameweek_table',
+        sa.Column('id', sa.Uuid(), nullable=False),
+        *season(),
+        sa.Column('league_id', sa.Integer(), nullable=False),
+        sa.Column('gameweek', sa.Integer(), nullable=False),
+        sa.Column('date', sa.TIMESTAMP(timezone=True), nullable=False),
+        sa.Column('content_hash', sa.String(), nullable=True),
+        sa.PrimaryKeyConstraint('id', *keys),
+        sa.UniqueConstraint('league_id', *keys, 'gameweek'),
+        **options,
+    )
+    op.create_table(
+        'h2h_gameweek_table',
+        sa.Column('id', sa.Uuid(), nullable=False),
+        *season(),
+        sa.Column('league_id', sa.Integer(), nullable=False),
+        sa.Column('gameweek', sa.Integer(), nullable=False),
+        sa.Column('date', sa.TIMESTAMP(timezone=True), nullable=False),
+        sa.Column('content_hash', sa.String(), nullable=True),
+        sa.Column('standings_applied', sa.Boolean(), server_default=sa.false(), nullable=False),
+        sa.PrimaryKeyConstraint('id', *keys),
+        sa.UniqueConstraint('league_id', *keys, 'gameweek'),
+        **options,
+    )
+    op.create_table(
+        'team_gameweek_players',
+        sa.Column('team_gameweek_id', sa.Uuid(), nullable=False),
+        sa.Column('player_gameweek_id', sa.Uuid(), nullable=False),
+        *season(),
+        sa.Column('factor', sa.Integer(), nullable=False),
+        sa.PrimaryKeyConstraint('team_gameweek_id', 'player_gameweek_id', *keys),
+        sa.ForeignKeyConstraint(['team_gameweek_id', *keys], references('team_gameweek_table', 'id')),
+        sa.ForeignKeyConstraint(['player_gameweek_id', *keys], references('player_gameweek_table', 'id')),
+        **options,
+    )
+    op.create_index('ix_team_gameweek_players_player_gameweek_id', 'team_gameweek_players', ['player_gameweek_id'])
+    op.create_table(
+        'classic_gameweek_teams',
+        sa.Column('classic_gameweek_id', sa.Uuid(), nullable=False),
+        sa.Column('team_id', sa.Uuid(), nullable=False),
+        *season(),
+        sa.Column('points', sa.Integer(), nullable=True),
+        sa.PrimaryKeyConstraint('classic_gameweek_id', 'team_id', *keys),
+        sa.ForeignKeyConstraint(['classic_gameweek_id', *keys], references('classic_gameweek_table', 'id')),
+        sa.ForeignKeyConstraint(['team_id', *keys], references('team_gameweek_table', 'id')),
+        **options,
+    )
+    op.create_table(
+        'h2h_contenders_table',
+        sa.Column('id', sa.Uuid(), nullable=False),
+        *season(),
+        sa.Column('h2h_gameweek_id', sa.Uuid(), nullable=False),
+        sa.Column('team_id', sa.Uuid(), nullable=False),
+        sa.Column('points', sa.Integer(), nullable=False),
+        sa.PrimaryKeyConstraint('id', *keys),
+        sa.UniqueConstraint('h2h_gameweek_id', 'team_id', *keys),
+        sa.ForeignKeyConstraint(['h2h_gameweek_id', *keys], references('h2h_gameweek_table', 'id')),
+        sa.ForeignKeyConstraint(['team_id', *keys], references('team_gameweek_table', 'id')),
+        **options,
+    )
+    op.create_table(
+        'h2h_match_table',
+        sa.Column('id', sa.Uuid(), nullable=False),
+        *season(),
+        sa.Column('h2h_gameweek_id', sa.Uuid(), nullable=False),
+        sa.Column('first_contender_id', sa.Uuid(), nullable=False),
+        sa.Column('second_contender_id', sa.Uuid(), nullable=False),
+        sa.PrimaryKeyConstraint('id', *keys),
+        sa.ForeignKeyConstraint(['h2h_gameweek_id', *keys], references('h2h_gameweek_table', 'id')),
+        sa.ForeignKeyConstraint(['first_contender_id', *keys], references('team_gameweek_table', 'id')),
+        sa.ForeignKeyConstraint(['second_contender_id', *keys], references('team_gameweek_table', 'id')),
+        **options,
+    )
+
+
+def _set_aside(table: str) -> None:
+    # the new table takes over the name and the constraint names, which live on the old table's indexes
+    op.rename_table(table, f'{table}_old')
+    op.execute(
+        "DO $$ DECLARE i record; BEGIN "
+        f"FOR i IN SELECT indexname FROM pg_indexes WHERE schemaname = current_schema() AND tablename = '{table}_old' "
+        "LOOP EXECUTE format('ALTER INDEX %I RENAME TO %I', i.indexname, i.indexname || '_old'); END LOOP; "
+        "END $$"
+    )
+
+
+def _columns(table: str) -> str:
+    columns = sa.inspect(op.get_bind()).get_columns(f'{table}_old')
+    return ', '.join(f'"{column["name"]}"' for column in columns)
+
+
+def _partitioned() -> bool:
+    return op.get_bind().execute(sa.text(
+        "SELECT EXISTS (SELECT 1 FROM pg_partitioned_table p JOIN pg_class c ON c.oid = p.partrelid "
+        "WHERE c.relname = 'team_gameweek_table' AND c.relnamespace = current_schema()::regnamespace)"
+    )).scalar()
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # everything stored so far is filed under the configured current season
+    season = int(env.season.current)
+    # create_db_and_tables() on a fresh database already created them partitioned, with their season partitions
+    if not _partitioned():
+        for table in TABLES:
+            _set_aside(table)
+        _create_tables(partitioned=True)
+        for table in TABLES:
+            op.execute(f'CREATE TABLE "{table}_{season}" PARTITION OF "{table}" FOR VALUES IN ({season})')
+        for table in TABLES:
+            columns = _columns(table)
+            op.execute(f'INSERT INTO "{table}" ({columns}, season) SELECT {columns}, {season} FROM "{table}_old"')
+        for table in reversed(TABLES):
+            op.drop_table(f'{table}_old')
+
+    for table in STANDINGS_TABLES:
+        # create_db_and_tables() may already have created the standings with their season on startup
+        if 'season' in {column['name'] for column in sa.inspect(op.get_bind()).get_columns(table)}:
+            continue
+        op.add_column(table, sa.Column('season', sa.Integer(), server_default=str(season), nullable=False))
+        op.alter_column(table, 'season', server_default=None)
+        op.drop_constraint(f'{table}_league_id_team_id_key', table, type_='unique')
+        op.create_unique_constraint(f'{table}_league_id_season_team_id_key', table, ['league_id', 'season', 'team_id'])
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    seasons = op.get_bind().execute(sa.text('SELECT DISTINCT season FROM team_gameweek_table')).scalars().all()
+    if len(seasons) > 1:
+        raise RuntimeError(f"Gameweeks of seasons {sorted(seasons)} are stored, archive all but one first")
+
+    for table in STANDINGS_TABLES:
+        op.drop_constraint(f'{table}_league_id_season_team_id_key', table, type_='unique')
+        op.execute(f'DELETE FROM "{table}" WHERE season NOT IN (SELECT DISTINCT season FROM team_gameweek_table)')
+        op.drop_column(table, 'season')
+        op.create_unique_constraint(f'{table}_league_id_team_id_key', table, ['league_id', 'team_id'])
+
+    for table in TABLES:
+        _set_aside(table)
+    _create_tables(partitioned=False)
+    for table in TABLES:
+        columns = ', '.join(f'"{column["name"]}"' for column in sa.inspect(op.get_bind()).get_columns(table))
+        op.execute(f'INSERT INTO "{table}" ({columns}) SELECT {columns} FROM "{table}_old"')
+    for table in reversed(TABLES):
+        op.drop_table(f'{table}_old')
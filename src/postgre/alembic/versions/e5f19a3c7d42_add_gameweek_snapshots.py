@@ -0,0 +1,46 @@
+"""add gameweek_snapshot_table for finalized gameweeks
+
+Revision ID: e5f19a3c7d42
+Revises: c4e8a1d05b27
+Create Date: 2026-10-19 12:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e5f19a3c7d42'
+down_revision: Union[str, Sequence[str], None] = 'c4e8a1d05b27'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+TABLE = 'gameweek_snapshot_table'
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # create_db_and_tables may have created it already on startup
+    if sa.inspect(op.get_bind()).has_table(TABLE):
+        return
+    op.create_table(
+        TABLE,
+        sa.Column('id', sa.Uuid(), nullable=False),
+        sa.Column('league_type', sa.String(), nullable=False),
+        sa.Column('league_id', sa.Integer(), nullable=False),
+        sa.Column('season', sa.Integer(), nullable=False),
+        sa.Column('gameweek', sa.Integer(), nullable=False),
+        sa.Column('content_hash', sa.String(), nullable=True),
+        sa.Column('report', sa.LargeBinary(), nullable=False),
+        sa.Column('data', sa.LargeBinary(), nullable=False),
+        sa.Column('created', sa.TIMESTAMP(timezone=True), nullable=False),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('league_type', 'league_id', 'season', 'gameweek'),
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table(TABLE)
@@ -0,0 +1,41 @@
+"""add processed_message_table, the consumer's idempotency ledger
+
+Revision ID: f2a7c9d31e58
+Revises: e5f19a3c7d42
+Create Date: 2026-10-19 12:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f2a7c9d31e58'
+down_revision: Union[str, Sequence[str], None] = 'e5f19a3c7d42'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+TABLE = 'processed_message_table'
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # create_db_and_tables may have created it already on startup
+    if sa.inspect(op.get_bind()).has_table(TABLE):
+        return
+    op.create_table(
+        TABLE,
+        sa.Column('key', sa.String(), nullable=False),
+        sa.Column('type', sa.String(), nullable=True),
+        sa.Column('processed', sa.TIMESTAMP(timezone=True), nullable=False),
+        sa.PrimaryKeyConstraint('key'),
+    )
+    op.create_index('ix_processed_message_table_processed', TABLE, ['processed'])
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_processed_message_table_processed', table_name=TABLE)
+    op.drop_table(TABLE)
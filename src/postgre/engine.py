@@ -1,10 +1,11 @@
 import contextlib
-from typing import Any, AsyncIterator
+from typing import Any, AsyncIterator, Iterator, Optional
 
-from sqlalchemy.ext.asyncio import (AsyncConnection, AsyncSession,
+from sqlalchemy.ext.asyncio import (AsyncConnection, AsyncEngine, AsyncSession,
                                     async_sessionmaker, create_async_engine)
 from sqlalchemy.orm import DeclarativeBase
 from .. import env
+from .profiler import QueryProfiler, QueryStats
 
 
 class Base(DeclarativeBase):
@@ -15,27 +16,59 @@ connect_string = env.postgres.url
 
 
 class DatabaseSessionManager:
-    def __init__(self, host: str, engine_kwargs: dict[str, Any] = None):
+    def __init__(self, host: str, engine_kwargs: dict[str, Any] = None, profile: bool = False,
+                 slow_query_ms: Optional[float] = None):
         if engine_kwargs is None:
             engine_kwargs = {}
-        self._engine = create_async_engine(host, **engine_kwargs)
-        self._sessionmaker = async_sessionmaker(
-            autocommit=False, bind=self._engine, expire_on_commit=False)
+        self._host = host
+        self._engine_kwargs = engine_kwargs
+        # created on first use, so importing the package loads no driver and a manager never used opens no pool
+        self._engine: Optional[AsyncEngine] = None
+        self._sessionmaker = async_sessionmaker(autocommit=False, expire_on_commit=False)
+        self._closed = False
+        self.profiler: Optional[QueryProfiler] = None
+        if profile:
+            self.enable_profiling(slow_query_ms)
+
+    @property
+    def engine(self) -> AsyncEngine:
+        if self._engine is None:
+            if self._closed:
+                raise Exception("DatabaseSessionManager is not initialized")
+            self._engine = create_async_engine(self._host, **self._engine_kwargs)
+            if self.profiler is not None:
+                self.profiler.attach(self._engine.sync_engine)
+        return self._engine
+
+    def enable_profiling(self, slow_query_ms: Optional[float] = None) -> QueryProfiler:
+        if self._closed:
+            raise Exception("DatabaseSessionManager is not initialized")
+        if self.profiler is None:
+            self.profiler = QueryProfiler(slow_query_ms)
+            if self._engine is not None:
+                self.profiler.attach(self._engine.sync_engine)
+        return self.profiler
+
+    @contextlib.contextmanager
+    def profile(self, label: str) -> Iterator[Optional[QueryStats]]:
+        if self.profiler is None:
+            yield None
+            return
+        with self.profiler.track(label) as stats:
+            yield stats
 
     async def close(self):
-        if self._engine is None:
+        if self._closed:
             raise Exception("DatabaseSessionManager is not initialized")
-        await self._engine.dispose()
+        self._closed = True
+        if self._engine is not None:
+            await self._engine.dispose()
 
         self._engine = None
-        self._sessionmaker = None
 
     @contextlib.asynccontextmanager
     async def connect(self) -> AsyncIterator[AsyncConnection]:
-        if self._engine is None:
-            raise Exception("DatabaseSessionManager is not initialized")
-
-        async with self._engine.begin() as connection:
+        async with self.engine.begin() as connection:
             try:
                 yield connection
             except Exception:
@@ -44,10 +77,7 @@ class DatabaseSessionManager:
 
     @contextlib.asynccontextmanager
     async def session(self) -> AsyncIterator[AsyncSession]:
-        if self._sessionmaker is None:
-            raise Exception("DatabaseSessionManager is not initialized")
-
-        session = self._sessionmaker()
+        session = self._sessionmaker(bind=self.engine)
         try:
             yield session
         except Exception:
@@ -57,7 +87,17 @@ class DatabaseSessionManager:
             await session.close()
 
 
-sessionmanager = DatabaseSessionManager(connect_string, {"echo": False})
+sessionmanager = DatabaseSessionManager(connect_string, {"echo": False}, profile=env.postgres.profile,
+                                        slow_query_ms=env.postgres.slow_query_ms)
+# long-running exports get their own small pool so they can never hold the connections the feeds need
+export_sessionmanager = DatabaseSessionManager(connect_string, {
+    "echo": False,
+    "pool_size": env.postgres.export_pool_size,
+    "max_overflow": 0,
+    "pool_timeout": env.postgres.export_pool_timeout,
+    # a client disconnecting mid-export cancels the cursor fetch and can leave a dead connection in the pool
+    "pool_pre_ping": True,
+})
 
 
 async def get_db_session():
@@ -66,5 +106,7 @@ async def get_db_session():
 
 
 async def create_db_and_tables():
+    from .repository import SeasonRepo
     async with sessionmanager.connect() as conn:
         await conn.run_sync(Base.metadata.create_all)
+        await SeasonRepo(conn).ensure(env.season.current)
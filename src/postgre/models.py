@@ -1,11 +1,16 @@
 from uuid import uuid4, UUID
 from sqlalchemy.orm import Mapped, mapped_column, relationship
-from sqlalchemy import TIMESTAMP, ForeignKey, Table, Column, UniqueConstraint
+from sqlalchemy import (TIMESTAMP, ForeignKey, ForeignKeyConstraint, Table, Column, UniqueConstraint, Integer, Index,
+                        LargeBinary, false, true, text)
+from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy.ext.associationproxy import association_proxy
 from datetime import datetime, timezone
 from . import Base
 from typing import List
 
+# the per-gameweek tables are partitioned by season, every key carries it so lookups and joins prune to one partition
+SEASON_PARTITIONED = {"postgresql_partition_by": "LIST (season)"}
+
 # team_gameweek_players = Table(
 #     "team_gameweek_players",
 #     Base.metadata,
@@ -16,39 +21,81 @@ from typing import List
 class TeamGameweekPlayer(Base):
 
     __tablename__ = "team_gameweek_players"
+    __table_args__ = (
+        ForeignKeyConstraint(["team_gameweek_id", "season"], ["team_gameweek_table.id", "team_gameweek_table.season"]),
+        ForeignKeyConstraint(["player_gameweek_id", "season"],
+                             ["player_gameweek_table.id", "player_gameweek_table.season"]),
+        # the primary key leads with the team, point deltas look links up by player
+        Index("ix_team_gameweek_players_player_gameweek_id", "player_gameweek_id"),
+        SEASON_PARTITIONED,
+    )
 
-    team_gameweek_id: Mapped[UUID] = mapped_column(ForeignKey("team_gameweek_table.id"), primary_key=True)
-    player_gameweek_id: Mapped[UUID] = mapped_column(ForeignKey("player_gameweek_table.id"), primary_key=True)
+    team_gameweek_id: Mapped[UUID] = mapped_column(primary_key=True)
+    player_gameweek_id: Mapped[UUID] = mapped_column(primary_key=True)
+    season: Mapped[int] = mapped_column(primary_key=True)
     factor: Mapped[int] = mapped_column(default=1, nullable=False)
 
-    team_gameweek: Mapped["TeamGameweek"] = relationship(back_populates="composition_links", lazy="selectin")
-    player_gameweek: Mapped["PlayerGameweek"] = relationship(lazy="selectin")
+    team_gameweek: Mapped["TeamGameweek"] = relationship(back_populates="composition_links", lazy="selectin",
+                                                         overlaps="player_gameweek")
+    player_gameweek: Mapped["PlayerGameweek"] = relationship(lazy="selectin", overlaps="team_gameweek")
 
     def __repr__(self):
         return f"<TeamGameweekPlayer(team={self.team_gameweek_id}, player={self.player_gameweek_id}, factor={self.factor})>"
 
 
 
+class Club(Base):
+    __tablename__ = 'club_table'
+
+    id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
+    code: Mapped[str] = mapped_column(nullable=False, unique=True)
+
+    def __repr__(self):
+        return f"<Club(id={self.id}, code={self.code})>"
+
+
+class Player(Base):
+    __tablename__ = 'player_table'
+
+    player_id: Mapped[int] = mapped_column(primary_key=True, autoincrement=False)
+    name: Mapped[str] = mapped_column(nullable=False)
+
+    def __repr__(self):
+        return f"<Player(player_id={self.player_id}, name={self.name})>"
+
+
 class PlayerGameweek(Base):
     __tablename__ = 'player_gameweek_table'
-    __table_args__ = (UniqueConstraint('player_id', 'team', 'gameweek'),)
+    __table_args__ = (UniqueConstraint('player_id', 'season', 'gameweek'), SEASON_PARTITIONED)
 
     id: Mapped[UUID] = mapped_column(primary_key=True, default=uuid4)
-    player_id: Mapped[int] = mapped_column(nullable=False)
+    season: Mapped[int] = mapped_column(primary_key=True)
+    player_id: Mapped[int] = mapped_column(ForeignKey("player_table.player_id"), nullable=False)
     gameweek: Mapped[int] = mapped_column(nullable=False)
-    name: Mapped[str] = mapped_column(nullable=False)
-    team: Mapped[str] = mapped_column(nullable=False)
+    club_id: Mapped[int] = mapped_column(ForeignKey("club_table.id"), nullable=False)
     points: Mapped[int] = mapped_column(nullable=False)
 
+    player: Mapped["Player"] = relationship(lazy="joined", innerjoin=True)
+    club: Mapped["Club"] = relationship(lazy="joined", innerjoin=True)
+
+    @property
+    def name(self) -> str:
+        return self.player.name
+
+    @property
+    def team(self) -> str:
+        return self.club.code
+
     def __repr__(self):
         return f"<PlayerGameweek(name={self.name}, team={self.team}, gameweek={self.gameweek})>"
 
 
 class TeamGameweek(Base):
     __tablename__ = "team_gameweek_table"
-    __table_args__ = (UniqueConstraint('team_id', 'gameweek'),)
+    __table_args__ = (UniqueConstraint('team_id', 'season', 'gameweek'), SEASON_PARTITIONED)
 
     id: Mapped[UUID] = mapped_column(primary_key=True, default=uuid4)
+    season: Mapped[int] = mapped_column(primary_key=True)
     team_id: Mapped[int] = mapped_column(nullable=False)
     name: Mapped[str] = mapped_column(nullable=False)
     leader: Mapped[str] = mapped_column(nullable=True)
@@ -58,7 +105,8 @@ class TeamGameweek(Base):
     composition_links: Mapped[List["TeamGameweekPlayer"]] = relationship(
         back_populates="team_gameweek",
         lazy="selectin",
-        cascade="all, delete-orphan"
+        cascade="all, delete-orphan",
+        overlaps="player_gameweek"
     )
 
     composition: List[PlayerGameweek] = association_proxy(
@@ -72,22 +120,34 @@ class TeamGameweek(Base):
 
 class H2HMatch(Base):
     __tablename__ = "h2h_match_table"
+    __table_args__ = (
+        ForeignKeyConstraint(["h2h_gameweek_id", "season"], ["h2h_gameweek_table.id", "h2h_gameweek_table.season"]),
+        ForeignKeyConstraint(["first_contender_id", "season"], ["team_gameweek_table.id", "team_gameweek_table.season"]),
+        ForeignKeyConstraint(["second_contender_id", "season"],
+                             ["team_gameweek_table.id", "team_gameweek_table.season"]),
+        SEASON_PARTITIONED,
+    )
 
     id: Mapped[UUID] = mapped_column(primary_key=True, default=uuid4)
-    h2h_gameweek_id: Mapped[UUID] = mapped_column(ForeignKey("h2h_gameweek_table.id"), nullable=False)
+    season: Mapped[int] = mapped_column(primary_key=True)
+    h2h_gameweek_id: Mapped[UUID] = mapped_column(nullable=False)
     h2h_gameweek: Mapped["H2HGameweek"] = relationship(
         back_populates="matches",
         lazy="selectin",
+        foreign_keys=[h2h_gameweek_id, season],
+        overlaps="first_contender,second_contender",
     )
 
-    first_contender_id: Mapped[UUID] = mapped_column(ForeignKey("team_gameweek_table.id"))
-    second_contender_id: Mapped[UUID] = mapped_column(ForeignKey("team_gameweek_table.id"))
+    first_contender_id: Mapped[UUID] = mapped_column()
+    second_contender_id: Mapped[UUID] = mapped_column()
 
     first_contender: Mapped["TeamGameweek"] = relationship(
-        foreign_keys=[first_contender_id]
+        foreign_keys=[first_contender_id, season],
+        overlaps="h2h_gameweek,second_contender",
     )
     second_contender: Mapped["TeamGameweek"] = relationship(
-        foreign_keys=[second_contender_id]
+        foreign_keys=[second_contender_id, season],
+        overlaps="h2h_gameweek,first_contender",
     )
 
     def __repr__(self):
@@ -96,17 +156,24 @@ class H2HMatch(Base):
 
 class H2HContenders(Base):
     __tablename__ = "h2h_contenders_table"
-    __table_args__ = (UniqueConstraint('h2h_gameweek_id', 'team_id'),)
+    __table_args__ = (
+        UniqueConstraint('h2h_gameweek_id', 'team_id', 'season'),
+        ForeignKeyConstraint(["h2h_gameweek_id", "season"], ["h2h_gameweek_table.id", "h2h_gameweek_table.season"]),
+        ForeignKeyConstraint(["team_id", "season"], ["team_gameweek_table.id", "team_gameweek_table.season"]),
+        SEASON_PARTITIONED,
+    )
 
     id: Mapped[UUID] = mapped_column(primary_key=True, default=uuid4)
-    h2h_gameweek_id: Mapped[UUID] = mapped_column(ForeignKey("h2h_gameweek_table.id"), nullable=False)
+    season: Mapped[int] = mapped_column(primary_key=True)
+    h2h_gameweek_id: Mapped[UUID] = mapped_column(nullable=False)
     h2h_gameweek: Mapped["H2HGameweek"] = relationship(
         back_populates="contenders",
         lazy="selectin",
+        overlaps="team",
     )
 
-    team_id: Mapped[UUID] = mapped_column(ForeignKey("team_gameweek_table.id"))
-    team: Mapped["TeamGameweek"] = relationship()
+    team_id: Mapped[UUID] = mapped_column()
+    team: Mapped["TeamGameweek"] = relationship(overlaps="h2h_gameweek")
     points: Mapped[int] = mapped_column(nullable=False)
 
     def __repr__(self):
@@ -116,22 +183,30 @@ class H2HContenders(Base):
 classic_gameweek_teams = Table(
     "classic_gameweek_teams",
     Base.metadata,
-    Column("classic_gameweek_id", ForeignKey("classic_gameweek_table.id"), primary_key=True),
-    Column("team_id", ForeignKey("team_gameweek_table.id"), primary_key=True)
+    Column("classic_gameweek_id", primary_key=True),
+    Column("team_id", primary_key=True),
+    Column("season", Integer, primary_key=True),
+    Column("points", Integer, nullable=True),
+    ForeignKeyConstraint(["classic_gameweek_id", "season"],
+                         ["classic_gameweek_table.id", "classic_gameweek_table.season"]),
+    ForeignKeyConstraint(["team_id", "season"], ["team_gameweek_table.id", "team_gameweek_table.season"]),
+    **SEASON_PARTITIONED
 )
 
 
 class ClassicGameweek(Base):
     __tablename__ = "classic_gameweek_table"
-    __table_args__ = (UniqueConstraint('league_id', 'gameweek'),)
+    __table_args__ = (UniqueConstraint('league_id', 'season', 'gameweek'), SEASON_PARTITIONED)
 
     id: Mapped[UUID] = mapped_column(primary_key=True, default=uuid4)
+    season: Mapped[int] = mapped_column(primary_key=True)
     league_id: Mapped[int] = mapped_column(nullable=False)
     gameweek: Mapped[int] = mapped_column(nullable=False)
     date: Mapped[datetime] = mapped_column(
         TIMESTAMP(timezone=True),
         default=lambda: datetime.now(timezone.utc)
     )
+    content_hash: Mapped[str] = mapped_column(nullable=True)
 
     contenders: Mapped[List["TeamGameweek"]] = relationship(
         "TeamGameweek",
@@ -145,18 +220,156 @@ class ClassicGameweek(Base):
 
 class H2HGameweek(Base):
     __tablename__ = "h2h_gameweek_table"
-    __table_args__ = (UniqueConstraint('league_id', 'gameweek'),)
+    __table_args__ = (UniqueConstraint('league_id', 'season', 'gameweek'), SEASON_PARTITIONED)
 
     id: Mapped[UUID] = mapped_column(primary_key=True, default=uuid4)
+    season: Mapped[int] = mapped_column(primary_key=True)
     league_id: Mapped[int] = mapped_column(nullable=False)
     gameweek: Mapped[int] = mapped_column(nullable=False)
     date: Mapped[datetime] = mapped_column(
         TIMESTAMP(timezone=True),
         default=lambda: datetime.now(timezone.utc)
     )
+    content_hash: Mapped[str] = mapped_column(nullable=True)
+
+    standings_applied: Mapped[bool] = mapped_column(default=False, server_default=false(), nullable=False)
 
-    matches: Mapped[List["H2HMatch"]] = relationship(back_populates="h2h_gameweek")
-    contenders: Mapped[List["H2HContenders"]] = relationship(back_populates="h2h_gameweek")
+    matches: Mapped[List["H2HMatch"]] = relationship(back_populates="h2h_gameweek",
+                                                     overlaps="first_contender,second_contender")
+    contenders: Mapped[List["H2HContenders"]] = relationship(back_populates="h2h_gameweek", overlaps="team")
 
     def __repr__(self):
         return f"<H2HGameweek(gameweek_number={self.gameweek})>"
+
+
+class H2HStanding(Base):
+    __tablename__ = "h2h_standing_table"
+    __table_args__ = (UniqueConstraint('league_id', 'season', 'team_id'),)
+
+    id: Mapped[UUID] = mapped_column(primary_key=True, default=uuid4)
+    league_id: Mapped[int] = mapped_column(nullable=False, index=True)
+    season: Mapped[int] = mapped_column(nullable=False)
+    team_id: Mapped[int] = mapped_column(nullable=False)
+    name: Mapped[str] = mapped_column(nullable=False)
+    leader: Mapped[str] = mapped_column(nullable=True)
+    played: Mapped[int] = mapped_column(default=0, nullable=False)
+    wins: Mapped[int] = mapped_column(default=0, nullable=False)
+    draws: Mapped[int] = mapped_column(default=0, nullable=False)
+    losses: Mapped[int] = mapped_column(default=0, nullable=False)
+    points_for: Mapped[int] = mapped_column(default=0, nullable=False)
+    points_against: Mapped[int] = mapped_column(default=0, nullable=False)
+    league_points: Mapped[int] = mapped_column(default=0, nullable=False)
+
+    def __repr__(self):
+        return f"<H2HStanding(league_id={self.league_id}, team_id={self.team_id}, pts={self.league_points})>"
+
+
+class ClassicStanding(Base):
+    __tablename__ = "classic_standing_table"
+    __table_args__ = (UniqueConstraint('league_id', 'season', 'team_id'),)
+
+    id: Mapped[UUID] = mapped_column(primary_key=True, default=uuid4)
+    league_id: Mapped[int] = mapped_column(nullable=False, index=True)
+    season: Mapped[int] = mapped_column(nullable=False)
+    team_id: Mapped[int] = mapped_column(nullable=False)
+    name: Mapped[str] = mapped_column(nullable=False)
+    leader: Mapped[str] = mapped_column(nullable=True)
+    played: Mapped[int] = mapped_column(default=0, nullable=False)
+    total_points: Mapped[int] = mapped_column(default=0, nullable=False)
+
+    def __repr__(self):
+        return f"<ClassicStanding(league_id={self.league_id}, team_id={self.team_id}, pts={self.total_points})>"
+
+
+class WebhookSubscription(Base):
+    __tablename__ = "webhook_subscription_table"
+    __table_args__ = (UniqueConstraint('league_type', 'league_id', 'url'),)
+
+    id: Mapped[UUID] = mapped_column(primary_key=True, default=uuid4)
+    league_type: Mapped[str] = mapped_column(nullable=False)
+    # NULL subscribes to every league of the type
+    league_id: Mapped[int] = mapped_column(nullable=True, index=True)
+    url: Mapped[str] = mapped_column(nullable=False)
+    rate_limit_per_minute: Mapped[int] = mapped_column(nullable=True)
+    active: Mapped[bool] = mapped_column(default=True, server_default=true(), nullable=False)
+    created: Mapped[datetime] = mapped_column(
+        TIMESTAMP(timezone=True),
+        default=lambda: datetime.now(timezone.utc)
+    )
+
+    def __repr__(self):
+        return f"<WebhookSubscription({self.league_type}:{self.league_id} -> {self.url})>"
+
+
+class OutboxMessage(Base):
+    __tablename__ = "outbox_table"
+    __table_args__ = (
+        Index("ix_outbox_table_pending", "available_at", postgresql_where=text("status = 'pending'")),
+    )
+
+    id: Mapped[UUID] = mapped_column(primary_key=True, default=uuid4)
+    # "webhook" posts payload to the destination URL, "event" publishes it to the destination queue
+    kind: Mapped[str] = mapped_column(nullable=False)
+    destination: Mapped[str] = mapped_column(nullable=False)
+    subscription_id: Mapped[UUID] = mapped_column(ForeignKey("webhook_subscription_table.id"), nullable=True)
+    idempotency_key: Mapped[str] = mapped_column(nullable=False, unique=True)
+    payload: Mapped[dict] = mapped_column(JSONB, nullable=False)
+    headers: Mapped[dict] = mapped_column(JSONB, nullable=True)
+    status: Mapped[str] = mapped_column(default="pending", server_default="pending", nullable=False)
+    attempts: Mapped[int] = mapped_column(default=0, server_default="0", nullable=False)
+    last_error: Mapped[str] = mapped_column(nullable=True)
+    created: Mapped[datetime] = mapped_column(
+        TIMESTAMP(timezone=True),
+        default=lambda: datetime.now(timezone.utc)
+    )
+    available_at: Mapped[datetime] = mapped_column(
+        TIMESTAMP(timezone=True),
+        default=lambda: datetime.now(timezone.utc)
+    )
+    delivered_at: Mapped[datetime] = mapped_column(TIMESTAMP(timezone=True), nullable=True)
+    # set while a relay delivers the message, an expired lease makes it claimable again
+    locked_until: Mapped[datetime] = mapped_column(TIMESTAMP(timezone=True), nullable=True)
+
+    def __repr__(self):
+        return f"<OutboxMessage(kind={self.kind}, key={self.idempotency_key}, status={self.status})>"
+
+
+class GameweekSnapshot(Base):
+    """Report of a finalized gameweek, rendered once and served as stored."""
+    __tablename__ = "gameweek_snapshot_table"
+    __table_args__ = (UniqueConstraint('league_type', 'league_id', 'season', 'gameweek'),)
+
+    id: Mapped[UUID] = mapped_column(primary_key=True, default=uuid4)
+    league_type: Mapped[str] = mapped_column(nullable=False)
+    league_id: Mapped[int] = mapped_column(nullable=False)
+    season: Mapped[int] = mapped_column(nullable=False)
+    gameweek: Mapped[int] = mapped_column(nullable=False)
+    # hash of the snapshot the report was rendered from
+    content_hash: Mapped[str] = mapped_column(nullable=True)
+    # gzip-compressed, served to gzip clients without recompressing
+    report: Mapped[bytes] = mapped_column(LargeBinary, nullable=False)
+    data: Mapped[bytes] = mapped_column(LargeBinary, nullable=False)
+    created: Mapped[datetime] = mapped_column(
+        TIMESTAMP(timezone=True),
+        default=lambda: datetime.now(timezone.utc)
+    )
+
+    def __repr__(self):
+        return f"<GameweekSnapshot({self.league_type}:{self.league_id} {self.season}/{self.gameweek})>"
+
+
+class ProcessedMessage(Base):
+    """Idempotency key of a consumed message, committed with the writes the message made."""
+    __tablename__ = "processed_message_table"
+
+    key: Mapped[str] = mapped_column(primary_key=True)
+    type: Mapped[str] = mapped_column(nullable=True)
+    processed: Mapped[datetime] = mapped_column(
+        TIMESTAMP(timezone=True),
+        default=lambda: datetime.now(timezone.utc),
+        index=True,
+        nullable=False,
+    )
+
+    def __repr__(self):
+        return f"<ProcessedMessage({self.key})>"
@@ -0,0 +1,110 @@
+import contextlib
+import logging
+import time
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from threading import Lock
+from typing import Dict, Iterator, Optional
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+logger = logging.getLogger("sql_profiler")
+
+# statements at least this slow are logged and counted, unless POSTGRES_SLOW_QUERY_MS overrides it
+SLOW_QUERY_MS = 200.
+
+
+@dataclass
+class QueryStats:
+    label: str
+    statements: int = 0
+    total_ms: float = 0.
+    slow: int = 0
+
+    def as_headers(self) -> Dict[str, str]:
+        return {"X-DB-Statements": str(self.statements), "X-DB-Time-Ms": f"{self.total_ms:.3f}"}
+
+
+@dataclass
+class _Totals:
+    scopes: int = 0
+    statements: int = 0
+    total_ms: float = 0.
+    slow: int = 0
+    max_statements: int = 0
+
+
+_current_stats: ContextVar[Optional[QueryStats]] = ContextVar("current_query_stats", default=None)
+
+
+class QueryProfiler:
+    def __init__(self, slow_threshold_ms: Optional[float] = None):
+        self.slow_threshold_ms = slow_threshold_ms if slow_threshold_ms is not None else SLOW_QUERY_MS
+        self._totals: Dict[str, _Totals] = {}
+        self._lock = Lock()
+
+    def attach(self, engine: Engine) -> None:
+        event.listen(engine, "before_cursor_execute", self._before_cursor_execute)
+        event.listen(engine, "after_cursor_execute", self._after_cursor_execute)
+
+    def detach(self, engine: Engine) -> None:
+        event.remove(engine, "before_cursor_execute", self._before_cursor_execute)
+        event.remove(engine, "after_cursor_execute", self._after_cursor_execute)
+
+    @staticmethod
+    def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        context._profiler_start = time.perf_counter()
+
+    def _after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        elapsed_ms = (time.perf_counter() - context._profiler_start) * 1000
+        stats = _current_stats.get()
+        if stats is not None:
+            stats.statements += 1
+            stats.total_ms += elapsed_ms
+        if elapsed_ms >= self.slow_threshold_ms:
+            if stats is not None:
+                stats.slow += 1
+            logger.warning("Slow query %.1f ms in %s: %s; params: %s", elapsed_ms,
+                           stats.label if stats else "-", statement, parameters)
+
+    @contextlib.contextmanager
+    def track(self, label: str) -> Iterator[QueryStats]:
+        stats = QueryStats(label)
+        token = _current_stats.set(stats)
+        try:
+            yield stats
+        finally:
+            _current_stats.reset(token)
+            self._record(stats)
+
+    def _record(self, stats: QueryStats) -> None:
+        with self._lock:
+            totals = self._totals.setdefault(stats.label, _Totals())
+            totals.scopes += 1
+            totals.statements += stats.statements
+            totals.total_ms += stats.total_ms
+            totals.slow += stats.slow
+            totals.max_statements = max(totals.max_statements, stats.statements)
+
+    def summary(self) -> Dict[str, Dict]:
+        with self._lock:
+            return {
+                label: {
+                    "scopes": t.scopes,
+                    "statements": t.statements,
+                    "statements_per_scope": round(t.statements / t.scopes, 2) if t.scopes else 0,
+                    "max_statements": t.max_statements,
+                    "total_ms": round(t.total_ms, 3),
+                    "slow": t.slow,
+                }
+                for label, t in self._totals.items()
+            }
+
+    def reset(self) -> None:
+        with self._lock:
+            self._totals.clear()
+
+
+def current_query_stats() -> Optional[QueryStats]:
+    return _current_stats.get()
@@ -1,2 +1,10 @@
 from .classic_gameweek_repo import ClassicGameweekRepo
 from .h2h_gameweek_repo import H2HGameweekRepo
+from .standings_repo import StandingsRepo
+from .export_repo import ExportRepo
+from .outbox_repo import OutboxRepo
+from .webhook_subscription_repo import WebhookSubscriptionRepo
+from .points_repo import PointsRepo
+from .season_repo import SeasonRepo, resolve_season, partitions_ready
+from .snapshot_repo import SnapshotRepo
+from .processed_message_repo import ProcessedMessageRepo
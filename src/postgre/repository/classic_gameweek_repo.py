@@ -3,7 +3,7 @@ from typing import List, Optional, Dict, Any, Tuple
 from uuid import UUID
 
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
+from sqlalchemy import select, update, tuple_, values, column, Integer, Uuid
 from sqlalchemy.dialects.postgresql import insert
 from sqlalchemy.orm import selectinload
 
@@ -11,6 +11,8 @@ from ..models import ClassicGameweek, TeamGameweek, TeamGameweekPlayer, classic_
 from .pydantic_model import PlayerModel, ContendersModel
 
 from .team_repo import TeamRepo
+from .standings_repo import StandingsRepo
+from .season_repo import SeasonRepo, resolve_season
 
 
 class ClassicGameweekRepo:
@@ -18,16 +20,21 @@ class ClassicGameweekRepo:
         self.session = session
         self.logger = logging.getLogger(self.__class__.__name__)
         self.team_repo = TeamRepo(session)
+        self.standings_repo = StandingsRepo(session)
+        self.season_repo = SeasonRepo(session)
 
-    async def get_by_gameweek(self, league_id: int, gameweek: int) -> Optional[ClassicGameweek]:
-        self.logger.debug("Fetching classic gameweek league_id=%s gameweek=%s", league_id, gameweek)
+    async def get_by_gameweek(self, league_id: int, gameweek: int,
+                              season: Optional[int] = None) -> Optional[ClassicGameweek]:
+        season = resolve_season(season)
+        self.logger.debug("Fetching classic gameweek league_id=%s season=%s gameweek=%s", league_id, season, gameweek)
         stmt = (
             select(ClassicGameweek)
             .options(
                 selectinload(ClassicGameweek.contenders)
                 .selectinload(TeamGameweek.composition_links).selectinload(TeamGameweekPlayer.player_gameweek)
             )
-            .where(ClassicGameweek.league_id == league_id, ClassicGameweek.gameweek == gameweek)
+            .where(ClassicGameweek.league_id == league_id, ClassicGameweek.season == season,
+                   ClassicGameweek.gameweek == gameweek)
         )
         result = await self.session.execute(stmt)
         gw = result.scalar_one_or_none()
@@ -37,15 +44,21 @@ class ClassicGameweekRepo:
             self.logger.debug("Classic gameweek not found league_id=%s gameweek=%s", league_id, gameweek)
         return gw
 
-    async def get_last_n(self, league_id: int, n: int) -> List[ClassicGameweek]:
-        self.logger.debug("Fetching last %s classic gameweeks for league_id=%s", n, league_id)
+    async def get_last_n(self, league_id: int, n: int, season: Optional[int] = None) -> List[ClassicGameweek]:
+        # the last n gameweeks of the season of the league's latest gameweek
+        latest = await self.season_repo.latest(ClassicGameweek, [league_id], resolve_season(season))
+        if league_id not in latest:
+            return []
+        season, last_gameweek = latest[league_id]
+        self.logger.debug("Fetching last %s classic gameweeks for league_id=%s season=%s", n, league_id, season)
         stmt = (
             select(ClassicGameweek)
             .options(
                 selectinload(ClassicGameweek.contenders)
                 .selectinload(TeamGameweek.composition_links).selectinload(TeamGameweekPlayer.player_gameweek)
             )
-            .where(ClassicGameweek.league_id == league_id)
+            .where(ClassicGameweek.league_id == league_id, ClassicGameweek.season == season,
+                   ClassicGameweek.gameweek <= last_gameweek)
             .order_by(ClassicGameweek.gameweek.desc())
             .limit(n)
         )
@@ -54,11 +67,73 @@ class ClassicGameweekRepo:
         self.logger.info("Fetched %s classic gameweeks for league_id=%s", len(rows), league_id)
         return rows
 
-    async def _upsert_classic_gameweek(self, league_id: int, gameweek: int) -> Optional[UUID]:
-        stmt = insert(ClassicGameweek).values(league_id=league_id, gameweek=gameweek)
+    async def get_many(self, keys: List[Tuple[int, Optional[int]]],
+                       season: Optional[int] = None) -> Dict[Tuple[int, Optional[int]], ClassicGameweek]:
+        # a None gameweek selects the latest gameweek of that league, exact gameweeks are of the given season
+        season = resolve_season(season)
+        wanted = {(league_id, season, gameweek) for league_id, gameweek in keys if gameweek is not None}
+        latest = await self.season_repo.latest(
+            ClassicGameweek, {league_id for league_id, gameweek in keys if gameweek is None}, season)
+        wanted.update((league_id, *version) for league_id, version in latest.items())
+        if not wanted:
+            return {}
+        stmt = (
+            select(ClassicGameweek)
+            .options(
+                selectinload(ClassicGameweek.contenders)
+                .selectinload(TeamGameweek.composition_links).selectinload(TeamGameweekPlayer.player_gameweek)
+            )
+            .where(ClassicGameweek.season.in_({key[1] for key in wanted}),
+                   tuple_(ClassicGameweek.league_id, ClassicGameweek.season, ClassicGameweek.gameweek).in_(wanted))
+        )
+        result = await self.session.execute(stmt)
+        by_key = {(gw.league_id, gw.season, gw.gameweek): gw for gw in result.scalars().all()}
+        found = {}
+        for league_id, gameweek in keys:
+            version = (season, gameweek) if gameweek is not None else latest.get(league_id)
+            gw = by_key.get((league_id, *version)) if version is not None else None
+            if gw is not None:
+                found[(league_id, gameweek)] = gw
+        self.logger.info("Fetched %s of %s requested classic gameweeks", len(found), len(keys))
+        return found
+
+    async def get_version(self, league_id: int, gameweek: Optional[int] = None,
+                          season: Optional[int] = None) -> Optional[Tuple[UUID, int, int, Optional[str]]]:
+        # id, season, number and content hash of a stored gameweek (the latest when gameweek is None) without loading it
+        season = resolve_season(season)
+        if gameweek is None:
+            latest = await self.season_repo.latest(ClassicGameweek, [league_id], season)
+            if league_id not in latest:
+                return None
+            season, gameweek = latest[league_id]
+        stmt = (
+            select(ClassicGameweek.id, ClassicGameweek.season, ClassicGameweek.gameweek, ClassicGameweek.content_hash)
+            .where(ClassicGameweek.league_id == league_id, ClassicGameweek.season == season,
+                   ClassicGameweek.gameweek == gameweek)
+        )
+        result = await self.session.execute(stmt)
+        row = result.first()
+        return tuple(row) if row is not None else None
+
+    async def get_league_ids(self, gameweek: int, season: int) -> List[int]:
+        stmt = select(ClassicGameweek.league_id).where(ClassicGameweek.season == season, ClassicGameweek.gameweek == gameweek)
+        result = await self.session.execute(stmt.order_by(ClassicGameweek.league_id))
+        return list(result.scalars().all())
+
+    async def get_content_hash(self, league_id: int, gameweek: int, season: int) -> Optional[str]:
+        stmt = select(ClassicGameweek.content_hash).where(ClassicGameweek.league_id == league_id,
+                                                          ClassicGameweek.season == season,
+                                                          ClassicGameweek.gameweek == gameweek)
+        result = await self.session.execute(stmt)
+        return result.scalar_one_or_none()
+
+    async def _upsert_classic_gameweek(self, league_id: int, gameweek: int, season: int,
+                                       content_hash: Optional[str] = None) -> Optional[UUID]:
+        stmt = insert(ClassicGameweek).values(league_id=league_id, season=season, gameweek=gameweek,
+                                              content_hash=content_hash)
         stmt = stmt.on_conflict_do_update(
-            index_elements=["league_id", "gameweek"],
-            set_={"league_id": stmt.excluded.league_id}
+            index_elements=["league_id", "season", "gameweek"],
+            set_={"league_id": stmt.excluded.league_id, "content_hash": stmt.excluded.content_hash}
         ).returning(ClassicGameweek.id)
         result = await self.session.execute(stmt)
         rows = result.fetchall()
@@ -69,33 +144,60 @@ class ClassicGameweekRepo:
         self.logger.error("Failed to upsert classic gameweek league_id=%s gameweek=%s", league_id, gameweek)
         return None
 
-    async def _upsert_league_players_link(self, league_uuid, teams_id_map: Dict[int, UUID]) -> None:
+    async def _upsert_league_players_link(self, league_uuid, season: int, teams_id_map: Dict[int, UUID],
+                                          team_points: Dict[int, int]) -> None:
         link_inserts = [
             {
                 'classic_gameweek_id': league_uuid,
-                'team_id': team_db_id
+                'team_id': team_db_id,
+                'season': season,
+                'points': team_points.get(team_id)
             }
-            for team_db_id in teams_id_map.values()
+            for team_id, team_db_id in teams_id_map.items()
         ]
         stmt = insert(classic_gameweek_teams).values(link_inserts)
-        stmt = stmt.on_conflict_do_nothing()
+        stmt = stmt.on_conflict_do_update(
+            index_elements=['classic_gameweek_id', 'team_id', 'season'],
+            set_={'points': stmt.excluded.points}
+        )
         result = await self.session.execute(stmt)
-        self.logger.debug("Inserted %s classic gameweek-team links", result.rowcount)
+        self.logger.debug("Upserted %s classic gameweek-team links", result.rowcount)
+        # links of teams missing from this snapshot no longer count towards the standings
+        await self.session.execute(
+            update(classic_gameweek_teams)
+            .where(classic_gameweek_teams.c.classic_gameweek_id == league_uuid,
+                   classic_gameweek_teams.c.season == season,
+                   classic_gameweek_teams.c.team_id.not_in(list(teams_id_map.values())))
+            .values(points=None)
+        )
 
 
-    async def upsert_league(self, league_id: int, gameweek: int, contenders: List[Dict[str, Any]]) -> UUID:
+    async def upsert_league(self, league_id: int, gameweek: int, contenders: List[Dict[str, Any]],
+                            content_hash: Optional[str] = None, season: Optional[int] = None) -> UUID:
+        season = resolve_season(season)
         for contender in contenders:
             contender['gameweek'] = gameweek
         contenders_models = [ContendersModel.model_validate(contender) for contender in contenders]
-        league_uuid = await self._upsert_classic_gameweek(league_id, gameweek)
-        teams_id_map = await self.team_repo.upsert_teams(contenders_models)
+        league_uuid = await self._upsert_classic_gameweek(league_id, gameweek, season, content_hash)
+        changed = await self.team_repo.points_changes(contenders_models, season)
+        teams_id_map = await self.team_repo.upsert_teams(contenders_models, season)
+        if changed:
+            # H2H matches of these teams were scored with the points just overwritten
+            team_deltas = (
+                select(values(column("id", Uuid), column("delta", Integer), name="changed_teams").data(changed))
+                .cte("team_deltas")
+            )
+            await self.standings_repo.shift_h2h(team_deltas, season)
         if not league_uuid:
             raise Exception(f"Failed to upsert classic gameweek league_id={league_id} gameweek={gameweek}")
-        await self._upsert_league_players_link(league_uuid, teams_id_map)
+        await self.standings_repo.update_classic(league_id, season, league_uuid, contenders_models)
+        await self._upsert_league_players_link(
+            league_uuid, season, teams_id_map, {c.team_id: c.score for c in contenders_models}
+        )
         await self.session.flush()
 
         self.logger.info(
-            "Upsert classic gameweek league_id=%s gw=%s id=%s",
-            league_id, gameweek, league_uuid
+            "Upsert classic gameweek league_id=%s season=%s gw=%s id=%s",
+            league_id, season, gameweek, league_uuid
         )
         return league_uuid
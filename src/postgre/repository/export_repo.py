@@ -0,0 +1,111 @@
+import logging
+from typing import List, Optional
+
+from sqlalchemy import Select, select, and_, or_, case
+from sqlalchemy.ext.asyncio import AsyncSession, AsyncResult
+from sqlalchemy.orm import aliased
+
+from ..models import (ClassicGameweek, H2HGameweek, H2HContenders, H2HMatch, TeamGameweek, TeamGameweekPlayer,
+                      PlayerGameweek, Player, Club, classic_gameweek_teams)
+
+
+class ExportRepo:
+    def __init__(self, session: AsyncSession):
+        self.session = session
+        self.logger = logging.getLogger(self.__class__.__name__)
+
+    @staticmethod
+    def _with_composition(stmt: Select) -> Select:
+        return (
+            stmt
+            .outerjoin(TeamGameweekPlayer, and_(TeamGameweekPlayer.team_gameweek_id == TeamGameweek.id,
+                                                TeamGameweekPlayer.season == TeamGameweek.season))
+            .outerjoin(PlayerGameweek, and_(PlayerGameweek.id == TeamGameweekPlayer.player_gameweek_id,
+                                            PlayerGameweek.season == TeamGameweekPlayer.season))
+            .outerjoin(Player, Player.player_id == PlayerGameweek.player_id)
+            .outerjoin(Club, Club.id == PlayerGameweek.club_id)
+        )
+
+    @staticmethod
+    def _composition_columns():
+        return (
+            Player.player_id,
+            Player.name.label("player_name"),
+            Club.code.label("club"),
+            PlayerGameweek.points.label("player_points"),
+            TeamGameweekPlayer.factor,
+        )
+
+    def _classic_stmt(self) -> Select:
+        stmt = (
+            select(
+                ClassicGameweek.league_id,
+                ClassicGameweek.season,
+                ClassicGameweek.gameweek,
+                TeamGameweek.team_id,
+                TeamGameweek.name.label("team_name"),
+                TeamGameweek.leader,
+                TeamGameweek.points.label("team_points"),
+                *self._composition_columns(),
+            )
+            .select_from(ClassicGameweek)
+            .join(classic_gameweek_teams, and_(classic_gameweek_teams.c.classic_gameweek_id == ClassicGameweek.id,
+                                               classic_gameweek_teams.c.season == ClassicGameweek.season))
+            .join(TeamGameweek, and_(TeamGameweek.id == classic_gameweek_teams.c.team_id,
+                                     TeamGameweek.season == classic_gameweek_teams.c.season))
+        )
+        return self._with_composition(stmt)
+
+    def _h2h_stmt(self) -> Select:
+        opponent = aliased(TeamGameweek)
+        stmt = (
+            select(
+                H2HGameweek.league_id,
+                H2HGameweek.season,
+                H2HGameweek.gameweek,
+                TeamGameweek.team_id,
+                TeamGameweek.name.label("team_name"),
+                TeamGameweek.leader,
+                H2HContenders.points.label("team_points"),
+                opponent.team_id.label("opponent_team_id"),
+                *self._composition_columns(),
+            )
+            .select_from(H2HGameweek)
+            .join(H2HContenders, and_(H2HContenders.h2h_gameweek_id == H2HGameweek.id,
+                                      H2HContenders.season == H2HGameweek.season))
+            .join(TeamGameweek, and_(TeamGameweek.id == H2HContenders.team_id,
+                                     TeamGameweek.season == H2HContenders.season))
+            .outerjoin(H2HMatch, and_(
+                H2HMatch.h2h_gameweek_id == H2HGameweek.id,
+                H2HMatch.season == H2HGameweek.season,
+                or_(H2HMatch.first_contender_id == TeamGameweek.id, H2HMatch.second_contender_id == TeamGameweek.id),
+            ))
+            .outerjoin(opponent, and_(opponent.season == H2HMatch.season, opponent.id == case(
+                (H2HMatch.first_contender_id == TeamGameweek.id, H2HMatch.second_contender_id),
+                else_=H2HMatch.first_contender_id,
+            )))
+        )
+        return self._with_composition(stmt)
+
+    async def stream_gameweek_rows(self, league_type: str, league_ids: Optional[List[int]] = None,
+                                   from_gameweek: Optional[int] = None, to_gameweek: Optional[int] = None,
+                                   yield_per: int = 2000, season: Optional[int] = None) -> AsyncResult:
+        if league_type == "h2h":
+            gameweek_model, stmt = H2HGameweek, self._h2h_stmt()
+        elif league_type == "classic":
+            gameweek_model, stmt = ClassicGameweek, self._classic_stmt()
+        else:
+            raise ValueError(f"Unknown league type {league_type}")
+        if season is not None:
+            stmt = stmt.where(gameweek_model.season == season)
+        if league_ids:
+            stmt = stmt.where(gameweek_model.league_id.in_(league_ids))
+        if from_gameweek is not None:
+            stmt = stmt.where(gameweek_model.gameweek >= from_gameweek)
+        if to_gameweek is not None:
+            stmt = stmt.where(gameweek_model.gameweek <= to_gameweek)
+        stmt = stmt.order_by(gameweek_model.league_id, gameweek_model.season, gameweek_model.gameweek,
+                             TeamGameweek.team_id, Player.player_id)
+        self.logger.info("Streaming %s export league_ids=%s season=%s gameweeks=%s..%s", league_type, league_ids,
+                         season, from_gameweek, to_gameweek)
+        return await self.session.stream(stmt.execution_options(yield_per=yield_per))
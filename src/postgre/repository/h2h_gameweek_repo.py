@@ -1,74 +1,169 @@
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
+from sqlalchemy import select, tuple_
 from typing import List, Optional, Dict, Any, Tuple
 import logging
 from sqlalchemy.orm import selectinload
+from sqlalchemy.orm.attributes import set_committed_value
 from sqlalchemy.dialects.postgresql import insert
 
 from ..models import H2HGameweek, H2HContenders, H2HMatch, TeamGameweek, TeamGameweekPlayer
 from .team_repo import TeamRepo
+from .standings_repo import StandingsRepo
+from .season_repo import SeasonRepo, resolve_season
 from .pydantic_model import ContendersModel, MatchesModel
 
 from uuid import UUID
 
+TEAM_FETCH_CHUNK = 5000
+
+
 class H2HGameweekRepo:
     def __init__(self, session: AsyncSession):
         self.session = session
         self.logger = logging.getLogger(self.__class__.__name__)
         self.team_repo = TeamRepo(session)
+        self.standings_repo = StandingsRepo(session)
+        self.season_repo = SeasonRepo(session)
+
+    async def _load_teams(self, gameweeks: List[H2HGameweek]) -> None:
+        # matches and contenders point at the same TeamGameweek rows, so fetch every referenced team
+        # with its links and players once instead of running a selectin chain per relationship
+        team_ids = set()
+        for gw in gameweeks:
+            for match in gw.matches:
+                team_ids.update((match.first_contender_id, match.second_contender_id))
+            team_ids.update(contender.team_id for contender in gw.contenders)
+        team_ids.discard(None)
+        # the season keeps the lookup on the partitions the gameweeks were read from
+        seasons = {gw.season for gw in gameweeks}
+
+        teams: Dict[UUID, TeamGameweek] = {}
+        team_ids = list(team_ids)
+        # batch reports can reference tens of thousands of teams, keep each IN list well below the bind limit
+        for start in range(0, len(team_ids), TEAM_FETCH_CHUNK):
+            stmt = (
+                select(TeamGameweek)
+                .options(selectinload(TeamGameweek.composition_links).selectinload(TeamGameweekPlayer.player_gameweek))
+                .where(TeamGameweek.season.in_(seasons),
+                       TeamGameweek.id.in_(team_ids[start:start + TEAM_FETCH_CHUNK]))
+            )
+            result = await self.session.execute(stmt)
+            teams.update((team.id, team) for team in result.scalars().all())
+
+        for gw in gameweeks:
+            for match in gw.matches:
+                set_committed_value(match, "first_contender", teams.get(match.first_contender_id))
+                set_committed_value(match, "second_contender", teams.get(match.second_contender_id))
+            for contender in gw.contenders:
+                set_committed_value(contender, "team", teams.get(contender.team_id))
+        self.logger.debug("Loaded %s teams for %s H2H gameweeks", len(teams), len(gameweeks))
 
-    async def get_by_gameweek(self, league_id: int, gameweek: int) -> Optional[H2HGameweek]:
-        self.logger.debug("Fetching H2H gameweek league_id=%s gameweek=%s", league_id, gameweek)
+    async def get_by_gameweek(self, league_id: int, gameweek: int, load_teams: bool = True,
+                              season: Optional[int] = None) -> Optional[H2HGameweek]:
+        season = resolve_season(season)
+        self.logger.debug("Fetching H2H gameweek league_id=%s season=%s gameweek=%s", league_id, season, gameweek)
         stmt = (
             select(H2HGameweek)
-            .options(
-                selectinload(H2HGameweek.matches)
-                .selectinload(H2HMatch.first_contender)
-                .selectinload(TeamGameweek.composition_links).selectinload(TeamGameweekPlayer.player_gameweek),
-                selectinload(H2HGameweek.matches)
-                .selectinload(H2HMatch.second_contender)
-                .selectinload(TeamGameweek.composition_links).selectinload(TeamGameweekPlayer.player_gameweek),
-                selectinload(H2HGameweek.contenders)
-                .selectinload(H2HContenders.team)
-                .selectinload(TeamGameweek.composition_links).selectinload(TeamGameweekPlayer.player_gameweek),
-            )
-            .where(H2HGameweek.league_id == league_id, H2HGameweek.gameweek == gameweek)
+            .options(selectinload(H2HGameweek.matches), selectinload(H2HGameweek.contenders))
+            .where(H2HGameweek.league_id == league_id, H2HGameweek.season == season,
+                   H2HGameweek.gameweek == gameweek)
         )
         result = await self.session.execute(stmt)
         gw = result.scalar_one_or_none()
         if not gw:
             self.logger.info("H2H gameweek not found league_id=%s gameweek=%s", league_id, gameweek)
+        elif load_teams:
+            await self._load_teams([gw])
         return gw
 
-    async def get_last_n_gameweeks(self, league_id: int, n: int) -> List[H2HGameweek]:
-        self.logger.debug("Fetching last %s H2H gameweeks league_id=%s", n, league_id)
+    async def get_last_n_gameweeks(self, league_id: int, n: int, season: Optional[int] = None) -> List[H2HGameweek]:
+        # the last n gameweeks of the season of the league's latest gameweek
+        latest = await self.season_repo.latest(H2HGameweek, [league_id], resolve_season(season))
+        if league_id not in latest:
+            return []
+        season, last_gameweek = latest[league_id]
+        self.logger.debug("Fetching last %s H2H gameweeks league_id=%s season=%s", n, league_id, season)
         stmt = (
             select(H2HGameweek)
-            .options(
-                selectinload(H2HGameweek.matches)
-                .selectinload(H2HMatch.first_contender)
-                .selectinload(TeamGameweek.composition_links).selectinload(TeamGameweekPlayer.player_gameweek),
-                selectinload(H2HGameweek.matches)
-                .selectinload(H2HMatch.second_contender)
-                .selectinload(TeamGameweek.composition_links).selectinload(TeamGameweekPlayer.player_gameweek),
-                selectinload(H2HGameweek.contenders)
-                .selectinload(H2HContenders.team)
-                .selectinload(TeamGameweek.composition_links).selectinload(TeamGameweekPlayer.player_gameweek),
-            )
-            .where(H2HGameweek.league_id == league_id)
+            .options(selectinload(H2HGameweek.matches), selectinload(H2HGameweek.contenders))
+            .where(H2HGameweek.league_id == league_id, H2HGameweek.season == season,
+                   H2HGameweek.gameweek <= last_gameweek)
             .order_by(H2HGameweek.gameweek.desc())
             .limit(n)
         )
         result = await self.session.execute(stmt)
         rows = list(result.scalars().all())
+        await self._load_teams(rows)
         self.logger.info("Fetched %s H2H gameweeks league_id=%s", len(rows), league_id)
         return rows
 
-    async def _upsert_h2h_gameweek(self, league_id: int, gameweek: int) -> Optional[UUID]:
-        stmt = insert(H2HGameweek).values(league_id=league_id, gameweek=gameweek)
+    async def get_many(self, keys: List[Tuple[int, Optional[int]]],
+                       season: Optional[int] = None) -> Dict[Tuple[int, Optional[int]], H2HGameweek]:
+        # a None gameweek selects the latest gameweek of that league, exact gameweeks are of the given season
+        season = resolve_season(season)
+        wanted = {(league_id, season, gameweek) for league_id, gameweek in keys if gameweek is not None}
+        latest = await self.season_repo.latest(
+            H2HGameweek, {league_id for league_id, gameweek in keys if gameweek is None}, season)
+        wanted.update((league_id, *version) for league_id, version in latest.items())
+        if not wanted:
+            return {}
+        stmt = (
+            select(H2HGameweek)
+            .options(selectinload(H2HGameweek.matches), selectinload(H2HGameweek.contenders))
+            .where(H2HGameweek.season.in_({key[1] for key in wanted}),
+                   tuple_(H2HGameweek.league_id, H2HGameweek.season, H2HGameweek.gameweek).in_(wanted))
+        )
+        result = await self.session.execute(stmt)
+        rows = list(result.scalars().all())
+        await self._load_teams(rows)
+
+        by_key = {(gw.league_id, gw.season, gw.gameweek): gw for gw in rows}
+        found = {}
+        for league_id, gameweek in keys:
+            version = (season, gameweek) if gameweek is not None else latest.get(league_id)
+            gw = by_key.get((league_id, *version)) if version is not None else None
+            if gw is not None:
+                found[(league_id, gameweek)] = gw
+        self.logger.info("Fetched %s of %s requested H2H gameweeks", len(found), len(keys))
+        return found
+
+    async def get_version(self, league_id: int, gameweek: Optional[int] = None,
+                          season: Optional[int] = None) -> Optional[Tuple[UUID, int, int, Optional[str]]]:
+        # id, season, number and content hash of a stored gameweek (the latest when gameweek is None) without loading it
+        season = resolve_season(season)
+        if gameweek is None:
+            latest = await self.season_repo.latest(H2HGameweek, [league_id], season)
+            if league_id not in latest:
+                return None
+            season, gameweek = latest[league_id]
+        stmt = (
+            select(H2HGameweek.id, H2HGameweek.season, H2HGameweek.gameweek, H2HGameweek.content_hash)
+            .where(H2HGameweek.league_id == league_id, H2HGameweek.season == season,
+                   H2HGameweek.gameweek == gameweek)
+        )
+        result = await self.session.execute(stmt)
+        row = result.first()
+        return tuple(row) if row is not None else None
+
+    async def get_league_ids(self, gameweek: int, season: int) -> List[int]:
+        stmt = select(H2HGameweek.league_id).where(H2HGameweek.season == season, H2HGameweek.gameweek == gameweek)
+        result = await self.session.execute(stmt.order_by(H2HGameweek.league_id))
+        return list(result.scalars().all())
+
+    async def get_content_hash(self, league_id: int, gameweek: int, season: int) -> Optional[str]:
+        stmt = select(H2HGameweek.content_hash).where(H2HGameweek.league_id == league_id,
+                                                      H2HGameweek.season == season,
+                                                      H2HGameweek.gameweek == gameweek)
+        result = await self.session.execute(stmt)
+        return result.scalar_one_or_none()
+
+    async def _upsert_h2h_gameweek(self, league_id: int, gameweek: int, season: int,
+                                   content_hash: Optional[str] = None) -> Optional[UUID]:
+        stmt = insert(H2HGameweek).values(league_id=league_id, season=season, gameweek=gameweek,
+                                          content_hash=content_hash)
         stmt = stmt.on_conflict_do_update(
-            index_elements=["league_id", "gameweek"],
-            set_={"league_id": stmt.excluded.league_id}
+            index_elements=["league_id", "season", "gameweek"],
+            set_={"league_id": stmt.excluded.league_id, "content_hash": stmt.excluded.content_hash}
         ).returning(H2HGameweek.id)
         result = await self.session.execute(stmt)
         rows = result.fetchall()
@@ -93,6 +188,7 @@ class H2HGameweekRepo:
             amount += 1
             match = H2HMatch(
                 h2h_gameweek_id=gameweek_model.id,
+                season=gameweek_model.season,
                 first_contender_id=first_id,
                 second_contender_id=second_id
             )
@@ -100,30 +196,33 @@ class H2HGameweekRepo:
         await self.session.flush()
         self.logger.debug("Upserted %s H2H matches for gameweek_id=%s", amount, gameweek_model.id)
 
-    async def _upsert_contenders(self, league_uuid: UUID, contenders: List[dict]) -> None:
+    async def _upsert_contenders(self, league_uuid: UUID, season: int, contenders: List[dict]) -> None:
         stmt = insert(H2HContenders).values([
             {
                 'h2h_gameweek_id': league_uuid,
                 'team_id': contender.get("team_uuid", None),
+                'season': season,
                 'points': contender.get("score", None),
             }
             for contender in contenders
         ])
         stmt = stmt.on_conflict_do_update(
-            index_elements=['h2h_gameweek_id', 'team_id'],
+            index_elements=['h2h_gameweek_id', 'team_id', 'season'],
             set_={'points': stmt.excluded.points}
         )
         result = await self.session.execute(stmt)
         self.logger.debug("Upserted %s H2H contenders for gameweek_id=%s", result.rowcount, league_uuid)
 
-    async def upsert_league(self, league_id: int, gameweek: int, matches: List[Dict[str, Any]], contenders: List[Dict[str, Any]]) -> UUID:
+    async def upsert_league(self, league_id: int, gameweek: int, matches: List[Dict[str, Any]], contenders: List[Dict[str, Any]],
+                            content_hash: Optional[str] = None, season: Optional[int] = None) -> UUID:
+        season = resolve_season(season)
         for contender in contenders:
             contender['gameweek'] = gameweek
         contenders_models = [ContendersModel.model_validate(contender) for contender in contenders]
         matches_models = [MatchesModel.model_validate(match) for match in matches]
 
-        teams_id_map = await self.team_repo.upsert_teams(contenders_models, update_points=False)
-        gameweek_uuid = await self._upsert_h2h_gameweek(league_id, gameweek)
+        teams_id_map = await self.team_repo.upsert_teams(contenders_models, season, update_points=False)
+        gameweek_uuid = await self._upsert_h2h_gameweek(league_id, gameweek, season, content_hash)
         _matches_pairs = [
             (teams_id_map.get(match.first_contender_id), teams_id_map.get(match.second_contender_id))
             for match in matches_models
@@ -131,7 +230,10 @@ class H2HGameweekRepo:
         ]
         if not gameweek_uuid:
             raise Exception(f"Failed to upsert H2H gameweek league_id={league_id} gameweek={gameweek}")
-        gameweek_model = await self.get_by_gameweek(league_id, gameweek)
+        await self.standings_repo.update_h2h(league_id, season, gameweek_uuid, contenders_models, matches_models,
+                                            teams_id_map)
+        # only the match rows are replaced here, the team graph is not needed
+        gameweek_model = await self.get_by_gameweek(league_id, gameweek, load_teams=False, season=season)
         await self._upsert_matches(gameweek_model, _matches_pairs)
 
         _contenders_parts = [
@@ -142,10 +244,10 @@ class H2HGameweekRepo:
             for contender in contenders_models
             if teams_id_map.get(contender.team_id)
         ]
-        await self._upsert_contenders(gameweek_uuid, _contenders_parts)
+        await self._upsert_contenders(gameweek_uuid, season, _contenders_parts)
 
         self.logger.info(
-            "Stored H2H gameweek league_id=%s gw=%s id=%s",
-            league_id, gameweek, gameweek_uuid
+            "Stored H2H gameweek league_id=%s season=%s gw=%s id=%s",
+            league_id, season, gameweek, gameweek_uuid
         )
         return gameweek_uuid
@@ -0,0 +1,108 @@
+import logging
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional
+from uuid import UUID
+
+from sqlalchemy import delete, select, update, or_, func
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ..models import OutboxMessage
+
+
+class OutboxRepo:
+    def __init__(self, session: AsyncSession):
+        self.session = session
+        self.logger = logging.getLogger(self.__class__.__name__)
+
+    async def add(self, kind: str, destination: str, payload: Dict, idempotency_key: str,
+                  headers: Optional[Dict] = None, subscription_id: Optional[UUID] = None) -> Optional[UUID]:
+        stmt = insert(OutboxMessage).values(
+            kind=kind, destination=destination, payload=payload, headers=headers, idempotency_key=idempotency_key,
+            subscription_id=subscription_id,
+        ).on_conflict_do_nothing(index_elements=["idempotency_key"]).returning(OutboxMessage.id)
+        result = await self.session.execute(stmt)
+        message_id = result.scalar_one_or_none()
+        if message_id is None:
+            self.logger.debug("Outbox message %s already enqueued", idempotency_key)
+        else:
+            self.logger.debug("Enqueued outbox message id=%s key=%s", message_id, idempotency_key)
+        return message_id
+
+    async def claim_pending(self, limit: int, lease: float) -> List[OutboxMessage]:
+        """Leases due messages to the caller, who commits right away and delivers outside the transaction.
+
+        SKIP LOCKED only keeps concurrent claims apart, the lease keeps the rows away from other relays until the
+        results are recorded or it runs out.
+        """
+        now = datetime.now(timezone.utc)
+        due = (
+            select(OutboxMessage.id)
+            .where(OutboxMessage.status == "pending", OutboxMessage.available_at <= now,
+                   or_(OutboxMessage.locked_until.is_(None), OutboxMessage.locked_until < now))
+            .order_by(OutboxMessage.available_at)
+            .limit(limit)
+            .with_for_update(skip_locked=True)
+        )
+        stmt = (
+            update(OutboxMessage)
+            .where(OutboxMessage.id.in_(due))
+            .values(locked_until=now + timedelta(seconds=lease))
+            .returning(OutboxMessage)
+            .execution_options(synchronize_session=False)
+        )
+        result = await self.session.execute(stmt)
+        return sorted(result.scalars().all(), key=lambda message: message.available_at)
+
+    async def _record(self, message: OutboxMessage, **values) -> None:
+        values["locked_until"] = None
+        await self.session.execute(update(OutboxMessage).where(OutboxMessage.id == message.id).values(**values))
+        for name, value in values.items():
+            setattr(message, name, value)
+
+    async def mark_delivered(self, message: OutboxMessage) -> None:
+        await self._record(message, status="delivered", attempts=message.attempts + 1,
+                           delivered_at=datetime.now(timezone.utc), last_error=None)
+
+    async def mark_dead(self, message: OutboxMessage, error: str) -> None:
+        await self._record(message, status="dead", last_error=error[:2000])
+        self.logger.error("Outbox message %s dropped: %s", message.idempotency_key, error)
+
+    async def defer(self, message: OutboxMessage, delay: float, reason: str) -> None:
+        # not an attempt: the target was never called
+        await self._record(message, last_error=reason[:2000],
+                           available_at=datetime.now(timezone.utc) + timedelta(seconds=delay))
+
+    async def mark_failed(self, message: OutboxMessage, error: str, max_attempts: int, base_backoff: float,
+                          max_backoff: float) -> None:
+        attempts = message.attempts + 1
+        if attempts >= max_attempts:
+            await self._record(message, status="dead", attempts=attempts, last_error=error[:2000])
+            self.logger.error("Outbox message %s gave up after %s attempts: %s", message.idempotency_key,
+                              attempts, error)
+            return
+        delay = min(base_backoff * 2 ** (attempts - 1), max_backoff)
+        await self._record(message, attempts=attempts, last_error=error[:2000],
+                           available_at=datetime.now(timezone.utc) + timedelta(seconds=delay))
+        self.logger.warning("Outbox message %s failed attempt %s, retry in %.0f s: %s", message.idempotency_key,
+                            attempts, delay, error)
+
+    async def purge(self, before: datetime) -> int:
+        """Deletes delivered and dead messages last attempted before the cutoff.
+
+        available_at moves with every retry, so it marks a dead message's last attempt. The key of a purged
+        message can be enqueued again.
+        """
+        stmt = delete(OutboxMessage).where(
+            OutboxMessage.status.in_(("delivered", "dead")),
+            func.coalesce(OutboxMessage.delivered_at, OutboxMessage.available_at) < before,
+        )
+        result = await self.session.execute(stmt)
+        if result.rowcount:
+            self.logger.info("Purged %s finished outbox messages older than %s", result.rowcount, before)
+        return result.rowcount
+
+    async def count_by_status(self) -> Dict[str, int]:
+        stmt = select(OutboxMessage.status, func.count()).group_by(OutboxMessage.status)
+        result = await self.session.execute(stmt)
+        return {status: count for status, count in result.all()}
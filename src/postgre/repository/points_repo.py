@@ -0,0 +1,116 @@
+import logging
+from typing import Dict, List, Optional, Set, Tuple, Type, Union
+from uuid import UUID, uuid4
+
+from sqlalchemy import select, update, values, column, func, tuple_, Integer, Uuid, CTE
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ..models import (PlayerGameweek, TeamGameweek, TeamGameweekPlayer, H2HGameweek, H2HContenders, ClassicGameweek,
+                      classic_gameweek_teams)
+from .standings_repo import StandingsRepo
+from .season_repo import resolve_season
+
+LeagueKey = Tuple[str, int]
+
+
+class PointsRepo:
+    """Applies corrected player points to everything already stored for the gameweek.
+
+    Team and classic link points move by factor * difference instead of being recomputed, so hits and
+    manual adjustments in the stored scores survive. Every statement works off the changed players, so the cost
+    follows how many teams picked them and the number of statements stays fixed. A correction belongs to one
+    season, every statement stays on its partitions.
+    """
+
+    def __init__(self, session: AsyncSession):
+        self.session = session
+        self.standings_repo = StandingsRepo(session)
+        self.logger = logging.getLogger(self.__class__.__name__)
+
+    async def _player_changes(self, points: Dict[Tuple[int, int], int], season: int) -> List[Tuple[UUID, int, int]]:
+        stmt = (
+            select(PlayerGameweek.id, PlayerGameweek.player_id, PlayerGameweek.gameweek, PlayerGameweek.points)
+            .where(PlayerGameweek.season == season,
+                   tuple_(PlayerGameweek.player_id, PlayerGameweek.gameweek).in_(list(points)))
+        )
+        result = await self.session.execute(stmt)
+        changes = []
+        for row_id, player_id, gameweek, current in result.all():
+            new = points[(player_id, gameweek)]
+            if new != current:
+                changes.append((row_id, new, new - current))
+        return changes
+
+    async def _mark_changed(self, model: Type[Union[ClassicGameweek, H2HGameweek]], gameweek_ids,
+                            marker: str, season: int) -> List[int]:
+        # the stored hash described the original snapshot, a resend of it must be written again
+        result = await self.session.execute(
+            update(model).where(model.season == season, model.id.in_(gameweek_ids)).values(content_hash=marker).returning(model.league_id)
+        )
+        return list(result.scalars().all())
+
+    async def _update_classic(self, team_deltas: CTE, marker: str, season: int) -> List[int]:
+        links = classic_gameweek_teams.c
+        # a link that no longer counts stays NULL, but its gameweek still shows the team
+        leagues = await self._mark_changed(
+            ClassicGameweek,
+            select(links.classic_gameweek_id).join(team_deltas, team_deltas.c.id == links.team_id)
+            .where(links.season == season),
+            marker, season
+        )
+        await self.standings_repo.shift_classic(team_deltas, season)
+        await self.session.execute(
+            update(classic_gameweek_teams)
+            .where(links.season == season, links.team_id == team_deltas.c.id)
+            .values(points=links.points + team_deltas.c.delta)
+        )
+        return leagues
+
+    async def _update_h2h(self, team_deltas: CTE, marker: str, season: int) -> List[int]:
+        leagues = await self._mark_changed(
+            H2HGameweek,
+            select(H2HContenders.h2h_gameweek_id).join(team_deltas, team_deltas.c.id == H2HContenders.team_id)
+            .where(H2HContenders.season == season),
+            marker, season
+        )
+        # the contender points are league points, only the standings replay the matches with the new team scores
+        await self.standings_repo.shift_h2h(team_deltas, season)
+        return leagues
+
+    async def apply(self, points: Dict[Tuple[int, int], int], season: Optional[int] = None) -> Set[LeagueKey]:
+        """Stores new points keyed by (player_id, gameweek) and returns the leagues whose gameweeks changed."""
+        season = resolve_season(season)
+        changes = await self._player_changes(points, season)
+        if not changes:
+            self.logger.debug("No player points changed among %s updates", len(points))
+            return set()
+        changed = values(column("id", Uuid), column("points", Integer), column("diff", Integer),
+                         name="changed_players").data(changes)
+        await self.session.execute(
+            update(PlayerGameweek).where(PlayerGameweek.season == season, PlayerGameweek.id == changed.c.id)
+            .values(points=changed.c.points)
+        )
+        # bench picks move no score but still show in the reports, their teams count as changed too
+        team_deltas = (
+            select(TeamGameweekPlayer.team_gameweek_id.label("id"),
+                   func.sum(TeamGameweekPlayer.factor * changed.c.diff).label("delta"))
+            .join(changed, changed.c.id == TeamGameweekPlayer.player_gameweek_id)
+            .where(TeamGameweekPlayer.season == season)
+            .group_by(TeamGameweekPlayer.team_gameweek_id)
+            .cte("team_deltas")
+        )
+        result = await self.session.execute(
+            update(TeamGameweek)
+            .where(TeamGameweek.season == season, TeamGameweek.id == team_deltas.c.id)
+            .values(points=TeamGameweek.points + team_deltas.c.delta)
+        )
+        if not result.rowcount:
+            self.logger.debug("Updated %s players, no stored team picks them", len(changes))
+            return set()
+
+        marker = f"delta-{uuid4().hex}"
+        affected = {("classic", league_id) for league_id in await self._update_classic(team_deltas, marker, season)}
+        affected |= {("h2h", league_id) for league_id in await self._update_h2h(team_deltas, marker, season)}
+        self.logger.info("Applied points of %s players to %s teams in %s leagues", len(changes), result.rowcount,
+                         len(affected))
+        return affected
@@ -0,0 +1,39 @@
+import logging
+from datetime import datetime, timezone
+from typing import Optional
+
+from sqlalchemy import delete
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ..models import ProcessedMessage
+
+
+class ProcessedMessageRepo:
+    def __init__(self, session: AsyncSession):
+        self.session = session
+        self.logger = logging.getLogger(self.__class__.__name__)
+
+    async def claim(self, key: str, message_type: Optional[str] = None) -> bool:
+        """Records the key, False when it is already recorded.
+
+        The row commits or rolls back with the message's writes. A concurrent claim of the same key waits on the
+        primary key until the first transaction ends, then sees it processed, or claims it after a rollback.
+        """
+        stmt = insert(ProcessedMessage).values(key=key, type=message_type).on_conflict_do_nothing(
+            index_elements=["key"]
+        ).returning(ProcessedMessage.key)
+        result = await self.session.execute(stmt)
+        return result.scalar_one_or_none() is not None
+
+    async def record(self, key: str, message_type: Optional[str] = None) -> None:
+        """Records the key without checking it, a key recorded before only gets its time refreshed."""
+        stmt = insert(ProcessedMessage).values(key=key, type=message_type)
+        stmt = stmt.on_conflict_do_update(index_elements=["key"], set_={"processed": datetime.now(timezone.utc)})
+        await self.session.execute(stmt)
+
+    async def purge(self, before: datetime) -> int:
+        result = await self.session.execute(delete(ProcessedMessage).where(ProcessedMessage.processed < before))
+        if result.rowcount:
+            self.logger.info("Purged %s processed message keys older than %s", result.rowcount, before)
+        return result.rowcount
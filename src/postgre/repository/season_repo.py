@@ -0,0 +1,124 @@
+import logging
+import re
+from typing import Dict, Iterable, List, Optional, Set, Tuple, Type, Union
+
+from sqlalchemy import select, func, text
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncSession
+
+from ... import env
+from ..models import ClassicGameweek, H2HGameweek
+
+# referenced tables first: a season's partitions are created in this order and detached in the reverse one
+PARTITIONED_TABLES = ("player_gameweek_table", "team_gameweek_table", "classic_gameweek_table", "h2h_gameweek_table",
+                      "team_gameweek_players", "classic_gameweek_teams", "h2h_contenders_table", "h2h_match_table")
+STANDINGS_TABLES = ("h2h_standing_table", "classic_standing_table")
+
+# seasons whose partitions this process already created or found
+_ensured: Set[int] = set()
+
+
+def resolve_season(season: Optional[int]) -> int:
+    return env.season.current if season is None else season
+
+
+def partitions_ready(season: int) -> bool:
+    return season in _ensured
+
+
+def partition_name(table: str, season: int) -> str:
+    return f"{table}_{int(season)}"
+
+
+class SeasonRepo:
+    """Season partitions of the per-gameweek tables.
+
+    Each season lives in its own partition of every fact table, so feeds and upserts of the current season never
+    read older ones, and archiving a season detaches its partitions into the archive schema without copying rows.
+    """
+
+    def __init__(self, session: Union[AsyncSession, AsyncConnection]):
+        self.session = session
+        self.logger = logging.getLogger(self.__class__.__name__)
+
+    async def ensure(self, season: int, remember: bool = True) -> None:
+        """Creates the season's partitions. remember=False for a transaction that may still roll them back."""
+        if season in _ensured:
+            return
+        result = await self.session.execute(text(
+            "SELECT c.relname FROM pg_partitioned_table p JOIN pg_class c ON c.oid = p.partrelid "
+            "WHERE c.relnamespace = CAST(current_schema() AS regnamespace) AND c.relname = ANY(:tables)"
+        ), {"tables": list(PARTITIONED_TABLES)})
+        missing = set(PARTITIONED_TABLES) - set(result.scalars().all())
+        if missing:
+            # tables of a deployment that predates the partitioning, `alembic upgrade head` converts them
+            self.logger.warning("Skipping partitions of season %s, %s not partitioned yet, run the migrations",
+                                season, ", ".join(sorted(missing)))
+            return
+        for table in PARTITIONED_TABLES:
+            await self.session.execute(text(
+                f'CREATE TABLE IF NOT EXISTS "{partition_name(table, season)}" '
+                f'PARTITION OF "{table}" FOR VALUES IN ({int(season)})'
+            ))
+        if remember:
+            _ensured.add(season)
+        self.logger.debug("Partitions of season %s are in place", season)
+
+    async def seasons(self) -> List[int]:
+        result = await self.session.execute(text(
+            "SELECT pg_get_expr(c.relpartbound, c.oid) FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+            "WHERE i.inhparent = 'team_gameweek_table'::regclass"
+        ))
+        return sorted(int(season) for bound in result.scalars().all()
+                      for season in re.findall(r"\d+", bound or ""))
+
+    async def _foreign_keys(self, table: str) -> List[str]:
+        result = await self.session.execute(text(
+            "SELECT conname FROM pg_constraint WHERE conrelid = CAST(:table AS regclass) AND contype = 'f'"
+        ), {"table": f'"{table}"'})
+        return list(result.scalars().all())
+
+    async def archive(self, season: int, schema: str, tablespace: str = "") -> None:
+        """Moves a season out of the live tables into standalone tables of the archive schema."""
+        await self.session.execute(text(f'CREATE SCHEMA IF NOT EXISTS "{schema}"'))
+        for table in reversed(PARTITIONED_TABLES):
+            partition = partition_name(table, season)
+            await self.session.execute(text(f'ALTER TABLE "{table}" DETACH PARTITION "{partition}"'))
+            # a detached partition keeps its keys, they would pin the partitions it points into
+            for constraint in await self._foreign_keys(partition):
+                await self.session.execute(text(f'ALTER TABLE "{partition}" DROP CONSTRAINT "{constraint}"'))
+            await self.session.execute(text(f'ALTER TABLE "{partition}" SET SCHEMA "{schema}"'))
+            if tablespace:
+                await self.session.execute(text(f'ALTER TABLE "{schema}"."{partition}" SET TABLESPACE "{tablespace}"'))
+        for table in STANDINGS_TABLES:
+            archived = partition_name(table, season)
+            await self.session.execute(text(
+                f'CREATE TABLE "{schema}"."{archived}" AS SELECT * FROM "{table}" WHERE season = :season'
+            ), {"season": season})
+            await self.session.execute(text(f'DELETE FROM "{table}" WHERE season = :season'), {"season": season})
+        _ensured.discard(season)
+        self.logger.info("Archived season %s into schema %s", season, schema)
+
+    async def latest(self, model: Type[Union[ClassicGameweek, H2HGameweek]], league_ids: Iterable[int],
+                     season: int) -> Dict[int, Tuple[int, int]]:
+        """(season, gameweek) of the newest stored gameweek of each league.
+
+        The season is looked up on its own partition first; only leagues without a gameweek in it yet, between
+        two seasons, fall back to the older ones.
+        """
+        league_ids = set(league_ids)
+        result = await self.session.execute(
+            select(model.league_id, func.max(model.gameweek))
+            .where(model.season == season, model.league_id.in_(league_ids))
+            .group_by(model.league_id)
+        )
+        latest = {league_id: (season, gameweek) for league_id, gameweek in result.all()}
+        previous = league_ids - latest.keys()
+        if previous:
+            result = await self.session.execute(
+                select(model.league_id, model.season, model.gameweek)
+                .where(model.season < season, model.league_id.in_(previous))
+                .distinct(model.league_id)
+                .order_by(model.league_id, model.season.desc(), model.gameweek.desc())
+            )
+            latest.update({league_id: (found, gameweek) for league_id, found, gameweek in result.all()})
+        return latest
@@ -0,0 +1,61 @@
+import logging
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import select, delete, tuple_
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ..models import GameweekSnapshot
+
+
+class SnapshotRepo:
+    def __init__(self, session: AsyncSession):
+        self.session = session
+        self.logger = logging.getLogger(self.__class__.__name__)
+
+    async def get(self, league_type: str, league_id: int, season: int, gameweek: int) -> Optional[GameweekSnapshot]:
+        stmt = select(GameweekSnapshot).where(GameweekSnapshot.league_type == league_type,
+                                              GameweekSnapshot.league_id == league_id,
+                                              GameweekSnapshot.season == season,
+                                              GameweekSnapshot.gameweek == gameweek)
+        result = await self.session.execute(stmt)
+        return result.scalar_one_or_none()
+
+    async def get_many(self, league_type: str, keys: Iterable[Tuple[int, int]],
+                       season: int) -> Dict[Tuple[int, int], GameweekSnapshot]:
+        keys = list(keys)
+        if not keys:
+            return {}
+        stmt = select(GameweekSnapshot).where(GameweekSnapshot.league_type == league_type,
+                                              GameweekSnapshot.season == season,
+                                              tuple_(GameweekSnapshot.league_id, GameweekSnapshot.gameweek).in_(keys))
+        result = await self.session.execute(stmt)
+        return {(snapshot.league_id, snapshot.gameweek): snapshot for snapshot in result.scalars().all()}
+
+    async def put_many(self, snapshots: List[Dict]) -> None:
+        if not snapshots:
+            return
+        stmt = insert(GameweekSnapshot).values(snapshots)
+        # finalizing again replaces the snapshot, e.g. after a correction discarded and re-rendered it
+        stmt = stmt.on_conflict_do_update(
+            index_elements=["league_type", "league_id", "season", "gameweek"],
+            set_={"content_hash": stmt.excluded.content_hash, "report": stmt.excluded.report,
+                  "data": stmt.excluded.data, "created": stmt.excluded.created},
+        )
+        await self.session.execute(stmt)
+        self.logger.debug("Stored %s gameweek snapshots", len(snapshots))
+
+    async def discard(self, leagues: Iterable[Tuple[str, int]], season: int, gameweeks: Iterable[int]) -> int:
+        """Drops the snapshots of gameweeks whose stored data changed, they are rendered live again."""
+        leagues, gameweeks = list(leagues), list(gameweeks)
+        if not leagues or not gameweeks:
+            return 0
+        result = await self.session.execute(
+            delete(GameweekSnapshot).where(GameweekSnapshot.season == season,
+                                           GameweekSnapshot.gameweek.in_(gameweeks),
+                                           tuple_(GameweekSnapshot.league_type, GameweekSnapshot.league_id)
+                                           .in_(leagues))
+        )
+        if result.rowcount:
+            self.logger.warning("Discarded %s final snapshots of changed gameweeks %s", result.rowcount, gameweeks)
+        return result.rowcount
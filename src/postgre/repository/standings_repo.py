@@ -0,0 +1,251 @@
+import logging
+from typing import List, Dict, Tuple, Optional, Type
+from uuid import UUID
+
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select, update, and_, or_, case, func, CTE
+from sqlalchemy.orm import aliased
+from sqlalchemy.dialects.postgresql import insert
+
+from ..models import (H2HStanding, ClassicStanding, H2HGameweek, H2HMatch, TeamGameweek,
+                      ClassicGameweek, classic_gameweek_teams, Base)
+from .pydantic_model import ContendersModel, MatchesModel
+
+H2H_FIELDS = ('played', 'wins', 'draws', 'losses', 'points_for', 'points_against', 'league_points')
+CLASSIC_FIELDS = ('played', 'total_points')
+
+Contribution = Dict[int, Dict[str, int]]
+TeamNames = Dict[int, Tuple[str, Optional[str]]]
+
+
+def _h2h_match_contribution(result: Contribution, first_id: int, first_score: int,
+                            second_id: int, second_score: int, sign: int = 1) -> None:
+    for team_id, scored, conceded in ((first_id, first_score, second_score), (second_id, second_score, first_score)):
+        row = result.setdefault(team_id, dict.fromkeys(H2H_FIELDS, 0))
+        row['played'] += sign
+        row['points_for'] += sign * scored
+        row['points_against'] += sign * conceded
+        if scored > conceded:
+            row['wins'] += sign
+            row['league_points'] += sign * 3
+        elif scored == conceded:
+            row['draws'] += sign
+            row['league_points'] += sign
+        else:
+            row['losses'] += sign
+
+
+class StandingsRepo:
+    def __init__(self, session: AsyncSession):
+        self.session = session
+        self.logger = logging.getLogger(self.__class__.__name__)
+
+    async def get_h2h(self, league_id: int, season: int) -> List[H2HStanding]:
+        stmt = (
+            select(H2HStanding)
+            .where(H2HStanding.league_id == league_id, H2HStanding.season == season)
+            .order_by(H2HStanding.league_points.desc(), H2HStanding.points_for.desc())
+        )
+        result = await self.session.execute(stmt)
+        return list(result.scalars().all())
+
+    async def get_classic(self, league_id: int, season: int) -> List[ClassicStanding]:
+        stmt = (
+            select(ClassicStanding)
+            .where(ClassicStanding.league_id == league_id, ClassicStanding.season == season)
+            .order_by(ClassicStanding.total_points.desc())
+        )
+        result = await self.session.execute(stmt)
+        return list(result.scalars().all())
+
+    async def _apply_delta(self, model: Type[Base], fields: Tuple[str, ...], league_id: int, season: int,
+                           delta: Contribution, names: TeamNames) -> None:
+        values = [
+            {'league_id': league_id, 'season': season, 'team_id': team_id, 'name': names[team_id][0], 'leader': names[team_id][1],
+             **row}
+            for team_id, row in delta.items()
+        ]
+        if not values:
+            return
+        stmt = insert(model).values(values)
+        update_set = {'name': stmt.excluded.name, 'leader': stmt.excluded.leader}
+        for field in fields:
+            update_set[field] = getattr(model, field) + getattr(stmt.excluded, field)
+        stmt = stmt.on_conflict_do_update(index_elements=['league_id', 'season', 'team_id'], set_=update_set)
+        result = await self.session.execute(stmt)
+        self.logger.debug("Applied standings delta to %s rows league_id=%s", result.rowcount, league_id)
+
+    @staticmethod
+    def _merge(new: Contribution, old: Contribution, fields: Tuple[str, ...], keep: set) -> Contribution:
+        delta: Contribution = {}
+        for team_id in new.keys() | old.keys():
+            row = {f: new.get(team_id, {}).get(f, 0) - old.get(team_id, {}).get(f, 0) for f in fields}
+            if team_id in keep or any(row.values()):
+                delta[team_id] = row
+        return delta
+
+    async def _h2h_old_contribution(self, gameweek_uuid: UUID, season: int) -> Tuple[Contribution, TeamNames]:
+        # the match score is the team's gameweek points, the contender points are the league points it earned
+        first_team, second_team = aliased(TeamGameweek), aliased(TeamGameweek)
+        stmt = (
+            select(first_team.team_id, first_team.name, first_team.leader, first_team.points,
+                   second_team.team_id, second_team.name, second_team.leader, second_team.points)
+            .select_from(H2HMatch)
+            .join(H2HGameweek, H2HGameweek.id == H2HMatch.h2h_gameweek_id)
+            .join(first_team, first_team.id == H2HMatch.first_contender_id)
+            .join(second_team, second_team.id == H2HMatch.second_contender_id)
+            .where(H2HMatch.season == season, H2HMatch.h2h_gameweek_id == gameweek_uuid,
+                   H2HGameweek.season == season, H2HGameweek.standings_applied.is_(True),
+                   first_team.season == season, second_team.season == season)
+        )
+        result = await self.session.execute(stmt)
+        old: Contribution = {}
+        names: TeamNames = {}
+        for f_id, f_name, f_leader, f_pts, s_id, s_name, s_leader, s_pts in result.all():
+            _h2h_match_contribution(old, f_id, f_pts, s_id, s_pts)
+            names[f_id] = (f_name, f_leader)
+            names[s_id] = (s_name, s_leader)
+        return old, names
+
+    async def _team_points(self, teams_id_map: Dict[int, UUID], season: int) -> Dict[int, int]:
+        if not teams_id_map:
+            return {}
+        stmt = select(TeamGameweek.team_id, TeamGameweek.points).where(
+            TeamGameweek.season == season, TeamGameweek.id.in_(list(teams_id_map.values())))
+        result = await self.session.execute(stmt)
+        return dict(result.all())
+
+    async def update_h2h(self, league_id: int, season: int, gameweek_uuid: UUID, contenders: List[ContendersModel],
+                         matches: List[MatchesModel], teams_id_map: Dict[int, UUID]) -> None:
+        """Replaces the gameweek's contribution to the standings, scoring every match by the stored team points
+        the report shows, not by the contenders' score."""
+        old, names = await self._h2h_old_contribution(gameweek_uuid, season)
+        scores = await self._team_points(teams_id_map, season)
+        new: Contribution = {}
+        for match in matches:
+            if match.first_contender_id not in scores or match.second_contender_id not in scores:
+                continue
+            _h2h_match_contribution(new, match.first_contender_id, scores[match.first_contender_id],
+                                    match.second_contender_id, scores[match.second_contender_id])
+        names.update({c.team_id: (c.name, c.leader) for c in contenders})
+
+        delta = self._merge(new, old, H2H_FIELDS, keep=set(new.keys()))
+        await self._apply_delta(H2HStanding, H2H_FIELDS, league_id, season, delta, names)
+        await self.session.execute(
+            update(H2HGameweek).where(H2HGameweek.season == season, H2HGameweek.id == gameweek_uuid)
+            .values(standings_applied=True)
+        )
+        self.logger.debug("Updated H2H standings league_id=%s reverted=%s applied=%s", league_id, len(old), len(new))
+
+    async def _classic_old_contribution(self, gameweek_uuid: UUID, season: int) -> Tuple[Contribution, TeamNames]:
+        stmt = (
+            select(TeamGameweek.team_id, TeamGameweek.name, TeamGameweek.leader, classic_gameweek_teams.c.points)
+            .select_from(classic_gameweek_teams)
+            .join(TeamGameweek, TeamGameweek.id == classic_gameweek_teams.c.team_id)
+            .where(classic_gameweek_teams.c.season == season, TeamGameweek.season == season,
+                   classic_gameweek_teams.c.classic_gameweek_id == gameweek_uuid,
+                   classic_gameweek_teams.c.points.is_not(None))
+        )
+        result = await self.session.execute(stmt)
+        old: Contribution = {}
+        names: TeamNames = {}
+        for team_id, name, leader, points in result.all():
+            old[team_id] = {'played': 1, 'total_points': points}
+            names[team_id] = (name, leader)
+        return old, names
+
+    async def update_classic(self, league_id: int, season: int, gameweek_uuid: UUID,
+                             contenders: List[ContendersModel]) -> None:
+        old, names = await self._classic_old_contribution(gameweek_uuid, season)
+        new: Contribution = {c.team_id: {'played': 1, 'total_points': c.score} for c in contenders}
+        names.update({c.team_id: (c.name, c.leader) for c in contenders})
+
+        delta = self._merge(new, old, CLASSIC_FIELDS, keep=set(new.keys()))
+        await self._apply_delta(ClassicStanding, CLASSIC_FIELDS, league_id, season, delta, names)
+        self.logger.debug("Updated classic standings league_id=%s reverted=%s applied=%s",
+                          league_id, len(old), len(new))
+
+    async def shift_classic(self, team_deltas: CTE, season: int) -> None:
+        """Moves total points by the (id, delta) team gameweek changes of the season, for links that count towards
+        standings."""
+        links = classic_gameweek_teams.c
+        shifts = (
+            select(ClassicGameweek.league_id, TeamGameweek.team_id, func.sum(team_deltas.c.delta).label('delta'))
+            .select_from(classic_gameweek_teams)
+            .join(team_deltas, team_deltas.c.id == links.team_id)
+            .join(ClassicGameweek, ClassicGameweek.id == links.classic_gameweek_id)
+            .join(TeamGameweek, TeamGameweek.id == links.team_id)
+            .where(links.season == season, ClassicGameweek.season == season, TeamGameweek.season == season,
+                   links.points.is_not(None), team_deltas.c.delta != 0)
+            .group_by(ClassicGameweek.league_id, TeamGameweek.team_id)
+            .subquery()
+        )
+        result = await self.session.execute(
+            update(ClassicStanding)
+            .where(ClassicStanding.season == season, ClassicStanding.league_id == shifts.c.league_id,
+                   ClassicStanding.team_id == shifts.c.team_id)
+            .values(total_points=ClassicStanding.total_points + shifts.c.delta)
+        )
+        self.logger.debug("Shifted %s classic standings", result.rowcount)
+
+    async def shift_h2h(self, team_deltas: CTE, season: int) -> None:
+        """Replays the applied matches of the changed team gameweeks with the new scores.
+
+        Must run after the team points moved: the stored points are the new scores, stored - delta the old ones.
+        """
+        first_team, second_team = aliased(TeamGameweek), aliased(TeamGameweek)
+        first_delta, second_delta = team_deltas.alias('first_delta'), team_deltas.alias('second_delta')
+        first_change = func.coalesce(first_delta.c.delta, 0)
+        second_change = func.coalesce(second_delta.c.delta, 0)
+        matches = (
+            select(H2HGameweek.league_id,
+                   first_team.team_id.label('first_id'), second_team.team_id.label('second_id'),
+                   (first_team.points - first_change).label('first_points'),
+                   (second_team.points - second_change).label('second_points'),
+                   first_change.label('first_delta'), second_change.label('second_delta'))
+            .select_from(H2HMatch)
+            .join(H2HGameweek, H2HGameweek.id == H2HMatch.h2h_gameweek_id)
+            .join(first_team, first_team.id == H2HMatch.first_contender_id)
+            .join(second_team, second_team.id == H2HMatch.second_contender_id)
+            .outerjoin(first_delta, first_delta.c.id == H2HMatch.first_contender_id)
+            .outerjoin(second_delta, second_delta.c.id == H2HMatch.second_contender_id)
+            .where(H2HMatch.season == season, H2HGameweek.season == season, H2HGameweek.standings_applied.is_(True),
+                   first_team.season == season, second_team.season == season,
+                   or_(H2HMatch.first_contender_id.in_(select(team_deltas.c.id)),
+                       H2HMatch.second_contender_id.in_(select(team_deltas.c.id))))
+            .cte('changed_matches')
+        )
+
+        def side(own: str, other: str):
+            own_old, other_old = matches.c[f'{own}_points'], matches.c[f'{other}_points']
+            own_delta, other_delta = matches.c[f'{own}_delta'], matches.c[f'{other}_delta']
+            own_new, other_new = own_old + own_delta, other_old + other_delta
+
+            def outcome(compare):
+                return (case((compare(own_new, other_new), 1), else_=0)
+                        - case((compare(own_old, other_old), 1), else_=0))
+
+            return select(matches.c.league_id, matches.c[f'{own}_id'].label('team_id'),
+                          outcome(lambda a, b: a > b).label('wins'), outcome(lambda a, b: a == b).label('draws'),
+                          outcome(lambda a, b: a < b).label('losses'), own_delta.label('points_for'),
+                          other_delta.label('points_against'))
+
+        sides = side('first', 'second').union_all(side('second', 'first')).subquery()
+        shifts = (
+            select(sides.c.league_id, sides.c.team_id,
+                   *(func.sum(sides.c[field]).label(field)
+                     for field in ('wins', 'draws', 'losses', 'points_for', 'points_against')))
+            .group_by(sides.c.league_id, sides.c.team_id)
+            .subquery()
+        )
+        result = await self.session.execute(
+            update(H2HStanding)
+            .where(H2HStanding.season == season, H2HStanding.league_id == shifts.c.league_id,
+                   H2HStanding.team_id == shifts.c.team_id)
+            .values(wins=H2HStanding.wins + shifts.c.wins, draws=H2HStanding.draws + shifts.c.draws,
+                    losses=H2HStanding.losses + shifts.c.losses,
+                    points_for=H2HStanding.points_for + shifts.c.points_for,
+                    points_against=H2HStanding.points_against + shifts.c.points_against,
+                    league_points=H2HStanding.league_points + 3 * shifts.c.wins + shifts.c.draws)
+        )
+        self.logger.debug("Shifted %s H2H standings", result.rowcount)
@@ -1,11 +1,12 @@
 import logging
-from typing import List, Dict
+from typing import List, Dict, Tuple
 from uuid import UUID
 
 from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select, tuple_
 from sqlalchemy.dialects.postgresql import insert
 
-from ..models import TeamGameweek, PlayerGameweek, TeamGameweekPlayer
+from ..models import TeamGameweek, PlayerGameweek, TeamGameweekPlayer, Player, Club
 from .pydantic_model import PlayerModel, ContendersModel
 
 class TeamRepo:
@@ -14,7 +15,7 @@ class TeamRepo:
         self.logger = logging.getLogger(self.__class__.__name__)
 
     async def _upsert_team_players_link(self, team_id_map: Dict[int, UUID], player_id_map: Dict[int, UUID],
-                                        team_models: List[ContendersModel]) -> None:
+                                        team_models: List[ContendersModel], season: int) -> None:
         link_inserts = []
         for team_model in team_models:
             team_db_id = team_id_map.get(team_model.team_id)
@@ -29,33 +30,62 @@ class TeamRepo:
                 link_inserts.append({
                     'team_gameweek_id': team_db_id,
                     'player_gameweek_id': player_db_id,
+                    'season': season,
                     'factor': player_factor
                 })
         if not link_inserts:
             return
         stmt = insert(TeamGameweekPlayer).values(link_inserts)
         stmt = stmt.on_conflict_do_update(
-            index_elements=['team_gameweek_id', 'player_gameweek_id'],
+            index_elements=['team_gameweek_id', 'player_gameweek_id', 'season'],
             set_={'factor': stmt.excluded.factor}
         )
         result = await self.session.execute(stmt)
         self.logger.debug("Inserted %s team-player links", result.rowcount)
 
-    async def _upsert_players(self, player_models: List[PlayerModel]) -> Dict[int, UUID]:
+    async def _upsert_clubs(self, codes: List[str]) -> Dict[str, int]:
+        result = await self.session.execute(select(Club.id, Club.code).where(Club.code.in_(codes)))
+        club_id_map: Dict[str, int] = {row.code: row.id for row in result.fetchall()}
+        missing = [code for code in codes if code not in club_id_map]
+        if missing:
+            stmt = insert(Club).values([{'code': code} for code in missing])
+            stmt = stmt.on_conflict_do_update(index_elements=['code'], set_={'code': stmt.excluded.code})
+            stmt = stmt.returning(Club.id, Club.code)
+            result = await self.session.execute(stmt)
+            club_id_map.update({row.code: row.id for row in result.fetchall()})
+            self.logger.debug("Inserted %s clubs", len(missing))
+        return club_id_map
+
+    async def _upsert_player_identities(self, player_models: List[PlayerModel]) -> None:
+        stmt = insert(Player).values(
+            [{'player_id': player_model.player_id, 'name': player_model.name} for player_model in player_models]
+        )
+        # only touch the row when the name actually changed
+        stmt = stmt.on_conflict_do_update(
+            index_elements=['player_id'],
+            set_={'name': stmt.excluded.name},
+            where=Player.name.is_distinct_from(stmt.excluded.name)
+        )
+        result = await self.session.execute(stmt)
+        self.logger.debug("Inserted or renamed %s players", result.rowcount)
+
+    async def _upsert_players(self, player_models: List[PlayerModel], season: int) -> Dict[int, UUID]:
+        club_id_map = await self._upsert_clubs(sorted({player_model.team for player_model in player_models}))
+        await self._upsert_player_identities(player_models)
         stmt = insert(PlayerGameweek).values(
             [
                 {
-                    'name': player_model.name,
                     'player_id': player_model.player_id,
-                    'team': player_model.team,
+                    'club_id': club_id_map[player_model.team],
                     'points': player_model.points,
+                    'season': season,
                     'gameweek': player_model.gameweek
                 } for player_model in player_models
             ]
         )
         stmt = stmt.on_conflict_do_update(
-            index_elements=['player_id', 'team', 'gameweek'],
-            set_={'points': stmt.excluded.points, 'name': stmt.excluded.name}
+            index_elements=['player_id', 'season', 'gameweek'],
+            set_={'points': stmt.excluded.points, 'club_id': stmt.excluded.club_id}
         )
         stmt = stmt.returning(PlayerGameweek.id, PlayerGameweek.player_id)
         result = await self.session.execute(stmt)
@@ -67,7 +97,22 @@ class TeamRepo:
         }
         return player_id_map
 
-    async def upsert_teams(self, team_models: List[ContendersModel], update_points: bool=True) -> Dict[int, UUID]:
+    async def points_changes(self, team_models: List[ContendersModel], season: int) -> List[Tuple[UUID, int]]:
+        """(id, delta) of the stored team gameweeks whose points upsert_teams is about to overwrite."""
+        scores = {(team_model.team_id, team_model.gameweek): team_model.score for team_model in team_models}
+        if not scores:
+            return []
+        stmt = (
+            select(TeamGameweek.id, TeamGameweek.team_id, TeamGameweek.gameweek, TeamGameweek.points)
+            .where(TeamGameweek.season == season, tuple_(TeamGameweek.team_id, TeamGameweek.gameweek).in_(list(scores)))
+        )
+        result = await self.session.execute(stmt)
+        return [(row_id, scores[(team_id, gameweek)] - points)
+                for row_id, team_id, gameweek, points in result.all()
+                if scores[(team_id, gameweek)] != points]
+
+    async def upsert_teams(self, team_models: List[ContendersModel], season: int,
+                           update_points: bool=True) -> Dict[int, UUID]:
         players_dict: Dict[int, PlayerModel] = {}
         for team_model in team_models:
             # players_list.extend(team_model.composition)
@@ -75,13 +120,14 @@ class TeamRepo:
                 players_dict[player.player_id] = player
                 player.gameweek = team_model.gameweek
 
-        player_id_map = await self._upsert_players(list(players_dict.values()))
+        player_id_map = await self._upsert_players(list(players_dict.values()), season)
         # player_factor_map = {p.player_id: p.factor for p in players_dict.values()}
         stmt = insert(TeamGameweek).values(
             [
                 {
                     'name': team_model.name,
                     'leader': team_model.leader,
+                    'season': season,
                     'gameweek': team_model.gameweek,
                     'points': team_model.score,
                     'team_id': team_model.team_id
@@ -92,7 +138,7 @@ class TeamRepo:
         if update_points:
             update_set['points'] = stmt.excluded.points
         stmt = stmt.on_conflict_do_update(
-            index_elements=['team_id', 'gameweek'],
+            index_elements=['team_id', 'season', 'gameweek'],
             set_=update_set
         )
         stmt = stmt.returning(TeamGameweek.id, TeamGameweek.team_id)
@@ -102,6 +148,6 @@ class TeamRepo:
             row.team_id: row.id
             for row in rows
         }
-        await self._upsert_team_players_link(team_id_map, player_id_map, team_models)
+        await self._upsert_team_players_link(team_id_map, player_id_map, team_models, season)
         self.logger.debug("Upserted %s teams", len(rows))
         return team_id_map
\ No newline at end of file
@@ -0,0 +1,78 @@
+import logging
+from typing import Dict, Iterable, List, Optional
+from uuid import UUID
+
+from sqlalchemy import select, update, or_
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ..models import WebhookSubscription
+
+
+class WebhookSubscriptionRepo:
+    def __init__(self, session: AsyncSession):
+        self.session = session
+        self.logger = logging.getLogger(self.__class__.__name__)
+
+    async def upsert(self, league_type: str, league_id: Optional[int], url: str,
+                     rate_limit_per_minute: Optional[int] = None) -> WebhookSubscription:
+        stmt = insert(WebhookSubscription).values(
+            league_type=league_type, league_id=league_id, url=url, rate_limit_per_minute=rate_limit_per_minute,
+        )
+        # NULL league ids never conflict in the unique constraint, match the "all leagues" row explicitly
+        if league_id is None:
+            existing = await self.session.execute(
+                select(WebhookSubscription).where(WebhookSubscription.league_type == league_type,
+                                                  WebhookSubscription.league_id.is_(None),
+                                                  WebhookSubscription.url == url)
+            )
+            subscription = existing.scalar_one_or_none()
+            if subscription is not None:
+                subscription.rate_limit_per_minute = rate_limit_per_minute
+                subscription.active = True
+                await self.session.flush()
+                return subscription
+        stmt = stmt.on_conflict_do_update(
+            index_elements=["league_type", "league_id", "url"],
+            set_={"rate_limit_per_minute": stmt.excluded.rate_limit_per_minute, "active": True},
+        ).returning(WebhookSubscription)
+        result = await self.session.execute(stmt.execution_options(populate_existing=True))
+        subscription = result.scalar_one()
+        self.logger.info("Upserted webhook subscription id=%s %s:%s -> %s", subscription.id, league_type, league_id,
+                         url)
+        return subscription
+
+    async def get_all(self, league_type: Optional[str] = None, league_id: Optional[int] = None,
+                   include_inactive: bool = False) -> List[WebhookSubscription]:
+        stmt = select(WebhookSubscription).order_by(WebhookSubscription.created)
+        if league_type is not None:
+            stmt = stmt.where(WebhookSubscription.league_type == league_type)
+        if league_id is not None:
+            stmt = stmt.where(WebhookSubscription.league_id == league_id)
+        if not include_inactive:
+            stmt = stmt.where(WebhookSubscription.active.is_(True))
+        result = await self.session.execute(stmt)
+        return list(result.scalars().all())
+
+    async def targets_for(self, league_type: str, league_id: int) -> List[WebhookSubscription]:
+        stmt = select(WebhookSubscription).where(
+            WebhookSubscription.league_type == league_type,
+            WebhookSubscription.active.is_(True),
+            or_(WebhookSubscription.league_id == league_id, WebhookSubscription.league_id.is_(None)),
+        )
+        result = await self.session.execute(stmt)
+        return list(result.scalars().all())
+
+    async def get_many(self, ids: Iterable[UUID]) -> Dict[UUID, WebhookSubscription]:
+        ids = set(ids)
+        if not ids:
+            return {}
+        result = await self.session.execute(select(WebhookSubscription).where(WebhookSubscription.id.in_(ids)))
+        return {subscription.id: subscription for subscription in result.scalars().all()}
+
+    async def deactivate(self, subscription_id: UUID) -> bool:
+        # rows stay so outbox messages that reference them keep their foreign key
+        result = await self.session.execute(
+            update(WebhookSubscription).where(WebhookSubscription.id == subscription_id).values(active=False)
+        )
+        return result.rowcount > 0
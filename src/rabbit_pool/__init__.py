@@ -1,2 +1,3 @@
 from .engine import rabbitmq_manager, RabbitMQSessionManager
 from .events import publish_event, subscribe_to_events, get_rabbit_connection
+from .supervisor import ConsumerSupervisor
@@ -17,8 +17,17 @@ class RabbitMQSessionManager:
             self._connection = None
 
     async def reopen(self):
-        if self._connection is None:
-            self._connection = await aio_pika.connect_robust(self._url)
+        # a connection that gave up reconnecting is replaced instead of reused
+        if self._connection is not None:
+            try:
+                await self._connection.close()
+            except Exception:
+                pass
+            self._connection = None
+        await self.connect()
+
+    def is_connected(self) -> bool:
+        return self._connection is not None and not self._connection.is_closed
 
     def get_connection(self) -> AbstractRobustConnection:
         if self._connection is None:
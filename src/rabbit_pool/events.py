@@ -2,6 +2,7 @@ import json
 import logging
 import aio_pika
 import traceback
+from datetime import datetime, timezone
 from .engine import rabbitmq_manager
 
 logger = logging.getLogger("rabbit_module")
@@ -9,32 +10,60 @@ logger = logging.getLogger("rabbit_module")
 async def get_rabbit_connection() -> aio_pika.abc.AbstractRobustConnection:
     return rabbitmq_manager.get_connection()
 
+class _Payload:
+    """A message body for the log, decoded only when a handler renders the record."""
+    __slots__ = ("body",)
+
+    def __init__(self, body: bytes):
+        self.body = body
+
+    def __str__(self) -> str:
+        return self.body.decode("utf-8", "replace")
+
+def decode_message(queue_name: str, body: bytes, raw_headers, message_id: str = None,
+                   timestamp: datetime = None, redelivered: bool = False) -> dict:
+    data = json.loads(body)
+    headers = dict(raw_headers) if raw_headers else {}
+    logger.info("Received message from %s: %s bytes, headers: %s", queue_name, len(body), headers)
+    # the immutable body, the listener thread decodes and truncates it
+    logger.debug("Message payload from %s: %s", queue_name, _Payload(body))
+    # id and timestamp are repeated on a redelivery, the consumer derives the message's idempotency key from them
+    return {"payload": data, "headers": headers, "message_id": message_id,
+            "timestamp": timestamp.isoformat() if timestamp is not None else None, "redelivered": redelivered}
+
+async def declare_topology(channel: aio_pika.abc.AbstractChannel, queue_name: str) -> aio_pika.abc.AbstractQueue:
+    return await channel.declare_queue(queue_name, durable=True)
+
+async def process_message(queue_name: str, message: aio_pika.abc.AbstractIncomingMessage, callback):
+    try:
+        async with message.process():
+            await callback(decode_message(queue_name, message.body, message.headers, message.message_id,
+                                          message.timestamp, bool(message.redelivered)))
+    except Exception as e:
+        tb = traceback.format_exc()
+        logger.error("Error processing message: %s\n%s", e, tb)
+
 async def subscribe_to_events(queue_name: str, callback):
     connection = await get_rabbit_connection()
     channel = await connection.channel()
-    queue = await channel.declare_queue(queue_name, durable=True)
+    queue = await declare_topology(channel, queue_name)
     async with queue.iterator() as queue_iter:
         async for message in queue_iter:
-            try:
-                async with message.process():
-                    data = json.loads(message.body)
-                    headers = dict(message.headers) if message.headers else {}
-                    logger.info("Received message from %s: %s, headers: %s", queue_name, data, headers)
-                    await callback({"payload": data, "headers": headers})
-            except Exception as e:
-                tb = traceback.format_exc()
-                logger.error("Error processing message: %s\n%s", e, tb)
+            await process_message(queue_name, message, callback)
 
 async def publish_event(queue_name: str, event: dict, headers: dict = None):
     connection = await get_rabbit_connection()
     channel = await connection.channel()
-    await channel.declare_queue(queue_name, durable=True)
+    await declare_topology(channel, queue_name)
+    body = json.dumps(event).encode()
     message = aio_pika.Message(
-        body=json.dumps(event).encode(),
-        headers=headers or {}
+        body=body,
+        headers=headers or {},
+        # lets the consumer report how far behind it is
+        timestamp=datetime.now(timezone.utc)
     )
     await channel.default_exchange.publish(
         message,
         routing_key=queue_name,
     )
-    logger.info("Published event to %s: %s, headers: %s", queue_name, event, headers)
+    logger.info("Published event to %s: %s, headers: %s", queue_name, _Payload(body), headers)
@@ -0,0 +1,193 @@
+import asyncio
+import logging
+import random
+import time
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+
+import aio_pika
+
+from .engine import RabbitMQSessionManager
+from .events import declare_topology, process_message
+from ..drain import Drain
+from ..metrics import metrics
+
+logger = logging.getLogger("rabbit_supervisor")
+
+
+class ConsumerSupervisor:
+    """Keeps the queue consumer running and reports whether it keeps up.
+
+    A consumer that fails or is cancelled by the broker is restarted on a fresh connection with the topology
+    declared again, after a delay that doubles per failed attempt. A monitor re-declares the queue to read its
+    depth, and the consumer records how old each message was when it finished, from the publish timestamp.
+    Draining stops the deliveries but lets the message being handled commit and ack first.
+    """
+
+    def __init__(self, manager: RabbitMQSessionManager, queue_name: str, callback, base_backoff: float = 1,
+                 max_backoff: float = 60, monitor_interval: float = 10, max_queue_depth: int = 1000,
+                 max_lag: float = 300, prefetch: int = 10):
+        self.manager = manager
+        self.queue_name = queue_name
+        self.callback = callback
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self.monitor_interval = monitor_interval
+        self.max_queue_depth = max_queue_depth
+        self.max_lag = max_lag
+        self.prefetch = prefetch
+        self.state = "stopped"
+        self.restarts = 0
+        self.last_error: Optional[str] = None
+        self.queue_depth: Optional[int] = None
+        self.consumers: Optional[int] = None
+        self.lag: Optional[float] = None
+        self._consuming_since: Optional[float] = None
+        self._last_message_at: Optional[float] = None
+        self._queue: Optional[aio_pika.abc.AbstractQueue] = None
+        self._handling = False
+        self._draining = False
+        self._task: Optional[asyncio.Task] = None
+        self._monitor: Optional[asyncio.Task] = None
+
+    def _set_state(self, state: str) -> None:
+        self.state = state
+        metrics.set("rabbit_consumer_up", 1 if state == "consuming" else 0, queue=self.queue_name)
+
+    def _processed(self, message: aio_pika.abc.AbstractIncomingMessage) -> None:
+        self._last_message_at = time.monotonic()
+        metrics.inc("rabbit_messages_total", queue=self.queue_name)
+        if message.timestamp is not None:
+            sent = message.timestamp if message.timestamp.tzinfo else message.timestamp.replace(tzinfo=timezone.utc)
+            self.lag = max((datetime.now(timezone.utc) - sent).total_seconds(), 0.)
+            metrics.set("rabbit_consumer_lag_seconds", self.lag, queue=self.queue_name)
+
+    async def _consume(self) -> None:
+        await self.manager.reopen()
+        channel = await self.manager.get_connection().channel()
+        # bounds what a draining or failed worker holds back from the others
+        await channel.set_qos(prefetch_count=self.prefetch)
+        self._queue = await declare_topology(channel, self.queue_name)
+        self._set_state("consuming")
+        self._consuming_since = time.monotonic()
+        logger.info("Consuming %s", self.queue_name)
+        async with self._queue.iterator() as queue_iter:
+            async for message in queue_iter:
+                self._handling = True
+                try:
+                    await process_message(self.queue_name, message, self.callback)
+                finally:
+                    self._handling = False
+                self._processed(message)
+                if self._draining:
+                    # leaving the iterator cancels the consumer and requeues the prefetched messages
+                    return
+        raise ConnectionError(f"Consumer of {self.queue_name} was cancelled by the broker")
+
+    async def run(self) -> None:
+        delay = self.base_backoff
+        while not self._draining:
+            self._set_state("connecting")
+            try:
+                await self._consume()
+            except Exception as e:
+                self.last_error = f"{e.__class__.__name__}: {e}"
+                logger.warning("Consumer of %s stopped: %s", self.queue_name, self.last_error)
+            if self._draining:
+                break
+            if self.state == "consuming":
+                delay = self.base_backoff
+            self._queue = None
+            self._set_state("restarting")
+            self.restarts += 1
+            metrics.inc("rabbit_consumer_restarts_total", queue=self.queue_name)
+            # jitter keeps the workers from reconnecting all at once after a broker restart
+            await asyncio.sleep(delay * random.uniform(0.5, 1.))
+            delay = min(delay * 2, self.max_backoff)
+
+    async def _check_queue(self) -> None:
+        if self._queue is None or not self.manager.is_connected():
+            self.queue_depth = self.consumers = None
+            return
+        declared = await self._queue.declare(timeout=self.monitor_interval)
+        self.queue_depth, self.consumers = declared.message_count, declared.consumer_count
+        if not self.queue_depth:
+            # an idle consumer is not behind, whatever the age of the last message was
+            self.lag = 0.
+            metrics.set("rabbit_consumer_lag_seconds", 0, queue=self.queue_name)
+        metrics.set("rabbit_queue_depth", self.queue_depth, queue=self.queue_name)
+        metrics.set("rabbit_queue_consumers", self.consumers, queue=self.queue_name)
+
+    async def monitor(self) -> None:
+        while True:
+            try:
+                await self._check_queue()
+            except Exception as e:
+                self.queue_depth = self.consumers = None
+                logger.warning("Checking queue %s failed: %s", self.queue_name, e)
+            await asyncio.sleep(self.monitor_interval)
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self.run())
+            self._monitor = asyncio.create_task(self.monitor())
+
+    def stop_consuming(self) -> None:
+        if self._draining:
+            return
+        self._draining = True
+        self._set_state("draining")
+        if self._task is not None and not self._handling:
+            # waiting for a delivery or a reconnect, there is nothing to finish
+            self._task.cancel()
+
+    async def drain(self, drain: Drain) -> bool:
+        """Stops consuming and waits for the message in hand until the deadline. False when it was abandoned."""
+        self.stop_consuming()
+        finished = await drain.finish(self._task, "message")
+        self._task = None
+        await self.stop()
+        return finished
+
+    async def stop(self) -> None:
+        for task in (self._task, self._monitor):
+            if task is not None:
+                task.cancel()
+        await asyncio.gather(*(t for t in (self._task, self._monitor) if t is not None), return_exceptions=True)
+        self._task = self._monitor = None
+        self._set_state("stopped")
+        await self.manager.close()
+
+    def alive(self) -> bool:
+        # the supervisor only ends when stopped, anything else is a bug a process restart should clear
+        return self._task is not None and not self._task.done()
+
+    def problems(self) -> List[str]:
+        problems = []
+        if self._draining:
+            problems.append("draining")
+        elif self.state != "consuming":
+            problems.append(f"consumer is {self.state}")
+        elif not self.manager.is_connected():
+            problems.append("broker connection is down, reconnecting")
+        if self.queue_depth is not None and self.queue_depth > self.max_queue_depth:
+            problems.append(f"{self.queue_depth} messages queued, limit {self.max_queue_depth}")
+        if self.lag is not None and self.lag > self.max_lag:
+            problems.append(f"consumer lags {self.lag:.0f}s behind, limit {self.max_lag:g}s")
+        if self.queue_depth and self._consuming_since is not None:
+            # messages wait but none finished lately - a handler hangs or the consumer lost its channel
+            idle = time.monotonic() - max(self._last_message_at or 0., self._consuming_since)
+            if idle > self.max_lag:
+                problems.append(f"no message processed for {idle:.0f}s with {self.queue_depth} queued")
+        return problems
+
+    def status(self) -> Dict:
+        return {
+            "queue": self.queue_name,
+            "state": self.state,
+            "restarts": self.restarts,
+            "last_error": self.last_error,
+            "queue_depth": self.queue_depth,
+            "consumers": self.consumers,
+            "lag_seconds": round(self.lag, 3) if self.lag is not None else None,
+        }
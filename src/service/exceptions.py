@@ -5,4 +5,12 @@ class DatabaseException(RSSServiceException):
     pass
 
 class ExternalAPIException(RSSServiceException):
-    pass
\ No newline at end of file
+    pass
+
+class ExportBusyException(RSSServiceException):
+    pass
+
+class DeliveryDeferredException(RSSServiceException):
+    def __init__(self, message: str, retry_in: float):
+        super().__init__(message)
+        self.retry_in = retry_in
@@ -0,0 +1,77 @@
+import csv
+import io
+import json
+import logging
+from contextlib import AsyncExitStack
+from typing import AsyncIterator, List, Optional, Sequence
+
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.ext.asyncio import AsyncResult
+
+from . import RSSServiceException, ExportBusyException
+from ..postgre import ExportRepo, export_sessionmanager
+
+EXPORT_FORMATS = {"ndjson": "application/x-ndjson", "csv": "text/csv"}
+
+logger = logging.getLogger("export")
+
+
+class ExportStream:
+    """Encoded chunks of one export; owns the export session until exhausted or closed."""
+
+    def __init__(self, stack: AsyncExitStack, result: AsyncResult, export_format: str):
+        self._stack = stack
+        self._result = result
+        self._format = export_format
+        self._columns = list(result.keys())
+        self.rows = 0
+
+    def _encode(self, rows: Sequence, header: bool) -> bytes:
+        if self._format == "ndjson":
+            return "".join(
+                json.dumps(dict(zip(self._columns, row)), ensure_ascii=False) + "\n" for row in rows
+            ).encode()
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        if header:
+            writer.writerow(self._columns)
+        writer.writerows(rows)
+        return buffer.getvalue().encode()
+
+    async def __aiter__(self) -> AsyncIterator[bytes]:
+        try:
+            header = True
+            # one partition is one yield_per batch of the server-side cursor, memory stays bounded by it
+            async for rows in self._result.partitions():
+                self.rows += len(rows)
+                yield self._encode(rows, header)
+                header = False
+            if header and self._format == "csv":
+                yield self._encode([], header)
+            logger.info("Export finished rows=%s", self.rows)
+        finally:
+            await self.aclose()
+
+    async def aclose(self) -> None:
+        await self._stack.aclose()
+
+
+async def open_export(league_type: str, export_format: str = "ndjson", league_ids: Optional[List[int]] = None,
+                      from_gameweek: Optional[int] = None, to_gameweek: Optional[int] = None,
+                      yield_per: int = 2000, season: Optional[int] = None) -> ExportStream:
+    if league_type not in ("h2h", "classic"):
+        raise RSSServiceException(f"Unknown league type {league_type}")
+    if export_format not in EXPORT_FORMATS:
+        raise RSSServiceException(f"Unknown export format {export_format}")
+    stack = AsyncExitStack()
+    try:
+        session = await stack.enter_async_context(export_sessionmanager.session())
+        result = await ExportRepo(session).stream_gameweek_rows(league_type, league_ids, from_gameweek,
+                                                                to_gameweek, yield_per, season)
+    except PoolTimeoutError as e:
+        await stack.aclose()
+        raise ExportBusyException("All export connections are busy, retry later") from e
+    except BaseException:
+        await stack.aclose()
+        raise
+    return ExportStream(stack, result, export_format)
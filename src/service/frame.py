@@ -0,0 +1,160 @@
+import sys
+from array import array
+from heapq import nlargest
+from typing import Dict, List, Optional, Set
+
+from ..postgre import TeamGameweek, H2HGameweek, ClassicGameweek
+
+
+class GameweekFrame:
+    """One gameweek as flat columns, built with a single walk over the loaded ORM graph.
+
+    Teams and players are numbered in first-seen order, so rankings break ties the same way the generators
+    did when they walked the objects. Links are stored team by team: team t owns link rows
+    link_offsets[t]:link_offsets[t + 1]. Names live once per player in interned tables.
+
+    League-wide player statistics cover the first stats_links link rows and stats_players players: every team
+    in classic, only the teams playing a match in H2H (a team without an opponent was never counted).
+    """
+
+    def __init__(self):
+        self.team_ids = array("q")
+        self.team_names: List[str] = []
+        self.team_leaders: List[Optional[str]] = []
+        self.team_points = array("q")
+        self.link_offsets = array("q", [0])
+        self.link_player = array("q")
+        self.link_factor = array("q")
+        self.player_ids = array("q")
+        self.player_points = array("q")
+        self.player_names: List[str] = []
+        self.player_clubs: List[str] = []
+        self.match_first = array("q")
+        self.match_second = array("q")
+        self.contender_team = array("q")
+        self.contender_points = array("q")
+        self.stats_links = 0
+        self.stats_players = 0
+        self._team_index: Dict[int, int] = {}
+        self._player_index: Dict[int, int] = {}
+
+    @classmethod
+    def from_classic(cls, gw: ClassicGameweek) -> "GameweekFrame":
+        frame = cls()
+        for team in gw.contenders:
+            frame._add_team(team)
+        frame.stats_links, frame.stats_players = len(frame.link_player), frame.players
+        return frame
+
+    @classmethod
+    def from_h2h(cls, gw: H2HGameweek) -> "GameweekFrame":
+        frame = cls()
+        for match in gw.matches:
+            frame.match_first.append(frame._add_team(match.first_contender))
+            frame.match_second.append(frame._add_team(match.second_contender))
+        frame.stats_links, frame.stats_players = len(frame.link_player), frame.players
+        for contender in gw.contenders:
+            frame.contender_team.append(frame._add_team(contender.team))
+            frame.contender_points.append(contender.points)
+        return frame
+
+    def _add_team(self, team: TeamGameweek) -> int:
+        # keyed by identity: the session maps a row to one object, transient graphs have no ids yet
+        index = self._team_index.get(id(team))
+        if index is not None:
+            return index
+        index = self._team_index[id(team)] = len(self.team_names)
+        self.team_ids.append(team.team_id)
+        self.team_names.append(team.name)
+        self.team_leaders.append(team.leader)
+        self.team_points.append(team.points)
+        for link in team.composition_links:
+            player = link.player_gameweek
+            player_index = self._player_index.get(player.player_id)
+            if player_index is None:
+                player_index = self._player_index[player.player_id] = len(self.player_ids)
+                self.player_ids.append(player.player_id)
+                self.player_points.append(player.points)
+                self.player_names.append(sys.intern(player.name))
+                self.player_clubs.append(sys.intern(player.team))
+            self.link_player.append(player_index)
+            self.link_factor.append(link.factor)
+        self.link_offsets.append(len(self.link_player))
+        return index
+
+    @property
+    def teams(self) -> int:
+        return len(self.team_names)
+
+    @property
+    def players(self) -> int:
+        return len(self.player_ids)
+
+    @property
+    def matches(self) -> int:
+        return len(self.match_first)
+
+    def team_links(self, team: int) -> range:
+        return range(self.link_offsets[team], self.link_offsets[team + 1])
+
+    def team_players(self, team: int) -> array:
+        return self.link_player[self.link_offsets[team]:self.link_offsets[team + 1]]
+
+    def link_score(self, link: int) -> int:
+        return self.link_factor[link] * self.player_points[self.link_player[link]]
+
+    def ownership(self) -> List[int]:
+        counts = [0] * self.stats_players
+        for player in self.link_player[:self.stats_links]:
+            counts[player] += 1
+        return counts
+
+    def ownership_percent(self, counts: List[int], player: int) -> int:
+        # share of the distinct players picked in the league, as the feeds always printed it
+        return int(counts[player] / self.stats_players * 100)
+
+    def captains(self) -> Set[int]:
+        links = slice(self.stats_links)
+        return {player for player, factor in zip(self.link_player[links], self.link_factor[links]) if factor == 2}
+
+    def team_captain(self, team: int) -> Optional[int]:
+        return next((self.link_player[link] for link in self.team_links(team) if self.link_factor[link] == 2), None)
+
+    def ranked_links(self, team: int, n: Optional[int] = None) -> List[int]:
+        links = self.team_links(team)
+        if n is None:
+            return sorted(links, key=self.link_score, reverse=True)
+        return nlargest(n, links, key=self.link_score)
+
+    def ranked_teams(self) -> List[int]:
+        return sorted(range(self.teams), key=self.team_points.__getitem__, reverse=True)
+
+    def top_performance(self, n: int) -> List[int]:
+        return nlargest(n, range(self.stats_players), key=self.player_points.__getitem__)
+
+    def top_ownership(self, n: int, counts: List[int]) -> List[int]:
+        return nlargest(n, range(self.stats_players), key=counts.__getitem__)
+
+    def top_captains(self, n: int, captains: Set[int]) -> List[int]:
+        # players nobody captained sink to the bottom but keep their place, the feeds number by this ranking
+        return nlargest(n, range(self.stats_players),
+                        key=lambda player: self.player_points[player] if player in captains else -999)
+
+    def similarity(self, first: int, second: int) -> float:
+        first_players, second_players = self.team_players(first), self.team_players(second)
+        total = max(len(first_players), len(second_players))
+        if total == 0:
+            return 0.
+        return len(set(first_players).intersection(second_players)) / total
+
+    def match_margin(self, match: int) -> int:
+        return abs(self.team_points[self.match_first[match]] - self.team_points[self.match_second[match]])
+
+    def match_total(self, match: int) -> int:
+        return self.team_points[self.match_first[match]] + self.team_points[self.match_second[match]]
+
+    def top_matches(self, n: int, key) -> List[int]:
+        return nlargest(n, range(self.matches), key=key)
+
+    def ranked_contenders(self) -> List[int]:
+        return sorted(range(len(self.contender_team)), key=self.contender_points.__getitem__, reverse=True)
@@ -1,141 +1,90 @@
-from . import DatabaseException
-from ..postgre import H2HGameweekRepo, ClassicGameweekRepo, H2HGameweek, ClassicGameweek, PlayerGameweek, H2HMatch
-from .models import ClassicGameweekModel, H2HGameweekModel, PairResultModel, ContendersModel
-
-from typing import Dict, List
-
-
-
-async def form_matches_info(gw: H2HGameweek) -> str:
-    results: List[PairResultModel] = []
-    for match in gw.matches:
-        intersect_amount = 0
-        for p1 in match.first_contender.composition:
-            for p2 in match.second_contender.composition:
-                if p1.player_id == p2.player_id:
-                    intersect_amount += 1
-        total_players = max(len(match.first_contender.composition), len(match.second_contender.composition))
-        similarity = intersect_amount / total_players if total_players > 0 else 0.
-
-        first_top = [p.player_gameweek for p in sorted(
-            match.first_contender.composition_links, key=lambda x: x.factor * x.player_gameweek.points,
-            reverse=True
-        )[:3]]
-        second_top = [p.player_gameweek for p in sorted(
-            match.second_contender.composition_links, key=lambda x: x.factor * x.player_gameweek.points,
-            reverse=True
-        )[:3]]
-
-        first_captain = next((p.player_gameweek for p in match.first_contender.composition_links if p.factor == 2),
-                             None)
-        second_captain = next(
-            (p.player_gameweek for p in match.second_contender.composition_links if p.factor == 2), None)
-
-        validated = PairResultModel.model_validate({
-            "first_name": match.first_contender.name,
-            "first_leader": match.first_contender.leader,
-            "first_score": match.first_contender.points,
-            "first_captain": first_captain,
-            "first_top": first_top,
-
-            "second_name": match.second_contender.name,
-            "second_leader": match.second_contender.leader,
-            "second_score": match.second_contender.points,
-            "second_top": second_top,
-            "second_captain": second_captain,
-
-            "similarity": similarity * 100,
-        })
-        results.append(validated)
+from ..postgre import H2HStanding
+from .frame import GameweekFrame
+
+from typing import List, Optional
+
+
+
+def _player(frame: GameweekFrame, player: int, points: int) -> str:
+    return f"{frame.player_names[player]} {frame.player_clubs[player]} ({points})"
 
-    result_text = ""
-    for res in results:
-        result_text += f"{res.first_name} ({res.first_leader}) {res.first_score}:{res.second_score} {res.second_name} ({res.second_leader})\n"
-        result_text += f"Similarity: {int(res.similarity)}%\n"
-        if res.first_captain and res.second_captain:
-            result_text += f"Captains: {res.first_captain.name} {res.first_captain.team} {res.first_captain.points * 2}:{res.second_captain.points * 2} {res.second_captain.name} {res.second_captain.team}\n"
-        result_text += f"{res.first_name}: "
-        result_text += ", ".join(
-            [
-                f"{p.name} {p.team} ({p.points})"
-                if p.player_id != (res.first_captain.player_id if res.first_captain else -1)
-                else f"{p.name} {p.team} ({p.points*2})"
-                for p in res.first_top
-            ]
-        )
-        result_text += f"\n{res.second_name}: "
-        result_text += ", ".join(
-            [
-                f"{p.name} {p.team} ({p.points})"
-                if p.player_id != (res.second_captain.player_id if res.second_captain else -1)
-                else f"{p.name} {p.team} ({p.points*2})"
-                for p in res.second_top
-            ]
-        )
-        result_text += "\n\n"
-    return result_text.strip()
 
+def _team_top(frame: GameweekFrame, team: int, captain: Optional[int]) -> str:
+    players = [frame.link_player[link] for link in frame.ranked_links(team, 3)]
+    return ", ".join(_player(frame, p, frame.player_points[p] * 2 if p == captain else frame.player_points[p])
+                     for p in players)
 
-async def form_top_info(gw: H2HGameweek) -> List[str]:
-    all_players: List[PlayerGameweek] = []
-    captains_list: List[int] = []
-    own_percent = {}
 
-    def add_player(_player: PlayerGameweek):
-        if _player.player_id not in own_percent:
-            all_players.append(_player)
-        if p1.factor == 2:
-            captains_list.append(_player.player_id)
-        own_percent[_player.player_id] = own_percent.get(_player.player_id, 0) + 1
+async def form_matches_info(frame: GameweekFrame) -> str:
+    result_text = ""
+    for match in range(frame.matches):
+        first, second = frame.match_first[match], frame.match_second[match]
+        first_name, second_name = frame.team_names[first], frame.team_names[second]
+        first_captain, second_captain = frame.team_captain(first), frame.team_captain(second)
+        result_text += (f"{first_name} ({frame.team_leaders[first]}) {frame.team_points[first]}:"
+                        f"{frame.team_points[second]} {second_name} ({frame.team_leaders[second]})\n")
+        result_text += f"Similarity: {int(frame.similarity(first, second) * 100)}%\n"
+        if first_captain is not None and second_captain is not None:
+            result_text += (f"Captains: {frame.player_names[first_captain]} {frame.player_clubs[first_captain]} "
+                            f"{frame.player_points[first_captain] * 2}:{frame.player_points[second_captain] * 2} "
+                            f"{frame.player_names[second_captain]} {frame.player_clubs[second_captain]}\n")
+        result_text += f"{first_name}: {_team_top(frame, first, first_captain)}"
+        result_text += f"\n{second_name}: {_team_top(frame, second, second_captain)}"
+        result_text += "\n\n"
+    return result_text.strip()
 
-    for match in gw.matches:
-        for p1 in match.first_contender.composition_links:
-            add_player(p1.player_gameweek)
-        for p2 in match.second_contender.composition_links:
-            add_player(p2.player_gameweek)
 
-    players_amount = len(own_percent.keys())
+async def form_top_info(frame: GameweekFrame) -> List[str]:
+    counts = frame.ownership()
+    captains = frame.captains()
 
-    top_5_performance = sorted(all_players, key=lambda x: x.points, reverse=True)[:5]
-    top_5_ownership = sorted(all_players, key=lambda x: own_percent[x.player_id], reverse=True)[:5]
-    top_5_captains = sorted(all_players, key=lambda x: x.points if x.player_id in captains_list else -999,
-                            reverse=True)[:5]
+    def line(index: int, player: int) -> str:
+        return (f"{index + 1}. {_player(frame, player, frame.player_points[player])} - "
+                f"{frame.ownership_percent(counts, player)}%\n")
 
     top_perf_text = f"TOP PRF (performance)\n"
-    for index, player in enumerate(top_5_performance):
-        top_perf_text += f"{index + 1}. {player.name} {player.team} ({player.points}) - {int(own_percent[player.player_id] / players_amount * 100)}%\n"
+    for index, player in enumerate(frame.top_performance(5)):
+        top_perf_text += line(index, player)
 
     top_own_text = f"TOP OWN (ownership)\n"
-    for index, player in enumerate(top_5_ownership):
-        top_own_text += f"{index + 1}. {player.name} {player.team} ({player.points}) - {int(own_percent[player.player_id] / players_amount * 100)}%\n"
+    for index, player in enumerate(frame.top_ownership(5, counts)):
+        top_own_text += line(index, player)
 
     top_capt_text = f"TOP CPT (captains)\n"
-    for index, player in enumerate(top_5_captains):
-        if player.player_id in captains_list:
-            top_capt_text += f"{index + 1}. {player.name} {player.team} ({player.points}) - {int(own_percent[player.player_id] / players_amount * 100)}%\n"
+    for index, player in enumerate(frame.top_captains(5, captains)):
+        if player in captains:
+            top_capt_text += line(index, player)
     return [top_perf_text.strip(), top_own_text.strip(), top_capt_text.strip()]
 
 
-async def form_top_diff(gw: H2HGameweek) -> str:
-    top_match_diff: List[H2HMatch] = [match for match in sorted(gw.matches, key=lambda x: abs(x.first_contender.points - x.second_contender.points), reverse=True)[:3]]
+def _match_line(frame: GameweekFrame, match: int, value: int) -> str:
+    first, second = frame.match_first[match], frame.match_second[match]
+    return (f"{value}: {frame.team_names[first]} {frame.team_points[first]}:{frame.team_points[second]} "
+            f"{frame.team_names[second]}\n")
+
 
+async def form_top_diff(frame: GameweekFrame) -> str:
     result_text = "TOP WIN\n"
-    for match in top_match_diff:
-        diff = abs(match.first_contender.points - match.second_contender.points)
-        result_text += f"{diff}: {match.first_contender.name} {match.first_contender.points}:{match.second_contender.points} {match.second_contender.name}\n"
+    for match in frame.top_matches(3, frame.match_margin):
+        result_text += _match_line(frame, match, frame.match_margin(match))
     return result_text.strip()
 
-async def form_top_pts(gw: H2HGameweek) -> str:
-    top_match_pts: List[H2HMatch] = [match for match in sorted(gw.matches, key=lambda x: x.first_contender.points + x.second_contender.points, reverse=True)[:3]]
-
+async def form_top_pts(frame: GameweekFrame) -> str:
     result_text = "TOP PTS\n"
-    for match in top_match_pts:
-        total = match.first_contender.points + match.second_contender.points
-        result_text += f"{total}: {match.first_contender.name} {match.first_contender.points}:{match.second_contender.points} {match.second_contender.name}\n"
+    for match in frame.top_matches(3, frame.match_total):
+        result_text += _match_line(frame, match, frame.match_total(match))
     return result_text.strip()
 
-async def form_leaderboard(gw: H2HGameweek) -> str:
+async def form_leaderboard(frame: GameweekFrame) -> str:
     result_text = "LEADERBOARD\n"
-    for index, contender in enumerate(sorted(gw.contenders, key=lambda x: x.points, reverse=True)):
-        result_text += f"{index + 1}. {contender.team.name} ({contender.team.leader}) {contender.points} pts\n"
+    for index, contender in enumerate(frame.ranked_contenders()):
+        team = frame.contender_team[contender]
+        result_text += (f"{index + 1}. {frame.team_names[team]} ({frame.team_leaders[team]}) "
+                        f"{frame.contender_points[contender]} pts\n")
+    return result_text.strip()
+
+async def form_standings(standings: List[H2HStanding]) -> str:
+    result_text = "STANDINGS (W-D-L, PF:PA)\n"
+    for index, row in enumerate(standings):
+        result_text += f"{index + 1}. {row.name} ({row.leader}) {row.wins}-{row.draws}-{row.losses}, {row.points_for}:{row.points_against} - {row.league_points} pts\n"
     return result_text.strip()
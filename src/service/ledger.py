@@ -0,0 +1,110 @@
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Optional
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from .models import stable_hash
+from .. import env
+from ..metrics import metrics
+from ..postgre import ProcessedMessageRepo, sessionmanager
+
+
+def message_key(message: Dict) -> str:
+    """Idempotency key of a consumed message: the producer's id when it sent one, a digest of the message otherwise."""
+    headers = message.get("headers") or {}
+    # the outbox relay sets idempotency_key on the events it publishes
+    explicit = headers.get("idempotency_key") or headers.get("message_id") or message.get("message_id")
+    if explicit:
+        return f"id:{explicit}"
+    # a redelivery repeats the body and the publish timestamp, a deliberate re-send of the same body gets a new one
+    return "sha256:" + stable_hash([headers.get("type"), message.get("payload"), message.get("timestamp")])
+
+
+def is_checked(message: Dict, key: str) -> bool:
+    """Whether the message's key may reject it.
+
+    A digest without a timestamp is the same for a deliberate re-send of an older snapshot (A, B, then A again)
+    and for a redelivery, only the broker's redelivered flag tells them apart then.
+    """
+    if key.startswith("id:") or message.get("timestamp"):
+        return True
+    return bool(message.get("redelivered"))
+
+
+class MessageLedger:
+    """Keys of consumed messages, so a redelivered message is skipped before it reaches RSSService.
+
+    Keys this worker committed are remembered in a bounded LRU and skipped without a query. The table catches
+    the rest: redeliveries to another worker or after a restart, and duplicates consumed concurrently, which
+    wait for the first one's transaction and then find its key. Messages whose key cannot tell a re-send from a
+    redelivery are only recorded, see is_checked.
+    """
+
+    def __init__(self, max_entries: int = 100000, ttl: float = 86400, purge_interval: float = 600):
+        self._max_entries = max_entries
+        self._ttl = ttl
+        self._purge_interval = purge_interval
+        self._keys: "OrderedDict[str, float]" = OrderedDict()
+        self._last_purge: Optional[float] = None
+        self._purge_task: Optional[asyncio.Task] = None
+        self.logger = logging.getLogger(self.__class__.__name__)
+
+    def seen(self, key: str) -> bool:
+        remembered = self._keys.get(key)
+        if remembered is None:
+            return False
+        if time.monotonic() - remembered > self._ttl:
+            del self._keys[key]
+            return False
+        self._keys.move_to_end(key)
+        self.logger.info("Skipping message %s, this worker already processed it", key)
+        return True
+
+    def remember(self, key: str) -> None:
+        """Called once the message's transaction committed, a rolled back key must stay claimable."""
+        self._keys[key] = time.monotonic()
+        self._keys.move_to_end(key)
+        while len(self._keys) > self._max_entries:
+            self._keys.popitem(last=False)
+
+    async def claim(self, session: AsyncSession, key: str, message_type: Optional[str] = None) -> bool:
+        """Records the key in the session's transaction, False when the message was already processed."""
+        self._schedule_purge()
+        if await ProcessedMessageRepo(session).claim(key, message_type):
+            return True
+        self.logger.info("Skipping message %s, it was already processed", key)
+        return False
+
+    async def record(self, session: AsyncSession, key: str, message_type: Optional[str] = None) -> None:
+        """Records the key of a message that is processed either way, for a redelivery of it to find."""
+        self._schedule_purge()
+        await ProcessedMessageRepo(session).record(key, message_type)
+
+    def _schedule_purge(self) -> None:
+        # its own transaction in the background, a message that rolls back must not take the purge with it
+        if self._purge_task is not None and not self._purge_task.done():
+            return
+        if self._last_purge is not None and time.monotonic() - self._last_purge <= self._purge_interval:
+            return
+        self._purge_task = asyncio.create_task(self._purge())
+
+    async def _purge(self) -> None:
+        try:
+            async with sessionmanager.session() as session:
+                await ProcessedMessageRepo(session).purge(datetime.now(timezone.utc) - timedelta(seconds=self._ttl))
+                await session.commit()
+        except Exception:
+            # retried with the next message
+            self.logger.exception("Purging processed message keys failed")
+            return
+        self._last_purge = time.monotonic()
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+
+message_ledger = MessageLedger(env.ledger.max_entries, env.ledger.ttl, env.ledger.purge_interval)
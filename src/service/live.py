@@ -0,0 +1,218 @@
+import asyncio
+import json
+import logging
+from contextlib import contextmanager
+from typing import Dict, Iterator, Optional, Set, Tuple
+
+from .. import env
+from ..metrics import metrics
+from .report_cache import load_redis
+
+LeagueKey = Tuple[str, int]
+
+
+class LiveUpdate:
+    """One update for a league, serialized once however many subscribers receive it."""
+    __slots__ = ("league_type", "league_id", "data", "_frame")
+
+    def __init__(self, league_type: str, league_id: int, data: str):
+        self.league_type = league_type
+        self.league_id = league_id
+        self.data = data
+        self._frame: Optional[bytes] = None
+
+    @property
+    def key(self) -> LeagueKey:
+        return self.league_type, self.league_id
+
+    @property
+    def frame(self) -> bytes:
+        if self._frame is None:
+            self._frame = f"event: update\ndata: {self.data}\n\n".encode()
+        return self._frame
+
+    @classmethod
+    def snapshot(cls, league_type: str, payload: Dict) -> "LiveUpdate":
+        teams = sorted(({"team_id": c["team_id"], "name": c["name"], "points": c["score"]}
+                        for c in payload["contenders"]), key=lambda team: team["points"], reverse=True)
+        data = {"type": league_type, "league_id": int(payload["league_id"]), "gameweek": payload["gameweek"],
+                "reason": "snapshot", "teams": teams}
+        if league_type == "h2h":
+            data["matches"] = [[m["first_contender_id"], m["second_contender_id"]] for m in payload["matches"]]
+        return cls(league_type, data["league_id"], json.dumps(data, ensure_ascii=False, separators=(",", ":")))
+
+    @classmethod
+    def points(cls, league_type: str, league_id: int) -> "LiveUpdate":
+        # a correction can touch hundreds of leagues, subscribers re-read the feed instead of getting the scores
+        data = {"type": league_type, "league_id": league_id, "reason": "points"}
+        return cls(league_type, league_id, json.dumps(data, separators=(",", ":")))
+
+
+class Subscription:
+    """Mailbox of one subscriber that only keeps the newest update.
+
+    Every update carries the league's whole current state, so a client that reads slower than updates arrive
+    skips to the latest one instead of queueing: the publisher never waits and memory per subscriber is fixed.
+    """
+    __slots__ = ("key", "closed", "_pending", "_ready")
+
+    def __init__(self, key: LeagueKey):
+        self.key = key
+        self.closed = False
+        self._pending: Optional[LiveUpdate] = None
+        self._ready = asyncio.Event()
+
+    def offer(self, update: LiveUpdate) -> bool:
+        replaced = self._pending is not None
+        self._pending = update
+        self._ready.set()
+        return replaced
+
+    def close(self) -> None:
+        self.closed = True
+        self._ready.set()
+
+    async def next(self, timeout: float) -> Optional[LiveUpdate]:
+        """The newest undelivered update, None after the timeout or once the hub closed the subscription."""
+        if self._pending is None and not self.closed:
+            try:
+                async with asyncio.timeout(timeout):
+                    await self._ready.wait()
+            except TimeoutError:
+                return None
+        self._ready.clear()
+        update, self._pending = self._pending, None
+        return update
+
+
+class LiveHub:
+    """Pushes league updates to the subscribers connected to this worker."""
+    name = "local"
+
+    def __init__(self, max_subscribers: int = 10000, heartbeat: float = 15.0):
+        self.max_subscribers = max_subscribers
+        self.heartbeat = heartbeat
+        self._subscribers: Dict[LeagueKey, Set[Subscription]] = {}
+        self._count = 0
+        self.logger = logging.getLogger(self.__class__.__name__)
+
+    def __len__(self) -> int:
+        return self._count
+
+    def full(self) -> bool:
+        return self._count >= self.max_subscribers
+
+    def wanted(self, league_type: str, league_id: int) -> bool:
+        """Whether an update for the league has anyone to go to, so it is worth building."""
+        return (league_type, league_id) in self._subscribers
+
+    @contextmanager
+    def subscribe(self, league_type: str, league_id: int) -> Iterator[Subscription]:
+        subscription = Subscription((league_type, league_id))
+        self._subscribers.setdefault(subscription.key, set()).add(subscription)
+        self._count += 1
+        metrics.set("live_subscribers", self._count)
+        try:
+            yield subscription
+        finally:
+            subscribers = self._subscribers.get(subscription.key)
+            if subscribers is not None:
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self._subscribers[subscription.key]
+            self._count -= 1
+            metrics.set("live_subscribers", self._count)
+
+    def deliver(self, update: LiveUpdate) -> int:
+        subscribers = self._subscribers.get(update.key, ())
+        conflated = sum(subscription.offer(update) for subscription in subscribers)
+        metrics.inc("live_deliveries_total", len(subscribers), type=update.league_type)
+        if conflated:
+            metrics.inc("live_conflated_total", conflated, type=update.league_type)
+        return len(subscribers)
+
+    async def publish(self, update: LiveUpdate) -> None:
+        metrics.inc("live_published_total", type=update.league_type, backend=self.name)
+        self.deliver(update)
+
+    async def start(self) -> None:
+        pass
+
+    def close_streams(self) -> None:
+        # ends every open stream, clients reconnect to another worker
+        for subscribers in self._subscribers.values():
+            for subscription in subscribers:
+                subscription.close()
+
+    async def close(self) -> None:
+        self.close_streams()
+
+
+class RedisLiveHub(LiveHub):
+    """Relays updates through a Redis channel, so subscribers on every worker see snapshots any worker stored."""
+    name = "redis"
+
+    def __init__(self, url: str, channel: str, max_subscribers: int = 10000, heartbeat: float = 15.0):
+        aioredis = load_redis()
+        if aioredis is None:
+            raise RuntimeError("LIVE_BACKEND=redis needs the redis package, see the \"redis\" extra")
+        super().__init__(max_subscribers, heartbeat)
+        self._redis = aioredis.from_url(url, socket_timeout=1, socket_connect_timeout=1)
+        self._redis_error = aioredis.RedisError
+        self._channel = channel
+        self._listener: Optional[asyncio.Task] = None
+
+    def wanted(self, league_type: str, league_id: int) -> bool:
+        # subscribers of other workers are not known here
+        return True
+
+    def _failed(self, operation: str, error: Exception) -> None:
+        metrics.inc("live_errors_total", backend=self.name, operation=operation)
+        self.logger.warning("Redis live feed %s failed: %s", operation, error)
+
+    async def publish(self, update: LiveUpdate) -> None:
+        metrics.inc("live_published_total", type=update.league_type, backend=self.name)
+        try:
+            await self._redis.publish(self._channel, f"{update.league_type}:{update.league_id}:{update.data}")
+        except self._redis_error as e:
+            # the other workers miss it, this worker's subscribers still get it
+            self._failed("publish", e)
+            self.deliver(update)
+
+    async def _listen(self) -> None:
+        while True:
+            try:
+                async with self._redis.pubsub() as pubsub:
+                    await pubsub.subscribe(self._channel)
+                    async for message in pubsub.listen():
+                        if message["type"] != "message":
+                            continue
+                        league_type, league_id, data = message["data"].decode().split(":", 2)
+                        self.deliver(LiveUpdate(league_type, int(league_id), data))
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self._failed("subscribe", e)
+                await asyncio.sleep(1)
+
+    async def start(self) -> None:
+        if self._listener is None:
+            self._listener = asyncio.create_task(self._listen())
+
+    async def close(self) -> None:
+        await super().close()
+        if self._listener is not None:
+            self._listener.cancel()
+            self._listener = None
+        await self._redis.aclose()
+
+
+def create_live_hub(config) -> LiveHub:
+    if config.backend == "local":
+        return LiveHub(config.max_subscribers, config.heartbeat)
+    if config.backend == "redis":
+        return RedisLiveHub(env.redis.url, config.channel, config.max_subscribers, config.heartbeat)
+    raise ValueError(f"Unknown LIVE_BACKEND {config.backend}")
+
+
+live_hub = create_live_hub(env.live)
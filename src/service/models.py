@@ -1,6 +1,46 @@
-from pydantic import BaseModel, ConfigDict, field_validator
-from typing import Optional, List, Dict, Tuple
+from pydantic import BaseModel, ConfigDict, Field, AnyHttpUrl, field_validator
+from typing import Optional, List, Dict, Tuple, Any
 from ..postgre import PlayerGameweek
+from datetime import datetime
+from uuid import UUID
+
+import hashlib
+import json
+
+
+def stable_hash(data: Any) -> str:
+    encoded = json.dumps(data, sort_keys=True, separators=(",", ":"), ensure_ascii=False).encode()
+    return hashlib.sha256(encoded).hexdigest()
+
+
+def _normalized_contenders(contenders: List["ContendersModel"]) -> List[Dict]:
+    return [
+        {**c.model_dump(exclude={"composition"}),
+         "composition": sorted((p.model_dump() for p in c.composition), key=lambda x: x["player_id"])}
+        for c in sorted(contenders, key=lambda x: x.team_id)
+    ]
+
+class ReportKeyModel(BaseModel):
+    type: str
+    league_id: int
+    gameweek: Optional[int] = None
+
+class WebhookSubscriptionModel(BaseModel):
+    league_type: str
+    league_id: Optional[int] = None
+    url: AnyHttpUrl
+    rate_limit_per_minute: Optional[int] = Field(default=None, gt=0)
+
+class WebhookSubscriptionOutModel(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+
+    id: UUID
+    league_type: str
+    league_id: Optional[int]
+    url: str
+    rate_limit_per_minute: Optional[int]
+    active: bool
+    created: datetime
 
 class PlayerModel(BaseModel):
     model_config = ConfigDict(from_attributes=True)
@@ -25,8 +65,17 @@ class ClassicGameweekModel(BaseModel):
 
     league_id: int
     gameweek: int
+    # the configured current season when missing, not part of the content hash
+    season: Optional[int] = None
     contenders: List[ContendersModel]
 
+    def content_hash(self) -> str:
+        return stable_hash({
+            "league_id": self.league_id,
+            "gameweek": self.gameweek,
+            "contenders": _normalized_contenders(self.contenders),
+        })
+
 
 class MatchesModel(BaseModel):
     model_config = ConfigDict(from_attributes=True)
@@ -39,9 +88,33 @@ class H2HGameweekModel(BaseModel):
 
     league_id: int
     gameweek: int
+    season: Optional[int] = None
     matches: List[MatchesModel]
     contenders: List[ContendersModel]
 
+    def content_hash(self) -> str:
+        return stable_hash({
+            "league_id": self.league_id,
+            "gameweek": self.gameweek,
+            "matches": sorted(
+                (m.first_contender_id, m.second_contender_id) for m in self.matches
+            ),
+            "contenders": _normalized_contenders(self.contenders),
+        })
+
+class PlayerPointsModel(BaseModel):
+    player_id: int
+    gameweek: int
+    points: int
+
+class PointsDeltaModel(BaseModel):
+    updates: List[PlayerPointsModel] = Field(min_length=1)
+    season: Optional[int] = None
+
+    def points(self) -> Dict[Tuple[int, int], int]:
+        # a later update of the same player and gameweek wins
+        return {(u.player_id, u.gameweek): u.points for u in self.updates}
+
 class PairResultModel(BaseModel):
     model_config = ConfigDict(from_attributes=True, arbitrary_types_allowed=True)
 
@@ -0,0 +1,202 @@
+import asyncio
+import logging
+import time
+from collections import deque
+from datetime import datetime, timedelta, timezone
+from typing import Deque, Dict, List, Optional, Tuple
+
+from . import RSSServiceException, DeliveryDeferredException
+from .webhooks import webhook_dispatcher
+from .. import env
+from ..metrics import metrics
+from ..postgre import sessionmanager, OutboxRepo, OutboxMessage, WebhookSubscriptionRepo, WebhookSubscription
+
+logger = logging.getLogger("outbox_relay")
+
+
+Delivery = Tuple[OutboxMessage, Optional[WebhookSubscription]]
+
+
+class OutboxRelay:
+    """Claims due outbox messages and hands them to one worker task per target.
+
+    A target's messages go out one after another, so a slow or failing target only delays its own messages while
+    the others keep flowing. Every result is committed on its own as soon as it is known. At most batch_size
+    claimed messages are in flight, new ones are claimed as that drains. Delivered and dead messages are purged
+    in the background once they are older than the retention.
+    """
+
+    def __init__(self, batch_size: int = 50, poll_interval: float = 5, max_attempts: int = 10,
+                 base_backoff: float = 5, max_backoff: float = 900, lease: float = 300, retention: float = 604800,
+                 purge_interval: float = 600):
+        self.batch_size = batch_size
+        self.lease = lease
+        self.poll_interval = poll_interval
+        self.max_attempts = max_attempts
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self.retention = retention
+        self.purge_interval = purge_interval
+        self._last_purge: Optional[float] = None
+        self._purge_task: Optional[asyncio.Task] = None
+        self._wakeup = asyncio.Event()
+        self._stopping = False
+        self._queues: Dict[str, Deque[Delivery]] = {}
+        self._workers: Dict[str, asyncio.Task] = {}
+        self._in_flight = 0
+
+    def notify(self) -> None:
+        # called after a commit that enqueued messages so they go out without waiting for the next poll
+        self._wakeup.set()
+
+    @staticmethod
+    def _target(message: OutboxMessage, subscription: Optional[WebhookSubscription]) -> str:
+        if message.kind == "webhook":
+            return str(subscription.id) if subscription is not None else message.destination
+        return f"{message.kind}:{message.destination}"
+
+    @staticmethod
+    async def _deliver(message: OutboxMessage, subscription: Optional[WebhookSubscription]) -> None:
+        if message.kind == "webhook":
+            target = str(subscription.id) if subscription is not None else message.destination
+            await webhook_dispatcher.deliver(target, message.destination, message.payload, message.idempotency_key,
+                                             subscription.rate_limit_per_minute if subscription else None)
+        elif message.kind == "event":
+            from ..rabbit_pool import publish_event
+            headers = {**(message.headers or {}), "idempotency_key": message.idempotency_key}
+            await publish_event(message.destination, message.payload, headers)
+        else:
+            raise RSSServiceException(f"Unknown outbox message kind {message.kind}")
+
+    async def _claim(self, limit: int) -> List[Delivery]:
+        # a short transaction of its own, no lock or connection is held while the targets are called
+        async with sessionmanager.session() as session:
+            repo = OutboxRepo(session)
+            messages: List[OutboxMessage] = await repo.claim_pending(limit, self.lease)
+            if not messages:
+                return []
+            subscriptions = await WebhookSubscriptionRepo(session).get_many(
+                m.subscription_id for m in messages if m.subscription_id is not None)
+            deliverable = []
+            for message in messages:
+                subscription = subscriptions.get(message.subscription_id)
+                if message.subscription_id is not None and (subscription is None or not subscription.active):
+                    await repo.mark_dead(message, "Webhook subscription was removed")
+                    metrics.inc("outbox_dead_total", kind=message.kind)
+                else:
+                    deliverable.append((message, subscription))
+            await session.commit()
+            return deliverable
+
+    async def _record(self, repo: OutboxRepo, message: OutboxMessage, result: Optional[BaseException]) -> None:
+        if isinstance(result, DeliveryDeferredException):
+            await repo.defer(message, result.retry_in, str(result))
+            metrics.inc("outbox_deferred_total", kind=message.kind)
+        elif isinstance(result, Exception):
+            await repo.mark_failed(message, str(result) or result.__class__.__name__, self.max_attempts,
+                                   self.base_backoff, self.max_backoff)
+            metrics.inc("outbox_failed_total", kind=message.kind)
+            if message.status == "dead":
+                metrics.inc("outbox_dead_total", kind=message.kind)
+        else:
+            await repo.mark_delivered(message)
+            metrics.inc("outbox_delivered_total", kind=message.kind)
+
+    async def _work(self, target: str, queue: Deque[Delivery]) -> None:
+        try:
+            while queue:
+                message, subscription = queue.popleft()
+                try:
+                    await self._deliver(message, subscription)
+                    result = None
+                except Exception as e:
+                    result = e
+                try:
+                    # a crash before this commit redelivers once the lease runs out, consumers dedupe on the key
+                    async with sessionmanager.session() as session:
+                        await self._record(OutboxRepo(session), message, result)
+                        await session.commit()
+                except Exception:
+                    logger.exception("Recording outbox message %s failed", message.idempotency_key)
+                self._in_flight -= 1
+                if self._in_flight <= self.batch_size // 2:
+                    self._wakeup.set()
+        finally:
+            # nothing is awaited between the empty check and this, a message queued meanwhile starts a new worker
+            del self._queues[target], self._workers[target]
+
+    async def relay_once(self) -> int:
+        """Claims as many messages as there is room for in flight and queues them to their targets' workers."""
+        room = self.batch_size - self._in_flight
+        if room <= 0:
+            return 0
+        deliverable = await self._claim(room)
+        for message, subscription in deliverable:
+            target = self._target(message, subscription)
+            queue = self._queues.get(target)
+            if queue is None:
+                queue = self._queues[target] = deque()
+                self._workers[target] = asyncio.create_task(self._work(target, queue))
+            queue.append((message, subscription))
+        self._in_flight += len(deliverable)
+        if deliverable:
+            logger.info("Claimed %s outbox messages for %s targets", len(deliverable), len(self._queues))
+        return len(deliverable)
+
+    def _schedule_purge(self) -> None:
+        # its own transaction in the background, a large delete must not hold up claiming
+        if self._purge_task is not None and not self._purge_task.done():
+            return
+        if self._last_purge is not None and time.monotonic() - self._last_purge <= self.purge_interval:
+            return
+        self._purge_task = asyncio.create_task(self._purge())
+
+    async def _purge(self) -> None:
+        try:
+            async with sessionmanager.session() as session:
+                purged = await OutboxRepo(session).purge(
+                    datetime.now(timezone.utc) - timedelta(seconds=self.retention))
+                await session.commit()
+        except Exception:
+            # retried on the next pass of the loop
+            logger.exception("Purging finished outbox messages failed")
+            return
+        self._last_purge = time.monotonic()
+        if purged:
+            metrics.inc("outbox_purged_total", purged)
+
+    async def wait_idle(self) -> None:
+        while self._workers:
+            await asyncio.gather(*self._workers.values(), return_exceptions=True)
+
+    def stop(self) -> None:
+        # the claimed messages still get delivered and recorded, they would otherwise wait out their lease
+        self._stopping = True
+        self._wakeup.set()
+
+    async def run(self) -> None:
+        logger.info("Outbox relay started batch_size=%s poll_interval=%s", self.batch_size, self.poll_interval)
+        while not self._stopping:
+            self._wakeup.clear()
+            self._schedule_purge()
+            try:
+                claimed = await self.relay_once()
+            except Exception:
+                logger.exception("Outbox relay batch failed")
+                claimed = 0
+            if self._stopping:
+                break
+            if claimed and self._in_flight < self.batch_size:
+                continue
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+        await self.wait_idle()
+        if self._purge_task is not None:
+            await asyncio.gather(self._purge_task, return_exceptions=True)
+
+
+outbox_relay = OutboxRelay(env.outbox.batch_size, env.outbox.poll_interval, env.outbox.max_attempts,
+                           env.outbox.base_backoff, env.outbox.max_backoff, env.outbox.lease, env.outbox.retention,
+                           env.outbox.purge_interval)
@@ -0,0 +1,536 @@
+import asyncio
+import fcntl
+import gzip
+import hashlib
+import logging
+import os
+import shutil
+import tempfile
+import time
+import uuid
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from pathlib import Path
+from threading import Lock
+from typing import AsyncIterator, Dict, Hashable, Optional, Tuple, Iterable
+
+from .. import env
+from ..metrics import metrics
+
+try:
+    import brotli
+except ImportError:  # optional, see the "compression" extra
+    brotli = None
+
+
+def load_redis():
+    """redis.asyncio, or None without the "redis" extra. Imported by the redis backends only, it is slow to load."""
+    try:
+        import redis.asyncio as aioredis
+    except ImportError:
+        return None
+    return aioredis
+
+MIN_COMPRESS_SIZE = 1024
+
+ReportKey = Tuple[str, int, Optional[int]]
+
+
+@dataclass
+class CachedReport:
+    body: bytes
+    media_type: str = "text/plain"
+    created: float = field(default_factory=time.monotonic)
+    # rendered from a finalized gameweek, never changes and does not expire
+    final: bool = False
+    _encoded: Dict[str, bytes] = field(default_factory=dict)
+
+    @classmethod
+    def from_gzip(cls, compressed: bytes, media_type: str = "text/plain", final: bool = False) -> "CachedReport":
+        report = cls(body=gzip.decompress(compressed), media_type=media_type, final=final)
+        report._encoded["gzip"] = compressed
+        return report
+
+    def encoded(self, encoding: str) -> bytes:
+        if encoding == "identity":
+            return self.body
+        if encoding not in self._encoded:
+            if encoding == "br":
+                self._encoded[encoding] = brotli.compress(self.body, quality=5)
+            elif encoding == "gzip":
+                self._encoded[encoding] = gzip.compress(self.body, compresslevel=6, mtime=0)
+            else:
+                raise ValueError(f"Unsupported encoding {encoding}")
+        return self._encoded[encoding]
+
+    def dumps(self) -> bytes:
+        return self.media_type.encode() + (b"\1final" if self.final else b"") + b"\0" + self.body
+
+    @classmethod
+    def loads(cls, data: bytes) -> "CachedReport":
+        header, _, body = data.partition(b"\0")
+        media_type, _, flags = header.partition(b"\1")
+        return cls(body=body, media_type=media_type.decode(), final=flags == b"final")
+
+
+def supported_encodings() -> Tuple[str, ...]:
+    return ("br", "gzip") if brotli is not None else ("gzip",)
+
+
+def negotiate_encoding(accept_encoding: Optional[str], body_size: int) -> str:
+    if not accept_encoding or body_size < MIN_COMPRESS_SIZE:
+        return "identity"
+    accepted = {}
+    for part in accept_encoding.split(","):
+        name, _, params = part.strip().partition(";")
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        accepted[name.strip().lower()] = q
+    for encoding in supported_encodings():
+        if accepted.get(encoding, accepted.get("*", 0)) > 0:
+            return encoding
+    return "identity"
+
+
+class ReportCache(ABC):
+    """Rendered reports keyed by (league type, league id, gameweek), None standing for the latest gameweek.
+
+    lock() guards a render so concurrent misses of one key wait for the first renderer instead of
+    repeating its queries; it yields False when the lock could not be taken within the timeout and the
+    caller renders anyway.
+    """
+    name = "base"
+
+    @abstractmethod
+    async def get(self, key: ReportKey) -> Optional[CachedReport]:
+        ...
+
+    @abstractmethod
+    async def put(self, key: ReportKey, report: CachedReport) -> None:
+        ...
+
+    @abstractmethod
+    async def invalidate(self, league_type: str, league_id: int) -> int:
+        ...
+
+    async def invalidate_many(self, leagues: Iterable[Tuple[str, int]]) -> int:
+        return sum([await self.invalidate(league_type, league_id) for league_type, league_id in leagues])
+
+    @abstractmethod
+    async def clear(self) -> None:
+        ...
+
+    @abstractmethod
+    def lock(self, key: ReportKey):
+        ...
+
+    async def start(self) -> None:
+        pass
+
+    async def close(self) -> None:
+        pass
+
+
+class _LoadedReports:
+    """The report last loaded per key from a shared backend, with a stamp of the stored entry it came from.
+
+    A hit on an unchanged entry returns the same CachedReport, so the variants it compressed for earlier
+    responses are reused instead of being produced again on every poll.
+    """
+
+    def __init__(self, max_entries: int = 512):
+        self._max_entries = max_entries
+        self._items: "OrderedDict[ReportKey, Tuple[Hashable, CachedReport]]" = OrderedDict()
+        self._lock = Lock()
+
+    def get(self, key: ReportKey, stamp: Hashable) -> Optional[CachedReport]:
+        with self._lock:
+            loaded = self._items.get(key)
+            if loaded is None or loaded[0] != stamp:
+                return None
+            self._items.move_to_end(key)
+            return loaded[1]
+
+    def put(self, key: ReportKey, stamp: Hashable, report: CachedReport) -> None:
+        with self._lock:
+            self._items[key] = (stamp, report)
+            self._items.move_to_end(key)
+            while len(self._items) > self._max_entries:
+                self._items.popitem(last=False)
+
+    def discard(self, league_type: str, league_id: int) -> None:
+        with self._lock:
+            for key in [k for k in self._items if k[0] == league_type and k[1] == league_id]:
+                del self._items[key]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._items.clear()
+
+
+class MemoryReportCache(ReportCache):
+    name = "memory"
+
+    def __init__(self, max_entries: int = 512, ttl: float = 60.0, lock_timeout: float = 10.0,
+                 keep_final: bool = True):
+        self._max_entries = max_entries
+        self._ttl = ttl
+        self._keep_final = keep_final
+        self._lock_timeout = lock_timeout
+        self._items: "OrderedDict[ReportKey, CachedReport]" = OrderedDict()
+        self._lock = Lock()
+        self._render_locks: Dict[ReportKey, Tuple[asyncio.Lock, int]] = {}
+
+    def get_local(self, key: ReportKey) -> Optional[CachedReport]:
+        with self._lock:
+            report = self._items.get(key)
+            if report is None:
+                return None
+            if not (report.final and self._keep_final) and time.monotonic() - report.created > self._ttl:
+                del self._items[key]
+                return None
+            self._items.move_to_end(key)
+            return report
+
+    def put_local(self, key: ReportKey, report: CachedReport) -> None:
+        with self._lock:
+            self._items[key] = report
+            self._items.move_to_end(key)
+            while len(self._items) > self._max_entries:
+                self._items.popitem(last=False)
+
+    def invalidate_local(self, league_type: str, league_id: int) -> int:
+        with self._lock:
+            keys = [k for k in self._items if k[0] == league_type and k[1] == league_id]
+            for k in keys:
+                del self._items[k]
+            return len(keys)
+
+    async def get(self, key: ReportKey) -> Optional[CachedReport]:
+        return self.get_local(key)
+
+    async def put(self, key: ReportKey, report: CachedReport) -> None:
+        self.put_local(key, report)
+
+    async def invalidate(self, league_type: str, league_id: int) -> int:
+        return self.invalidate_local(league_type, league_id)
+
+    async def clear(self) -> None:
+        with self._lock:
+            self._items.clear()
+
+    @asynccontextmanager
+    async def lock(self, key: ReportKey) -> AsyncIterator[bool]:
+        lock, users = self._render_locks.get(key, (None, 0))
+        if lock is None:
+            lock = asyncio.Lock()
+        self._render_locks[key] = (lock, users + 1)
+        try:
+            try:
+                await asyncio.wait_for(lock.acquire(), self._lock_timeout)
+            except asyncio.TimeoutError:
+                yield False
+                return
+            try:
+                yield True
+            finally:
+                lock.release()
+        finally:
+            lock, users = self._render_locks[key]
+            if users == 1:
+                del self._render_locks[key]
+            else:
+                self._render_locks[key] = (lock, users - 1)
+
+
+class FileReportCache(ReportCache):
+    """One file per report under a directory shared by the workers of a host (the mounted .local volume).
+
+    Writes go through a temporary file and a rename so readers never see a partial report, invalidation
+    unlinks the league's files and is therefore seen by every worker at once. Render locks are flock()s,
+    released by the kernel if the holder dies.
+    """
+    name = "file"
+
+    def __init__(self, directory: str, ttl: float = 60.0, lock_timeout: float = 10.0, max_entries: int = 512):
+        self._root = Path(directory)
+        self._ttl = ttl
+        self._lock_timeout = lock_timeout
+        self._loaded = _LoadedReports(max_entries)
+        (self._root / "locks").mkdir(parents=True, exist_ok=True)
+
+    def _league_dir(self, league_type: str, league_id: int) -> Path:
+        return self._root / "reports" / league_type / str(league_id)
+
+    def _path(self, key: ReportKey) -> Path:
+        league_type, league_id, gameweek = key
+        return self._league_dir(league_type, league_id) / ("latest" if gameweek is None else str(gameweek))
+
+    @staticmethod
+    def _stamp(stat: os.stat_result) -> Tuple[int, int]:
+        # a rewrite renames a new file into place, its mtime or size differs from the one loaded before
+        return stat.st_mtime_ns, stat.st_size
+
+    def _read(self, key: ReportKey) -> Optional[CachedReport]:
+        path = self._path(key)
+        try:
+            stat = path.stat()
+            report = self._loaded.get(key, self._stamp(stat))
+            if report is None:
+                report = CachedReport.loads(path.read_bytes())
+                self._loaded.put(key, self._stamp(stat), report)
+        except FileNotFoundError:
+            return None
+        if not report.final and time.time() - stat.st_mtime > self._ttl:
+            path.unlink(missing_ok=True)
+            return None
+        return report
+
+    def _write(self, key: ReportKey, report: CachedReport) -> None:
+        path = self._path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=".tmp-")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(report.dumps())
+                stat = os.fstat(f.fileno())
+            os.replace(tmp, path)
+        except BaseException:
+            Path(tmp).unlink(missing_ok=True)
+            raise
+        self._loaded.put(key, self._stamp(stat), report)
+
+    def _remove(self, league_type: str, league_id: int) -> int:
+        self._loaded.discard(league_type, league_id)
+        removed = 0
+        try:
+            entries = list(self._league_dir(league_type, league_id).iterdir())
+        except FileNotFoundError:
+            return 0
+        for entry in entries:
+            if not entry.name.startswith(".tmp-"):
+                entry.unlink(missing_ok=True)
+                removed += 1
+        return removed
+
+    # file system calls run in a thread, a slow or busy volume must not stall the event loop
+
+    async def get(self, key: ReportKey) -> Optional[CachedReport]:
+        return await asyncio.to_thread(self._read, key)
+
+    async def put(self, key: ReportKey, report: CachedReport) -> None:
+        await asyncio.to_thread(self._write, key, report)
+
+    async def invalidate(self, league_type: str, league_id: int) -> int:
+        return await asyncio.to_thread(self._remove, league_type, league_id)
+
+    async def clear(self) -> None:
+        self._loaded.clear()
+        await asyncio.to_thread(shutil.rmtree, self._root / "reports", ignore_errors=True)
+
+    @asynccontextmanager
+    async def lock(self, key: ReportKey) -> AsyncIterator[bool]:
+        league_type, league_id, gameweek = key
+        path = self._root / "locks" / f"{league_type}-{league_id}-{'latest' if gameweek is None else gameweek}"
+        with open(path, "a") as f:
+            deadline = time.monotonic() + self._lock_timeout
+            while True:
+                try:
+                    fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                    break
+                except BlockingIOError:
+                    if time.monotonic() > deadline:
+                        yield False
+                        return
+                    await asyncio.sleep(0.02)
+            try:
+                yield True
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+
+_RELEASE_LOCK = """
+if redis.call("get", KEYS[1]) == ARGV[1] then
+    return redis.call("del", KEYS[1])
+end
+return 0
+"""
+
+
+class RedisReportCache(ReportCache):
+    """Reports shared through Redis with a short-lived per-worker copy in front.
+
+    Invalidations delete the league's keys and are published on a channel every worker listens to, so the
+    local copies are dropped too. Redis errors are logged and count as misses, the feed keeps working from
+    the database.
+    """
+    name = "redis"
+
+    def __init__(self, url: str, ttl: float = 60.0, local_ttl: float = 5.0, max_entries: int = 512,
+                 lock_timeout: float = 10.0, prefix: str = "ballista-rss"):
+        aioredis = load_redis()
+        if aioredis is None:
+            raise RuntimeError("CACHE_BACKEND=redis needs the redis package, see the \"redis\" extra")
+        # short socket timeouts: an unreachable redis turns into misses, not into slow feeds
+        self._redis = aioredis.from_url(url, socket_timeout=1, socket_connect_timeout=1)
+        self._redis_error = aioredis.RedisError
+        self._ttl = ttl
+        self._lock_timeout = lock_timeout
+        self._prefix = prefix
+        self._channel = f"{prefix}:invalidate"
+        # the local copy expires final reports too, it is what bounds a missed invalidation
+        self._local = MemoryReportCache(max_entries, ttl=min(local_ttl, ttl), keep_final=False)
+        self._loaded = _LoadedReports(max_entries)
+        self._listener: Optional[asyncio.Task] = None
+        self.logger = logging.getLogger(self.__class__.__name__)
+
+    def _key(self, key: ReportKey) -> str:
+        league_type, league_id, gameweek = key
+        return f"{self._prefix}:report:{league_type}:{league_id}:{'latest' if gameweek is None else gameweek}"
+
+    def _league_key(self, league_type: str, league_id: int) -> str:
+        return f"{self._prefix}:league:{league_type}:{league_id}"
+
+    def _final_key(self, league_type: str, league_id: int) -> str:
+        # final reports do not expire, their index must not either or an invalidation would miss them
+        return f"{self._prefix}:final:{league_type}:{league_id}"
+
+    def _failed(self, operation: str, error: Exception) -> None:
+        metrics.inc("report_cache_errors_total", backend=self.name, operation=operation)
+        self.logger.warning("Redis cache %s failed: %s", operation, error)
+
+    async def get(self, key: ReportKey) -> Optional[CachedReport]:
+        report = self._local.get_local(key)
+        if report is not None:
+            return report
+        try:
+            data = await self._redis.get(self._key(key))
+        except self._redis_error as e:
+            self._failed("get", e)
+            return None
+        if data is None:
+            return None
+        stamp = hashlib.blake2b(data, digest_size=16).digest()
+        report = self._loaded.get(key, stamp)
+        if report is None:
+            report = CachedReport.loads(data)
+            self._loaded.put(key, stamp, report)
+        self._local.put_local(key, report)
+        return report
+
+    async def put(self, key: ReportKey, report: CachedReport) -> None:
+        self._local.put_local(key, report)
+        data = report.dumps()
+        self._loaded.put(key, hashlib.blake2b(data, digest_size=16).digest(), report)
+        league_key = self._league_key(key[0], key[1])
+        try:
+            async with self._redis.pipeline(transaction=False) as pipe:
+                if report.final:
+                    pipe.set(self._key(key), data)
+                    pipe.sadd(self._final_key(key[0], key[1]), self._key(key))
+                else:
+                    pipe.set(self._key(key), data, px=int(self._ttl * 1000))
+                    pipe.sadd(league_key, self._key(key))
+                    pipe.pexpire(league_key, int(self._ttl * 2000))
+                await pipe.execute()
+        except self._redis_error as e:
+            self._failed("put", e)
+
+    async def invalidate(self, league_type: str, league_id: int) -> int:
+        removed = self._local.invalidate_local(league_type, league_id)
+        self._loaded.discard(league_type, league_id)
+        league_key, final_key = self._league_key(league_type, league_id), self._final_key(league_type, league_id)
+        try:
+            keys = await self._redis.sunion(league_key, final_key)
+            async with self._redis.pipeline(transaction=False) as pipe:
+                pipe.delete(league_key, final_key, *keys)
+                pipe.publish(self._channel, f"{league_type}:{league_id}")
+                await pipe.execute()
+        except self._redis_error as e:
+            self._failed("invalidate", e)
+            return removed
+        return max(removed, len(keys))
+
+    async def clear(self) -> None:
+        await self._local.clear()
+        self._loaded.clear()
+        try:
+            keys = [key async for key in self._redis.scan_iter(match=f"{self._prefix}:*")]
+            if keys:
+                await self._redis.delete(*keys)
+        except self._redis_error as e:
+            self._failed("clear", e)
+
+    @asynccontextmanager
+    async def lock(self, key: ReportKey) -> AsyncIterator[bool]:
+        name, token = f"{self._key(key)}:lock", uuid.uuid4().hex
+        deadline = time.monotonic() + self._lock_timeout
+        acquired = False
+        try:
+            # the lock expires with the timeout so a worker dying mid-render does not block the key
+            while not (acquired := bool(await self._redis.set(name, token, nx=True,
+                                                              px=int(self._lock_timeout * 1000)))):
+                if time.monotonic() > deadline:
+                    break
+                await asyncio.sleep(0.02)
+        except self._redis_error as e:
+            self._failed("lock", e)
+        try:
+            yield acquired
+        finally:
+            if acquired:
+                try:
+                    await self._redis.eval(_RELEASE_LOCK, 1, name, token)
+                except self._redis_error as e:
+                    self._failed("unlock", e)
+
+    async def _listen(self) -> None:
+        while True:
+            try:
+                async with self._redis.pubsub() as pubsub:
+                    await pubsub.subscribe(self._channel)
+                    async for message in pubsub.listen():
+                        if message["type"] != "message":
+                            continue
+                        league_type, _, league_id = message["data"].decode().partition(":")
+                        self._local.invalidate_local(league_type, int(league_id))
+                        self._loaded.discard(league_type, int(league_id))
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                # anything published while disconnected is missed, the short local TTL covers it
+                self._failed("subscribe", e)
+                await asyncio.sleep(1)
+
+    async def start(self) -> None:
+        if self._listener is None:
+            self._listener = asyncio.create_task(self._listen())
+
+    async def close(self) -> None:
+        if self._listener is not None:
+            self._listener.cancel()
+            self._listener = None
+        await self._redis.aclose()
+
+
+def create_report_cache(config) -> ReportCache:
+    if config.backend == "memory":
+        return MemoryReportCache(config.max_entries, ttl=config.ttl, lock_timeout=config.lock_timeout)
+    if config.backend == "file":
+        return FileReportCache(config.directory, ttl=config.ttl, lock_timeout=config.lock_timeout,
+                               max_entries=config.max_entries)
+    if config.backend == "redis":
+        return RedisReportCache(env.redis.url, ttl=config.ttl, local_ttl=config.local_ttl,
+                                max_entries=config.max_entries, lock_timeout=config.lock_timeout,
+                                prefix=config.prefix)
+    raise ValueError(f"Unknown CACHE_BACKEND {config.backend}")
+
+
+report_cache = create_report_cache(env.cache)
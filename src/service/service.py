@@ -1,18 +1,38 @@
-from . import DatabaseException, ExternalAPIException
+from . import DatabaseException, ExternalAPIException, RSSServiceException
 from . import h2h_text_gen
 from . import classic_text_gen
-from ..postgre import H2HGameweekRepo, ClassicGameweekRepo, H2HGameweek, ClassicGameweek, PlayerGameweek
-from .models import ClassicGameweekModel, H2HGameweekModel, PairResultModel, ContendersModel
+from .frame import GameweekFrame
+from .similarity import build_matrix, similarity_cache, gameweek_key, form_similarity_info, similarity_json
+from ..postgre import (H2HGameweekRepo, ClassicGameweekRepo, StandingsRepo, OutboxRepo, WebhookSubscriptionRepo,
+                       PointsRepo, SeasonRepo, SnapshotRepo, H2HGameweek, ClassicGameweek, PlayerGameweek,
+                       WebhookSubscription, GameweekSnapshot, sessionmanager, resolve_season, partitions_ready)
+from .models import (ClassicGameweekModel, H2HGameweekModel, PointsDeltaModel, PairResultModel, ContendersModel,
+                     stable_hash)
+from .report_cache import report_cache, CachedReport, ReportKey
+from .single_flight import SingleFlight
+from ..metrics import metrics
+from .. import env
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from uuid import UUID
 import logging
-from typing import Dict, List
+from typing import TYPE_CHECKING, Awaitable, Callable, Dict, List, Optional, Set, Tuple, Union
 
+import asyncio
+import gzip
+from functools import partial
 import json
-import requests
 
-WEBHOOK_URL = "https://n8n.ontext.info/webhook/106de94f-9628-49c4-bbde-4d48dfbcc173"
+if TYPE_CHECKING:
+    import requests
+
+WEBHOOK_URL = env.webhook.default_url
+MAX_BATCH_KEYS = 1000
+
+report_flight = SingleFlight("report")
+
+# webhook delivery used to live on RSSService, keep its log records under the same logger name
+logger = logging.getLogger("RSSService")
 
 
 class RSSService:
@@ -20,29 +40,126 @@ class RSSService:
         self._database_conn = database_conn
         self._h2h_repo = H2HGameweekRepo(self._database_conn)
         self._classic_repo = ClassicGameweekRepo(self._database_conn)
+        self._standings_repo = StandingsRepo(self._database_conn)
+        self._outbox_repo = OutboxRepo(self._database_conn)
+        self._subscription_repo = WebhookSubscriptionRepo(self._database_conn)
+        self._points_repo = PointsRepo(self._database_conn)
+        self._snapshot_repo = SnapshotRepo(self._database_conn)
 
         self.logger = logging.getLogger(self.__class__.__name__)
 
-    async def create_h2h_item(self, item: Dict) -> UUID:
+    async def _season(self, season: Optional[int]) -> int:
+        season = resolve_season(season)
+        if partitions_ready(season):
+            # created at startup or by an earlier message
+            return season
+        if self._database_conn.in_transaction():
+            # a second connection would wait for the locks this transaction already holds on the parent tables
+            await SeasonRepo(self._database_conn).ensure(season, remember=False)
+        else:
+            # in a transaction of its own, so the partition DDL does not hold its locks for the whole ingest
+            async with sessionmanager.connect() as conn:
+                await SeasonRepo(conn).ensure(season)
+        return season
+
+    async def _final_snapshot(self, league_type: str, league_id: int,
+                              gameweek: Optional[int]) -> Optional[GameweekSnapshot]:
+        # only an explicit gameweek can be final, the latest one may still change
+        if gameweek is None:
+            return None
+        snapshot = await self._snapshot_repo.get(league_type, league_id, env.season.current, gameweek)
+        if snapshot is not None:
+            metrics.inc("report_snapshot_hits_total", type=league_type)
+        return snapshot
+
+    @staticmethod
+    def _snapshot_report(snapshot: GameweekSnapshot) -> CachedReport:
+        return CachedReport.from_gzip(snapshot.report, final=True)
+
+    async def finalize_gameweeks(self, league_type: str, league_ids: List[int], gameweek: int,
+                                 season: Optional[int] = None) -> List[Dict]:
+        """Renders the report and JSON of finished gameweeks once and stores them compressed.
+
+        Requests for a finalized gameweek are served from the snapshot without loading or rendering it, until an
+        ingest or points correction of that gameweek discards it.
+        """
+        if league_type == "h2h":
+            repo, render_report, render_json = self._h2h_repo, self._render_h2h_report, self._render_h2h_json
+        elif league_type == "classic":
+            repo, render_report, render_json = self._classic_repo, self._render_classic_report, self._render_classic_json
+        else:
+            raise RSSServiceException(f"Unknown league type {league_type}")
+        season = resolve_season(season)
+        gameweeks = await repo.get_many([(league_id, gameweek) for league_id in league_ids], season)
+        missing = [league_id for league_id in league_ids if (league_id, gameweek) not in gameweeks]
+        if missing:
+            raise DatabaseException(f"Gameweek not found league_ids={missing} gameweek={gameweek} season={season}")
+        snapshots = []
+        for (league_id, _), gw in gameweeks.items():
+            report, data = await asyncio.gather(render_report(gw), render_json(gw))
+            snapshots.append({
+                "league_type": league_type, "league_id": league_id, "season": season, "gameweek": gameweek,
+                "content_hash": gw.content_hash,
+                # mtime=0 keeps the bytes of an unchanged report identical between runs
+                "report": gzip.compress(report.encode(), compresslevel=9, mtime=0),
+                "data": gzip.compress(json.dumps(data, ensure_ascii=False).encode(), compresslevel=9, mtime=0),
+            })
+        await self._snapshot_repo.put_many(snapshots)
+        metrics.inc("report_snapshots_finalized_total", len(snapshots), type=league_type)
+        self.logger.info("Finalized %s %s gameweek snapshots season=%s gameweek=%s", len(snapshots), league_type,
+                         season, gameweek)
+        return [{"league_id": snapshot["league_id"], "season": season, "gameweek": gameweek,
+                 "content_hash": snapshot["content_hash"], "report_bytes": len(snapshot["report"]),
+                 "data_bytes": len(snapshot["data"])} for snapshot in snapshots]
+
+    async def create_h2h_item(self, item: Dict) -> Optional[UUID]:
         self.logger.debug("Validating incoming item league_id=%s gameweek=%s", item.get('league_id'),
                           item.get('gameweek'))
         model = H2HGameweekModel.model_validate(item)
+        content_hash = model.content_hash()
+        season = await self._season(model.season)
+        if await self._h2h_repo.get_content_hash(model.league_id, model.gameweek, season) == content_hash:
+            self.logger.info("Skipping unchanged H2H snapshot league_id=%s gameweek=%s", model.league_id,
+                             model.gameweek)
+            metrics.inc("ingest_skipped_unchanged_total", type="h2h")
+            return None
         self.logger.debug("Upserting item league_id=%s gameweek=%s", item['league_id'], item['gameweek'])
         h2h_gameweek_uuid = await self._h2h_repo.upsert_league(
             model.league_id, model.gameweek, [m.model_dump() for m in model.matches],
-            [m.model_dump() for m in model.contenders]
+            [m.model_dump() for m in model.contenders], content_hash, season
         )
+        await self._snapshot_repo.discard([("h2h", model.league_id)], season, [model.gameweek])
+        metrics.inc("ingest_written_total", type="h2h")
         return h2h_gameweek_uuid
 
-    async def create_classic_item(self, item: Dict) -> UUID:
+    async def create_classic_item(self, item: Dict) -> Optional[UUID]:
         self.logger.debug("Validating incoming item gameweek=%s", item['gameweek'])
         model = ClassicGameweekModel.model_validate(item)
+        content_hash = model.content_hash()
+        season = await self._season(model.season)
+        if await self._classic_repo.get_content_hash(model.league_id, model.gameweek, season) == content_hash:
+            self.logger.info("Skipping unchanged Classic snapshot league_id=%s gameweek=%s", model.league_id,
+                             model.gameweek)
+            metrics.inc("ingest_skipped_unchanged_total", type="classic")
+            return None
         self.logger.debug("Upserting item league_id=%s gameweek=%s", item['league_id'], item['gameweek'])
         classic_field = await self._classic_repo.upsert_league(
-            model.league_id, model.gameweek, [c.model_dump() for c in model.contenders]
+            model.league_id, model.gameweek, [c.model_dump() for c in model.contenders], content_hash, season
         )
+        await self._snapshot_repo.discard([("classic", model.league_id)], season, [model.gameweek])
+        metrics.inc("ingest_written_total", type="classic")
         return classic_field
 
+    async def apply_points_delta(self, item: Dict) -> Set[Tuple[str, int]]:
+        model = PointsDeltaModel.model_validate(item)
+        self.logger.debug("Applying %s player points updates", len(model.updates))
+        season = await self._season(model.season)
+        affected = await self._points_repo.apply(model.points(), season)
+        await self._snapshot_repo.discard(affected, season, {u.gameweek for u in model.updates})
+        metrics.inc("ingest_delta_updates_total", len(model.updates))
+        metrics.inc("ingest_delta_leagues_total", len(affected))
+        return affected
+
     async def generate_h2h_report(self, league_id: int, gameweek: int = None) -> str:
         self.logger.debug("Generating H2H report for league_id=%s gameweek=%s", league_id, gameweek)
         if gameweek is None:
@@ -53,15 +170,25 @@ class RSSService:
             gw = await self._h2h_repo.get_by_gameweek(league_id, gameweek)
         if not gw:
             raise DatabaseException(f"H2H Gameweek not found league_id={league_id} gameweek={gameweek}")
-        parts = [await h2h_text_gen.form_matches_info(gw)]
-        parts.extend(await h2h_text_gen.form_top_info(gw))
-        parts.append(await h2h_text_gen.form_top_diff(gw))
-        parts.append(await h2h_text_gen.form_top_pts(gw))
-        parts.append(await h2h_text_gen.form_leaderboard(gw))
+        return await self._render_h2h_report(gw)
+
+    @staticmethod
+    async def _render_h2h_report(gw: H2HGameweek) -> str:
+        frame = GameweekFrame.from_h2h(gw)
+        parts = [await h2h_text_gen.form_matches_info(frame)]
+        parts.extend(await h2h_text_gen.form_top_info(frame))
+        parts.append(await h2h_text_gen.form_top_diff(frame))
+        parts.append(await h2h_text_gen.form_top_pts(frame))
+        parts.append(await h2h_text_gen.form_leaderboard(frame))
+        matrix = await similarity_cache.matrix_for(gameweek_key("h2h", gw.id, gw.content_hash), frame)
+        parts.extend(await form_similarity_info(frame, matrix))
         return "\n\n\n".join(parts)
 
     async def generate_h2h_json(self, league_id: int, gameweek: int = None) -> Dict:
         self.logger.debug("Generating H2H JSON for league_id=%s gameweek=%s", league_id, gameweek)
+        snapshot = await self._final_snapshot("h2h", league_id, gameweek)
+        if snapshot is not None:
+            return json.loads(gzip.decompress(snapshot.data))
         if gameweek is None:
             gw = await self._h2h_repo.get_last_n_gameweeks(league_id, 1)
             if gw:
@@ -70,14 +197,19 @@ class RSSService:
             gw = await self._h2h_repo.get_by_gameweek(league_id, gameweek)
         if not gw:
             raise DatabaseException(f"H2H Gameweek not found league_id={league_id} gameweek={gameweek}")
-        parts: Dict[str, str] = {"gw": str(gw.gameweek), "matches_info": await h2h_text_gen.form_matches_info(gw)}
-        top_info = await h2h_text_gen.form_top_info(gw)
+        return await self._render_h2h_json(gw)
+
+    @staticmethod
+    async def _render_h2h_json(gw: H2HGameweek) -> Dict:
+        frame = GameweekFrame.from_h2h(gw)
+        parts: Dict[str, str] = {"gw": str(gw.gameweek), "matches_info": await h2h_text_gen.form_matches_info(frame)}
+        top_info = await h2h_text_gen.form_top_info(frame)
         parts["top_performance"] = top_info[0]
         parts["top_ownership"] = top_info[1]
         parts["top_captains"] = top_info[2]
-        parts["top_differential"] = await h2h_text_gen.form_top_diff(gw)
-        parts["top_points"] = await h2h_text_gen.form_top_pts(gw)
-        parts["leaderboard"] = await h2h_text_gen.form_leaderboard(gw)
+        parts["top_differential"] = await h2h_text_gen.form_top_diff(frame)
+        parts["top_points"] = await h2h_text_gen.form_top_pts(frame)
+        parts["leaderboard"] = await h2h_text_gen.form_leaderboard(frame)
         return parts
 
     async def generate_classic_report(self, league_id: int, gameweek: int = None) -> str:
@@ -90,12 +222,22 @@ class RSSService:
             gw = await self._classic_repo.get_by_gameweek(league_id, gameweek)
         if not gw:
             raise DatabaseException(f"Classic Gameweek not found league_id={league_id} gameweek={gameweek}")
-        parts = [await classic_text_gen.form_matches_info(gw)]
-        parts.extend(await classic_text_gen.form_top_info(gw))
+        return await self._render_classic_report(gw)
+
+    @staticmethod
+    async def _render_classic_report(gw: ClassicGameweek) -> str:
+        frame = GameweekFrame.from_classic(gw)
+        parts = [await classic_text_gen.form_matches_info(frame)]
+        parts.extend(await classic_text_gen.form_top_info(frame))
+        matrix = await similarity_cache.matrix_for(gameweek_key("classic", gw.id, gw.content_hash), frame)
+        parts.extend(await form_similarity_info(frame, matrix))
         return "\n\n\n".join(parts)
 
     async def generate_classic_json(self, league_id: int, gameweek: int = None) -> Dict:
         self.logger.debug("Generating Classic JSON for league_id=%s gameweek=%s", league_id, gameweek)
+        snapshot = await self._final_snapshot("classic", league_id, gameweek)
+        if snapshot is not None:
+            return json.loads(gzip.decompress(snapshot.data))
         if gameweek is None:
             gw = await self._classic_repo.get_last_n(league_id, 1)
             if gw:
@@ -104,39 +246,240 @@ class RSSService:
             gw = await self._classic_repo.get_by_gameweek(league_id, gameweek)
         if not gw:
             raise DatabaseException(f"Classic Gameweek not found league_id={league_id} gameweek={gameweek}")
-        parts: Dict[str, str] = {"gw": str(gw.gameweek), "matches_info": await classic_text_gen.form_matches_info(gw)}
-        top_info = await classic_text_gen.form_top_info(gw)
+        return await self._render_classic_json(gw)
+
+    @staticmethod
+    async def _render_classic_json(gw: ClassicGameweek) -> Dict:
+        frame = GameweekFrame.from_classic(gw)
+        parts: Dict[str, str] = {"gw": str(gw.gameweek),
+                                 "matches_info": await classic_text_gen.form_matches_info(frame)}
+        top_info = await classic_text_gen.form_top_info(frame)
         parts["top_performance"] = top_info[0]
         parts["top_ownership"] = top_info[1]
         parts["top_captains"] = top_info[2]
         return parts
 
-    async def send_webhook(self, league_id: int, league_type: str, gameweek: int = None) -> None:
+    async def generate_similarity_json(self, league_type: str, league_id: int, gameweek: int = None, top: int = 10,
+                                       include_matrix: bool = False) -> Dict:
+        self.logger.debug("Generating %s similarity for league_id=%s gameweek=%s", league_type, league_id, gameweek)
+        if league_type == "h2h":
+            repo = self._h2h_repo
+        elif league_type == "classic":
+            repo = self._classic_repo
+        else:
+            raise RSSServiceException(f"Unknown league type {league_type}")
+        version = await repo.get_version(league_id, gameweek)
+        if version is None:
+            raise DatabaseException(f"Gameweek not found league_id={league_id} gameweek={gameweek}")
+        gameweek_id, season, number, content_hash = version
+        # a cached matrix skips loading the gameweek, one small query per request
+        entry = similarity_cache.get(gameweek_key(league_type, gameweek_id, content_hash))
+        if entry is None:
+            gw = await repo.get_by_gameweek(league_id, number, season=season)
+            if not gw:
+                raise DatabaseException(f"Gameweek not found league_id={league_id} gameweek={number}")
+            frame = GameweekFrame.from_h2h(gw) if league_type == "h2h" else GameweekFrame.from_classic(gw)
+            entry = frame, await build_matrix(frame)
+            similarity_cache.put(gameweek_key(league_type, gw.id, gw.content_hash), *entry)
+        data = similarity_json(*entry, top, include_matrix)
+        data.update({"type": league_type, "league_id": league_id, "gameweek": number})
+        return data
+
+    async def get_report(self, league_type: str, league_id: int, gameweek: int = None) -> CachedReport:
+        key = (league_type, league_id, gameweek)
+        cached = await report_cache.get(key)
+        if cached is not None:
+            metrics.inc("report_cache_hits_total", type=league_type)
+            return cached
+        metrics.inc("report_cache_misses_total", type=league_type)
+        if league_type not in ("h2h", "classic"):
+            raise RSSServiceException(f"Unknown league type {league_type}")
+        # requests arriving while the report renders wait for that render instead of starting their own
+        return await report_flight.do(key, lambda: self._render_report(key))
+
+    async def _render_report(self, key: ReportKey) -> CachedReport:
+        league_type, league_id, gameweek = key
+        async with report_cache.lock(key):
+            # another worker sharing the cache may have rendered it while we waited for the lock
+            cached = await report_cache.get(key)
+            if cached is not None:
+                metrics.inc("report_cache_lock_hits_total", type=league_type)
+                return cached
+            snapshot = await self._final_snapshot(league_type, league_id, gameweek)
+            if snapshot is not None:
+                report = self._snapshot_report(snapshot)
+                await report_cache.put(key, report)
+                return report
+            if league_type == "h2h":
+                text = await self.generate_h2h_report(league_id, gameweek)
+            else:
+                text = await self.generate_classic_report(league_id, gameweek)
+            report = CachedReport(body=text.encode())
+            await report_cache.put(key, report)
+        return report
+
+    async def _render_loaded(self, key: ReportKey, render: Callable[[], Awaitable[str]]) -> CachedReport:
+        # a gameweek the batch already loaded, rendered under the same lock as _render_report
+        async with report_cache.lock(key):
+            cached = await report_cache.get(key)
+            if cached is not None:
+                metrics.inc("report_cache_lock_hits_total", type=key[0])
+                return cached
+            report = CachedReport(body=(await render()).encode())
+            await report_cache.put(key, report)
+        return report
+
+    async def get_reports(self, keys: List[ReportKey]) -> Dict[ReportKey, Union[CachedReport, RSSServiceException]]:
+        # cache misses of each league type are loaded with one set of queries instead of a cascade per key;
+        # keys that fail map to the exception instead of failing the whole batch
+        results: Dict[ReportKey, Union[CachedReport, RSSServiceException]] = {}
+        missing: Dict[str, List[Tuple[int, Optional[int]]]] = {"h2h": [], "classic": []}
+        for key in dict.fromkeys(keys):
+            league_type, league_id, gameweek = key
+            if league_type not in missing:
+                results[key] = RSSServiceException(f"Unknown league type {league_type}")
+                continue
+            cached = await report_cache.get(key)
+            if cached is not None:
+                metrics.inc("report_cache_hits_total", type=league_type)
+                results[key] = cached
+                continue
+            metrics.inc("report_cache_misses_total", type=league_type)
+            missing[league_type].append((league_id, gameweek))
+        self.logger.debug("Batch of %s reports: %s h2h and %s classic to render", len(keys), len(missing["h2h"]),
+                          len(missing["classic"]))
+
+        season = env.season.current
+        for league_type, league_keys in missing.items():
+            # explicit gameweeks that were finalized are served as stored, only the rest is loaded and rendered
+            exact = [(league_id, gameweek) for league_id, gameweek in league_keys if gameweek is not None]
+            snapshots = await self._snapshot_repo.get_many(league_type, exact, season)
+            if snapshots:
+                metrics.inc("report_snapshot_hits_total", len(snapshots), type=league_type)
+            for (league_id, gameweek), snapshot in snapshots.items():
+                report = self._snapshot_report(snapshot)
+                await report_cache.put((league_type, league_id, gameweek), report)
+                results[(league_type, league_id, gameweek)] = report
+            missing[league_type] = [key for key in league_keys if key not in snapshots]
+
+        loaded = []
+        if missing["h2h"]:
+            for (league_id, gameweek), gw in (await self._h2h_repo.get_many(missing["h2h"])).items():
+                loaded.append((("h2h", league_id, gameweek), partial(self._render_h2h_report, gw)))
+        if missing["classic"]:
+            for (league_id, gameweek), gw in (await self._classic_repo.get_many(missing["classic"])).items():
+                loaded.append((("classic", league_id, gameweek), partial(self._render_classic_report, gw)))
+        # one at a time, the renders are CPU bound and gathering them only interleaves them on the loop;
+        # a single request rendering the same key is joined instead of rendered twice
+        for key, render in loaded:
+            try:
+                results[key] = await report_flight.do(key, partial(self._render_loaded, key, render))
+            except RSSServiceException as e:
+                results[key] = e
+
+        for league_type, league_keys in missing.items():
+            for league_id, gameweek in league_keys:
+                key = (league_type, league_id, gameweek)
+                if key not in results:
+                    results[key] = DatabaseException(
+                        f"{'H2H' if league_type == 'h2h' else 'Classic'} Gameweek not found "
+                        f"league_id={league_id} gameweek={gameweek}")
+        return {key: results[key] for key in dict.fromkeys(keys)}
+
+    async def _standings_season(self, repo: Union[H2HGameweekRepo, ClassicGameweekRepo], league_id: int) -> int:
+        # the season of the league's latest gameweek, the previous one until the new season's first gameweek
+        version = await repo.get_version(league_id)
+        return version[1] if version is not None else env.season.current
+
+    async def generate_h2h_standings(self, league_id: int) -> str:
+        self.logger.debug("Generating H2H standings for league_id=%s", league_id)
+        season = await self._standings_season(self._h2h_repo, league_id)
+        standings = await self._standings_repo.get_h2h(league_id, season)
+        if not standings:
+            raise DatabaseException(f"H2H standings not found league_id={league_id}")
+        return await h2h_text_gen.form_standings(standings)
+
+    async def generate_classic_standings(self, league_id: int) -> str:
+        self.logger.debug("Generating Classic standings for league_id=%s", league_id)
+        season = await self._standings_season(self._classic_repo, league_id)
+        standings = await self._standings_repo.get_classic(league_id, season)
+        if not standings:
+            raise DatabaseException(f"Classic standings not found league_id={league_id}")
+        return await classic_text_gen.form_standings(standings)
+
+    async def build_webhook_payload(self, league_id: int, league_type: str, gameweek: int = None) -> Optional[Dict]:
         if league_type == "h2h":
             data = await self.generate_h2h_json(league_id, gameweek)
         elif league_type == "classic":
             data = await self.generate_classic_json(league_id, gameweek)
         else:
-            return
+            return None
         data["type"] = league_type
         data["league_id"] = league_id
-        json_data = json.dumps(data, indent=2, ensure_ascii=False)
-        headers = {
-            "Content-Type": "application/json",
-            "User-Agent": "ballista-rss-webhook-test/1.0"
-        }
+        return data
+
+    async def enqueue_webhook(self, league_id: int, league_type: str, gameweek: int = None) -> List[UUID]:
+        # written in the caller's transaction, the outbox relay delivers it once that transaction commits;
+        # one message per subscriber so each target is retried and rate limited on its own
+        data = await self.build_webhook_payload(league_id, league_type, gameweek)
+        if data is None:
+            return []
+        key = f"webhook:{league_type}:{league_id}:{data['gw']}:{stable_hash(data)}"
+        subscriptions = await self._subscription_repo.targets_for(league_type, league_id)
+        message_ids = []
+        for subscription in subscriptions:
+            message_id = await self._outbox_repo.add("webhook", subscription.url, data, f"{key}:{subscription.id}",
+                                                     subscription_id=subscription.id)
+            message_ids.append(message_id)
+        if not subscriptions and WEBHOOK_URL:
+            message_ids.append(await self._outbox_repo.add("webhook", WEBHOOK_URL, data, key))
+        self.logger.debug("Enqueued webhook league_id=%s to %s subscribers", league_id, len(subscriptions) or 1)
+        return [message_id for message_id in message_ids if message_id is not None]
+
+    async def add_webhook_subscription(self, league_type: str, league_id: Optional[int], url: str,
+                                       rate_limit_per_minute: Optional[int] = None) -> WebhookSubscription:
+        if league_type not in ("h2h", "classic"):
+            raise RSSServiceException(f"Unknown league type {league_type}")
+        return await self._subscription_repo.upsert(league_type, league_id, url, rate_limit_per_minute)
+
+    async def get_webhook_subscriptions(self, league_type: Optional[str] = None,
+                                        league_id: Optional[int] = None) -> List[WebhookSubscription]:
+        return await self._subscription_repo.get_all(league_type, league_id)
+
+    async def remove_webhook_subscription(self, subscription_id: UUID) -> None:
+        if not await self._subscription_repo.deactivate(subscription_id):
+            raise DatabaseException(f"Webhook subscription not found id={subscription_id}")
+
+    async def send_webhook(self, league_id: int, league_type: str, gameweek: int = None) -> None:
+        data = await self.build_webhook_payload(league_id, league_type, gameweek)
+        if data is None:
+            return
+        post_webhook(WEBHOOK_URL, data)
+
+
+def post_webhook(url: str, data: Dict, idempotency_key: Optional[str] = None, timeout: float = 15) -> "requests.Response":
+    # imported on the first delivery, workers that only serve feeds never load it
+    import requests
+    json_data = json.dumps(data, indent=2, ensure_ascii=False)
+    headers = {
+        "Content-Type": "application/json",
+        "User-Agent": "ballista-rss-webhook-test/1.0"
+    }
+    if idempotency_key:
+        headers["Idempotency-Key"] = idempotency_key
+    try:
+        logger.info("Sending payload to %s", url)
+        logger.debug("Payload data: %s", json_data)
+        resp = requests.request("POST", url, json=json_data, headers=headers, timeout=timeout)
+    except requests.RequestException as e:
+        raise ExternalAPIException(e)
+    logger.info(f"Response webhook status: {resp.status_code}")
+    ctype = resp.headers.get("Content-Type", "")
+    if "json" in ctype.lower():
         try:
-            self.logger.info("Sending payload to %s", WEBHOOK_URL)
-            self.logger.debug("Payload data: %s", json_data)
-            resp = requests.request("POST", WEBHOOK_URL, json=json_data, headers=headers, timeout=15)
-        except requests.RequestException as e:
-            raise ExternalAPIException(e)
-        self.logger.info(f"Response webhook status: {resp.status_code}")
-        ctype = resp.headers.get("Content-Type", "")
-        if "json" in ctype.lower():
-            try:
-                self.logger.info(json.dumps(resp.json(), indent=2, ensure_ascii=False))
-                return
-            except Exception:
-                pass
-        self.logger.info(resp.text)
+            logger.info(json.dumps(resp.json(), indent=2, ensure_ascii=False))
+            return resp
+        except Exception:
+            pass
+    logger.info(resp.text)
+    return resp
@@ -0,0 +1,139 @@
+import asyncio
+from array import array
+from bisect import bisect_right
+from collections import OrderedDict
+from heapq import nlargest, nsmallest
+from threading import Lock
+from typing import Dict, Hashable, List, Optional, Tuple
+
+from .frame import GameweekFrame
+
+CACHE_ENTRIES = 16
+
+
+class SimilarityMatrix:
+    """Squad overlap of every pair of teams in a gameweek.
+
+    Each squad is a bitset over the frame's player indices, so a pair costs one AND and a popcount. Only the
+    upper triangle is kept, row by row: pair (i, j) with i < j sits at _row_offsets[i] + j - i - 1.
+    Similarity is shared players over the larger squad, as in the match lines.
+    """
+
+    def __init__(self, frame: GameweekFrame):
+        self.teams = frame.teams
+        masks = []
+        for team in range(frame.teams):
+            mask = 0
+            for player in frame.team_players(team):
+                mask |= 1 << player
+            masks.append(mask)
+        sizes = [mask.bit_count() for mask in masks]
+
+        self._row_offsets = array("q")
+        self.values = array("d")
+        for first, (first_mask, first_size) in enumerate(zip(masks, sizes)):
+            self._row_offsets.append(len(self.values))
+            self.values.extend(
+                (first_mask & mask).bit_count() / total if (total := max(first_size, size)) else 0.
+                for mask, size in zip(masks[first + 1:], sizes[first + 1:])
+            )
+
+    def __len__(self) -> int:
+        return len(self.values)
+
+    def pair(self, index: int) -> Tuple[int, int]:
+        first = bisect_right(self._row_offsets, index) - 1
+        return first, first + 1 + index - self._row_offsets[first]
+
+    def similarity(self, first: int, second: int) -> float:
+        if first == second:
+            return 1.
+        first, second = min(first, second), max(first, second)
+        return self.values[self._row_offsets[first] + second - first - 1]
+
+    def most_similar(self, n: int) -> List[Tuple[int, int, float]]:
+        return [(*self.pair(i), self.values[i]) for i in nlargest(n, range(len(self)), key=self.values.__getitem__)]
+
+    def most_different(self, n: int) -> List[Tuple[int, int, float]]:
+        return [(*self.pair(i), self.values[i]) for i in nsmallest(n, range(len(self)), key=self.values.__getitem__)]
+
+    def rows(self) -> List[List[float]]:
+        return [[self.similarity(first, second) for second in range(self.teams)] for first in range(self.teams)]
+
+
+class SimilarityCache:
+    # a stored gameweek only changes together with its content hash, so entries never need invalidating
+    def __init__(self, max_entries: int = CACHE_ENTRIES):
+        self._max_entries = max_entries
+        self._items: "OrderedDict[Hashable, Tuple[GameweekFrame, SimilarityMatrix]]" = OrderedDict()
+        self._lock = Lock()
+
+    def get(self, key: Optional[Hashable]) -> Optional[Tuple[GameweekFrame, SimilarityMatrix]]:
+        if key is None:
+            return None
+        with self._lock:
+            entry = self._items.get(key)
+            if entry is not None:
+                self._items.move_to_end(key)
+            return entry
+
+    def put(self, key: Optional[Hashable], frame: GameweekFrame, matrix: SimilarityMatrix) -> None:
+        if key is None:
+            return
+        with self._lock:
+            self._items[key] = (frame, matrix)
+            self._items.move_to_end(key)
+            while len(self._items) > self._max_entries:
+                self._items.popitem(last=False)
+
+    async def matrix_for(self, key: Optional[Hashable], frame: GameweekFrame) -> SimilarityMatrix:
+        entry = self.get(key)
+        if entry is not None:
+            return entry[1]
+        matrix = await build_matrix(frame)
+        self.put(key, frame, matrix)
+        return matrix
+
+
+async def build_matrix(frame: GameweekFrame) -> SimilarityMatrix:
+    # quadratic in the league size, a thousand teams take a third of a second off the event loop
+    return await asyncio.to_thread(SimilarityMatrix, frame)
+
+
+similarity_cache = SimilarityCache()
+
+
+def gameweek_key(league_type: str, gameweek_id,
+                 content_hash: Optional[str]) -> Optional[Tuple[str, object, Optional[str]]]:
+    # transient gameweeks are not cached. Rows stored before content hashing are keyed by their id alone, every
+    # write since sets a hash (an ingest its digest, a points delta its marker), so that key cannot go stale
+    if gameweek_id is None:
+        return None
+    return league_type, gameweek_id, content_hash
+
+
+async def form_similarity_info(frame: GameweekFrame, matrix: SimilarityMatrix, n: int = 3) -> List[str]:
+    similar_text = "TOP SIM (most similar squads)\n"
+    for index, (first, second, value) in enumerate(matrix.most_similar(n)):
+        similar_text += f"{index + 1}. {frame.team_names[first]} - {frame.team_names[second]} {int(value * 100)}%\n"
+
+    different_text = "TOP DIF (most differential squads)\n"
+    for index, (first, second, value) in enumerate(matrix.most_different(n)):
+        different_text += f"{index + 1}. {frame.team_names[first]} - {frame.team_names[second]} {int(value * 100)}%\n"
+    return [similar_text.strip(), different_text.strip()]
+
+
+def similarity_json(frame: GameweekFrame, matrix: SimilarityMatrix, top: int, include_matrix: bool) -> Dict:
+    def pairs(ranked):
+        return [{"first_team_id": frame.team_ids[first], "first_name": frame.team_names[first],
+                 "second_team_id": frame.team_ids[second], "second_name": frame.team_names[second],
+                 "similarity": round(value, 4)} for first, second, value in ranked]
+
+    data = {
+        "teams": [{"team_id": team_id, "name": name} for team_id, name in zip(frame.team_ids, frame.team_names)],
+        "most_similar": pairs(matrix.most_similar(top)),
+        "most_different": pairs(matrix.most_different(top)),
+    }
+    if include_matrix:
+        data["matrix"] = [[round(value, 4) for value in row] for row in matrix.rows()]
+    return data
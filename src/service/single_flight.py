@@ -0,0 +1,37 @@
+import asyncio
+from typing import Awaitable, Callable, Dict, Hashable, TypeVar
+
+from ..metrics import metrics
+
+T = TypeVar("T")
+
+
+class SingleFlight:
+    """Concurrent calls for the same key share one in-flight computation and its result or exception."""
+
+    def __init__(self, name: str):
+        self.name = name
+        self._calls: Dict[Hashable, asyncio.Task] = {}
+
+    def _forget(self, key: Hashable, task: asyncio.Task) -> None:
+        if self._calls.get(key) is task:
+            del self._calls[key]
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[T]]) -> T:
+        while True:
+            task = self._calls.get(key)
+            if task is None:
+                task = asyncio.ensure_future(fn())
+                self._calls[key] = task
+                task.add_done_callback(lambda t: self._forget(key, t))
+                metrics.inc("singleflight_calls_total", flight=self.name)
+                # not shielded: the call runs on the leader's DB session, so it must not outlive the leader
+                return await task
+            metrics.inc("singleflight_deduplicated_total", flight=self.name)
+            try:
+                return await asyncio.shield(task)
+            except asyncio.CancelledError:
+                if asyncio.current_task().cancelling() or not task.cancelled():
+                    raise
+                # the leader went away mid-call, the next waiter takes over
+                metrics.inc("singleflight_retries_total", flight=self.name)
@@ -0,0 +1,185 @@
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from functools import partial
+from threading import Lock
+from typing import Dict, Optional
+
+from . import ExternalAPIException, DeliveryDeferredException
+from .. import env
+from ..metrics import metrics
+from .service import post_webhook
+
+
+class TokenBucket:
+    def __init__(self, rate_per_minute: float, burst: Optional[float] = None):
+        self.rate_per_minute = rate_per_minute
+        self._rate = rate_per_minute / 60
+        # ten seconds worth of requests may go out at once after a quiet period
+        self._capacity = burst if burst is not None else max(1., self._rate * 10)
+        self._tokens = self._capacity
+        self._updated = time.monotonic()
+
+    def acquire(self) -> float:
+        """Takes a token and returns 0, or returns the seconds until one is available."""
+        now = time.monotonic()
+        self._tokens = min(self._capacity, self._tokens + (now - self._updated) * self._rate)
+        self._updated = now
+        if self._tokens >= 1:
+            self._tokens -= 1
+            return 0.
+        return (1 - self._tokens) / self._rate if self._rate > 0 else float("inf")
+
+
+class CircuitBreaker:
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 60):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self._opened_at: Optional[float] = None
+        self._probing = False
+
+    @property
+    def state(self) -> str:
+        if self._opened_at is None:
+            return "closed"
+        return "half_open" if self._probing or self.retry_after() == 0 else "open"
+
+    def retry_after(self) -> float:
+        if self._opened_at is None:
+            return 0.
+        return max(0., self._opened_at + self.reset_timeout - time.monotonic())
+
+    def allow(self) -> bool:
+        if self._opened_at is None:
+            return True
+        # after the reset timeout a single probe goes through, its outcome closes or re-opens the circuit
+        if not self._probing and self.retry_after() == 0:
+            self._probing = True
+            return True
+        return False
+
+    def release_probe(self) -> None:
+        # the probe was let through but never sent, the next call may probe instead
+        self._probing = False
+
+    def record_success(self) -> None:
+        self.failures = 0
+        self._opened_at = None
+        self._probing = False
+
+    def record_failure(self) -> None:
+        self.failures += 1
+        if self._probing or self.failures >= self.failure_threshold:
+            self._opened_at = time.monotonic()
+            self._probing = False
+
+
+@dataclass
+class TargetStats:
+    url: str
+    delivered: int = 0
+    failed: int = 0
+    rejected_open: int = 0
+    rate_limited: int = 0
+    last_status: Optional[int] = None
+    last_error: Optional[str] = None
+    total_latency_ms: float = 0.
+
+    def as_dict(self) -> Dict:
+        calls = self.delivered + self.failed
+        return {
+            "url": self.url,
+            "delivered": self.delivered,
+            "failed": self.failed,
+            "rejected_open": self.rejected_open,
+            "rate_limited": self.rate_limited,
+            "last_status": self.last_status,
+            "last_error": self.last_error,
+            "avg_latency_ms": round(self.total_latency_ms / calls, 3) if calls else None,
+        }
+
+
+class _Target:
+    def __init__(self, url: str, rate_per_minute: float, breaker_failures: int, breaker_reset: float):
+        self.bucket = TokenBucket(rate_per_minute)
+        self.breaker = CircuitBreaker(breaker_failures, breaker_reset)
+        self.stats = TargetStats(url)
+
+
+class WebhookDispatcher:
+    """Per-target rate limits, circuit breakers and stats for webhook deliveries of this process."""
+
+    def __init__(self, timeout: float = 10, rate_limit_per_minute: int = 120, breaker_failures: int = 5,
+                 breaker_reset: float = 60, max_workers: int = 8):
+        self.timeout = timeout
+        self.rate_limit_per_minute = rate_limit_per_minute
+        self.breaker_failures = breaker_failures
+        self.breaker_reset = breaker_reset
+        self._targets: Dict[str, _Target] = {}
+        self._lock = Lock()
+        # blocking posts get threads of their own, slow targets cannot take the loop's default executor
+        self._executor = ThreadPoolExecutor(max_workers, thread_name_prefix="webhook")
+
+    def _target(self, key: str, url: str, rate_limit_per_minute: Optional[int]) -> _Target:
+        rate = rate_limit_per_minute or self.rate_limit_per_minute
+        with self._lock:
+            target = self._targets.get(key)
+            if target is None:
+                target = self._targets[key] = _Target(url, rate, self.breaker_failures, self.breaker_reset)
+            elif target.bucket.rate_per_minute != rate:
+                target.bucket = TokenBucket(rate)
+            return target
+
+    async def deliver(self, key: str, url: str, payload: Dict, idempotency_key: str,
+                      rate_limit_per_minute: Optional[int] = None) -> None:
+        target = self._target(key, url, rate_limit_per_minute)
+        if not target.breaker.allow():
+            target.stats.rejected_open += 1
+            metrics.inc("webhook_deliveries_total", outcome="circuit_open")
+            # not the message's fault, park it until the breaker lets a probe through
+            retry_in = max(target.breaker.retry_after(), 1.)
+            raise DeliveryDeferredException(f"Circuit open for {url}, retry in {retry_in:.0f} s", retry_in)
+        wait = target.bucket.acquire()
+        if wait > 0:
+            target.stats.rate_limited += 1
+            metrics.inc("webhook_deliveries_total", outcome="rate_limited")
+            target.breaker.release_probe()
+            raise DeliveryDeferredException(f"Rate limit for {url}", wait)
+
+        start = time.perf_counter()
+        try:
+            resp = await asyncio.get_running_loop().run_in_executor(
+                self._executor, partial(post_webhook, url, payload, idempotency_key, self.timeout))
+            if resp.status_code >= 400:
+                target.stats.last_status = resp.status_code
+                raise ExternalAPIException(f"Webhook responded with status {resp.status_code}")
+        except Exception as e:
+            # anything that ends the post counts against the target, a failed probe re-opens the circuit
+            target.stats.failed += 1
+            target.stats.last_error = str(e) or e.__class__.__name__
+            target.breaker.record_failure()
+            metrics.inc("webhook_deliveries_total", outcome="failed")
+            raise
+        except BaseException:
+            # cancelled with the outcome unknown, the next call may probe instead
+            target.breaker.release_probe()
+            raise
+        finally:
+            target.stats.total_latency_ms += (time.perf_counter() - start) * 1000
+        target.stats.delivered += 1
+        target.stats.last_status = resp.status_code
+        target.breaker.record_success()
+        metrics.inc("webhook_deliveries_total", outcome="delivered")
+
+    def stats(self) -> Dict[str, Dict]:
+        with self._lock:
+            targets = dict(self._targets)
+        return {key: {**t.stats.as_dict(), "circuit": t.breaker.state, "consecutive_failures": t.breaker.failures}
+                for key, t in targets.items()}
+
+
+webhook_dispatcher = WebhookDispatcher(env.webhook.timeout, env.webhook.rate_limit_per_minute,
+                                       env.webhook.breaker_failures, env.webhook.breaker_reset,
+                                       env.webhook.max_workers)